@@ -0,0 +1,15 @@
+"""The module `dynamics.analysis` contains analyses built on the compiled
+model, e.g. parameter estimation, Lyapunov exponents, bifurcation diagrams,
+basins of attraction, periodic steady states, surrogate tables of
+trajectories, statistics of the response to noise and work-precision
+comparisons of the solvers. They integrate the equations of motion directly
+instead of running a full simulation."""
+
+from .fitting import *
+from .chaos import *
+from .basins import *
+from .continuation import *
+from .periodic import *
+from .surrogate import *
+from .stochastic import *
+from .precision import *
@@ -0,0 +1,150 @@
+"""The module `dynamics.analysis.basins` maps the basins of attraction of the
+model over grids of initial conditions. The whole grid is integrated as one
+vectorised batch, and every trajectory is dropped from the batch as soon as
+it has settled, so the work follows the settling times of the trajectories
+rather than the slowest one."""
+
+import attr
+import numpy as np
+
+from dynamics.tools.solver import RK4, reset
+
+__all__ = ['BasinMap', 'basins']
+
+
+@attr.s(frozen=True)
+class BasinMap:
+    """Basins of attraction computed by `basins`.
+
+    +------------------+---------------------------------------------------+
+    | Attributes       | Details                                           |
+    +==================+===================================================+
+    | ``labels``       | Label of the attractor of every initial           |
+    |                  | condition, masked if not settled.                 |
+    +------------------+---------------------------------------------------+
+    | ``settle_time``  | Time to settle of every initial condition, NaN if |
+    |                  | not settled.                                      |
+    +------------------+---------------------------------------------------+
+    | ``displacement`` | Displacements at the settling or the end, with    |
+    |                  | shape `(n_assets, *grid)`.                        |
+    +------------------+---------------------------------------------------+
+    | ``velocity``     | Velocities at the settling or the end.            |
+    +------------------+---------------------------------------------------+
+    | ``work``         | Number of trajectory steps integrated.            |
+    +------------------+---------------------------------------------------+
+    | ``n_steps``      | Number of steps of the last active trajectory.    |
+    +------------------+---------------------------------------------------+
+    """
+    labels: np.ndarray = attr.attrib()
+    settle_time: np.ndarray = attr.attrib()
+    displacement: np.ndarray = attr.attrib()
+    velocity: np.ndarray = attr.attrib()
+    work: int = attr.attrib()
+    n_steps: int = attr.attrib()
+
+    @property
+    def settled(self):
+        """Whether every initial condition has settled."""
+        return ~np.ma.getmaskarray(self.labels)
+
+
+def _count_periods(index, period):
+    """Label by the number of periods of the displacement of the coordinate
+    *index*, e.g. the number of flips of a pendulum with `period = 2*np.pi`."""
+    def classify(s, v):
+        return np.rint(s[index] / period).astype(int)
+    return classify
+
+
+def basins(model, s0, v0, classify=None, variable=None, period=2*np.pi,
+           settle=None, solver=RK4, time_step=1e-2, n_iter=10000, atol=1e-3,
+           check_every=10):
+    """Map the basins of attraction of the model over a grid of initial
+    conditions.
+
+    The grid is integrated as one batch of the compiled accelerations, see
+    `Model.compile`. Every *check_every* steps the settled trajectories are
+    labelled by *classify* and removed from the batch. By default a
+    trajectory has settled at rest, with all velocities and accelerations
+    below *atol*; a criterion classifying the trajectories earlier, e.g. an
+    energy below the barrier of the potential well, saves most of the work.
+
+    Parameters:
+        model (Model): Model of the system.
+        s0, v0 (array): Initial displacements and velocities with shape
+                        `(n_assets, *grid)`, e.g. from `np.meshgrid` for a
+                        single asset.
+        classify (function): Integer labels `classify(s, v)` of the settled
+                             states with shape `(n_assets, n_settled)`. By
+                             default the number of periods of the
+                             displacement of *variable*, see *period*.
+        variable (str): Variable name of the default labels, by default the
+                        first asset.
+        period (float): Period of the default labels, e.g. `2*np.pi` for the
+                        signed number of flips of a pendulum.
+        settle (function): Settling criterion `settle(s, v, a)` of the states
+                           with shape `(n_assets, n_active)`, a boolean array
+                           with shape `(n_active,)`.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        time_step (float): Time step of the integration.
+        n_iter (int): Maximum number of steps.
+        atol (float): Tolerance of the velocities and accelerations at rest.
+        check_every (int): Number of steps between the settling checks.
+
+    Returns:
+        BasinMap with the labels and times to settle of the grid.
+    """
+    n = len(model.asset)
+    s, v = np.broadcast_arrays(np.asarray(s0, dtype=model.dtype),
+                               np.asarray(v0, dtype=model.dtype))
+    if s.shape[0] != n:
+        raise ValueError("Initial conditions must have shape (n_assets, ...), "
+                         "got {}.".format(s.shape))
+    grid = s.shape[1:]
+    s, v = s.reshape(n, -1).copy(), v.reshape(n, -1).copy()
+    if classify is None:
+        var_names = [asset.var_name for asset in model.asset]
+        variable = var_names[0] if variable is None else variable
+        if variable not in var_names:
+            raise ValueError("Unknown variable '{}', expected one of {}."
+                             .format(variable, var_names))
+        classify = _count_periods(var_names.index(variable), period)
+
+    n_points = s.shape[1]
+    labels = np.zeros(n_points, dtype=int)
+    settle_time = np.full(n_points, np.nan)
+    s_final, v_final = s.copy(), v.copy()
+    active = np.arange(n_points)
+
+    f = model.compile()
+    dt = float(time_step)
+    t = model.time_start
+    work, n_steps = 0, 0
+    reset(solver)
+    for i in range(1, n_iter + 1):
+        s, v, a, t = solver(f, s, v, t, dt)
+        work += len(active)
+        n_steps = i
+        if i % check_every and i < n_iter:
+            continue
+        if settle is None:
+            # The accelerations are evaluated at the start of the step.
+            settled = np.all(np.abs(v) < atol, axis=0) & np.all(np.abs(a) < atol, axis=0)
+        else:
+            settled = np.asarray(settle(s, v, a), dtype=bool)
+        if np.any(settled):
+            index = active[settled]
+            labels[index] = classify(s[:, settled], v[:, settled])
+            settle_time[index] = t - model.time_start
+            s_final[:, index], v_final[:, index] = s[:, settled], v[:, settled]
+            active, s, v = active[~settled], s[:, ~settled], v[:, ~settled]
+            # The history of a multistep solver belongs to the removed batch.
+            reset(solver)
+        if not len(active):
+            break
+    s_final[:, active], v_final[:, active] = s, v
+
+    labels = np.ma.masked_array(labels, mask=np.isnan(settle_time))
+    return BasinMap(labels.reshape(grid), settle_time.reshape(grid),
+                    s_final.reshape((n,) + grid), v_final.reshape((n,) + grid),
+                    work, n_steps)
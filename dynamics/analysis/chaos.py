@@ -0,0 +1,227 @@
+"""The module `dynamics.analysis.chaos` provides indicators of chaotic
+motion. The Lyapunov exponents are estimated from the tangent-linear
+(variational) equations integrated along with the motion, and the Poincaré
+sections are detected during the integration, both for a whole batch of
+initial conditions at once."""
+
+import numpy as np
+import pandas as pd
+
+from dynamics.tools.solver import RK4, hermite, reset
+
+__all__ = ['iter_lyapunov', 'lyapunov', 'iter_poincare', 'poincare']
+
+
+def _initial_batch(model, s0, v0):
+    """Initial displacements and velocities with shape `(n_assets, n_batch)`,
+    by default from the solutions of the assets."""
+    if s0 is None:
+        s0 = [asset.solution.disp_0 for asset in model.asset]
+    if v0 is None:
+        v0 = [asset.solution.velo_0 for asset in model.asset]
+    s0 = np.asarray(s0, dtype=model.dtype).reshape(len(model.asset), -1)
+    v0 = np.asarray(v0, dtype=model.dtype).reshape(len(model.asset), -1)
+    s0, v0 = np.broadcast_arrays(s0, v0)
+    return s0.copy(), v0.copy()
+
+
+def iter_lyapunov(model, solver=RK4, time_step=1e-2, n_iter=10000,
+                  n_vectors=1, renormalise=10, transient=0, s0=None, v0=None):
+    """Estimate the Lyapunov exponents of the model, yielding the running
+    estimate at every renormalisation.
+
+    The deviation vectors in the phase space of displacements and velocities
+    are integrated by the tangent-linear equations of the model, and
+    orthonormalised (QR decomposition) every *renormalise* steps; the
+    exponents are the time averages of the logarithmic growth.
+
+    Parameters:
+        model (Model): Model of the system.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        time_step (float): Time step of the integration.
+        n_iter (int): Number of steps after the transient.
+        n_vectors (int): Number of deviation vectors, i.e. the number of
+                         largest exponents estimated.
+        renormalise (int): Number of steps between the renormalisations.
+        transient (int): Number of steps integrated before the estimation.
+        s0, v0 (array): Initial displacements and velocities with shape
+                        `(n_assets,)` or `(n_assets, n_batch)`, by default
+                        the initial conditions of the assets.
+
+    Yields:
+        time (float): Time since the end of the transient.
+        exponents (array): Running estimate with shape `(n_vectors, n_batch)`.
+    """
+    n = len(model.asset)
+    if not 1 <= n_vectors <= 2*n:
+        raise ValueError("Number of vectors must be between 1 and {}.".format(2*n))
+    f = model.compile_tangent(n_vectors)
+    s, v = _initial_batch(model, s0, v0)
+    n_batch = s.shape[1]
+
+    # Orthonormal deviations with shape (2n, n_vectors, n_batch).
+    deviation = np.repeat(np.eye(2*n, n_vectors, dtype=model.dtype)[..., None],
+                          n_batch, axis=2)
+    log_growth = np.zeros((n_vectors, n_batch))
+
+    dt = float(time_step)
+    t = model.time_start
+    reset(solver)
+    for i in range(1, transient + n_iter + 1):
+        s_aug = np.concatenate([s, deviation[:n].reshape(n*n_vectors, n_batch)])
+        v_aug = np.concatenate([v, deviation[n:].reshape(n*n_vectors, n_batch)])
+        s_aug, v_aug, _, t = solver(f, s_aug, v_aug, t, dt)
+        s, v = s_aug[:n], v_aug[:n]
+        deviation = np.concatenate([s_aug[n:], v_aug[n:]]).reshape(2*n, n_vectors, n_batch)
+
+        step = i - transient
+        if step % renormalise == 0 or step == n_iter:
+            q, r = np.linalg.qr(deviation.transpose(2, 0, 1))
+            deviation = q.transpose(1, 2, 0)
+            if step > 0:
+                diagonal = np.abs(np.diagonal(r, axis1=1, axis2=2)).T
+                log_growth += np.log(diagonal)
+                yield step * dt, log_growth / (step * dt)
+
+
+def lyapunov(model, solver=RK4, time_step=1e-2, n_iter=10000, n_vectors=1,
+             renormalise=10, transient=0, s0=None, v0=None):
+    """Estimate the Lyapunov exponents of the model, see `iter_lyapunov`.
+
+    Returns:
+        exponents (array): Estimate with shape `(n_vectors, n_batch)`, or
+                           `(n_vectors,)` for a single initial condition.
+    """
+    exponents = None
+    for _, exponents in iter_lyapunov(model, solver, time_step, n_iter,
+                                      n_vectors, renormalise, transient, s0, v0):
+        pass
+    if np.ndim(s0) < 2 and np.ndim(v0) < 2:
+        return exponents[:, 0]
+    return exponents
+
+
+def _section_distance(s, index, value, period):
+    """Signed distance of the displacements from the section, wrapped into
+    `[-period/2, period/2)` for a periodic variable."""
+    distance = s[index] - value
+    if period is not None:
+        distance = (distance + period/2) % period - period/2
+    return distance
+
+
+def _crossed(distance, distance_next, direction, period=None):
+    """Whether the section is crossed within the step in the *direction*, from
+    the signed distances at both ends of the step."""
+    upward = (distance < 0) & (distance_next >= 0)
+    downward = (distance > 0) & (distance_next <= 0)
+    crossed = upward if direction > 0 else downward if direction < 0 \
+        else upward | downward
+    if period is not None:
+        # Wrapping from +period/2 to -period/2 is not a crossing.
+        crossed &= np.abs(distance_next - distance) < period/2
+    return crossed
+
+
+def iter_poincare(model, variable, value=0.0, direction=1, period=None,
+                  solver=RK4, time_step=1e-2, n_iter=10000, transient=0,
+                  s0=None, v0=None, n_newton=4):
+    """Detect the crossings of a Poincaré section during the integration,
+    yielding only the crossing states.
+
+    The section is `variable = value`, the crossing is located within the
+    step by Newton iterations on the cubic Hermite interpolation of the
+    step, and the state is interpolated at the crossing.
+
+    Parameters:
+        model (Model): Model of the system.
+        variable (str): Variable name of the asset defining the section.
+        value (float): Displacement of the section.
+        direction (int): 1 for crossings with increasing displacement, -1 for
+                         decreasing, 0 for both.
+        period (float): Period of the variable, e.g. `2*np.pi` for angles,
+                        if the section is repeated.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        time_step (float): Time step of the integration.
+        n_iter (int): Number of steps after the transient.
+        transient (int): Number of steps integrated before the detection.
+        s0, v0 (array): Initial displacements and velocities with shape
+                        `(n_assets,)` or `(n_assets, n_batch)`, by default
+                        the initial conditions of the assets.
+        n_newton (int): Number of Newton iterations of the crossing time.
+
+    Yields:
+        batch (array): Batch indices of the crossings in this step.
+        time (array): Time of the crossings.
+        s, v (array): Displacements and velocities at the crossings, with
+                      shape `(n_assets, n_crossings)`.
+    """
+    var_names = [asset.var_name for asset in model.asset]
+    if variable not in var_names:
+        raise ValueError("Unknown variable '{}', expected one of {}."
+                         .format(variable, var_names))
+    index = var_names.index(variable)
+
+    f = model.compile()
+    s, v = _initial_batch(model, s0, v0)
+    dt = float(time_step)
+    t = model.time_start
+    distance = _section_distance(s, index, value, period)
+    reset(solver)
+    for i in range(1, transient + n_iter + 1):
+        s_next, v_next, _, t_next = solver(f, s, v, t, dt)
+        distance_next = _section_distance(s_next, index, value, period)
+
+        crossed = _crossed(distance, distance_next, direction, period)
+
+        if i > transient and np.any(crossed):
+            batch = np.flatnonzero(crossed)
+            s0_c, v0_c = s[:, batch], v[:, batch]
+            s1_c, v1_c = s_next[:, batch], v_next[:, batch]
+            target = s0_c[index] - distance[batch]
+
+            theta = distance[batch] / (distance[batch] - distance_next[batch])
+            for _ in range(n_newton):
+                s_c, v_c = hermite(s0_c, v0_c, s1_c, v1_c, dt, theta)
+                slope = v_c[index] * dt
+                step = np.divide(s_c[index] - target, slope,
+                                 out=np.zeros_like(theta), where=slope != 0)
+                theta = np.clip(theta - step, 0.0, 1.0)
+            s_c, v_c = hermite(s0_c, v0_c, s1_c, v1_c, dt, theta)
+            yield batch, t + theta*dt, s_c, v_c
+
+        s, v, t, distance = s_next, v_next, t_next, distance_next
+
+
+def poincare(model, variable, value=0.0, direction=1, period=None,
+             solver=RK4, time_step=1e-2, n_iter=10000, transient=0,
+             s0=None, v0=None):
+    """Compute the Poincaré section of the model, see `iter_poincare`. Only
+    the crossings are stored, the memory is proportional to the number of
+    crossings rather than the number of steps.
+
+    Returns:
+        DataFrame with the columns `batch` and `time`, and the displacement
+        and velocity of every variable, e.g. `theta` and `thetadot`.
+    """
+    crossings = {'batch': [], 'time': [], 's': [], 'v': []}
+    for batch, time, s, v in iter_poincare(model, variable, value, direction,
+                                           period, solver, time_step, n_iter,
+                                           transient, s0, v0):
+        crossings['batch'].append(batch)
+        crossings['time'].append(time)
+        crossings['s'].append(s)
+        crossings['v'].append(v)
+
+    n = len(model.asset)
+    concat = lambda arrays, shape: np.concatenate(arrays, axis=-1) \
+        if arrays else np.empty(shape)
+    data = {'batch': concat(crossings['batch'], (0,)).astype(int),
+            'time': concat(crossings['time'], (0,))}
+    s, v = concat(crossings['s'], (n, 0)), concat(crossings['v'], (n, 0))
+    for i, asset in enumerate(model.asset):
+        data[asset.var_name] = s[i]
+        data[asset.var_name + 'dot'] = v[i]
+
+    results = pd.DataFrame(data=data)
+    return results.sort_values(['batch', 'time'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,158 @@
+"""The module `dynamics.analysis.continuation` computes bifurcation diagrams.
+A property of a component is stepped along a range of values and every run
+starts from the final state of the previous one, so after a short transient
+the motion is already on the attractor of the new value. Only the sampled
+points of the attractor are kept, e.g. the local maxima of a variable or the
+crossings of a Poincaré section."""
+
+import numpy as np
+import pandas as pd
+
+from dynamics.tools.solver import RK4, hermite, reset
+from .chaos import _crossed, _initial_batch, _section_distance
+
+__all__ = ['iter_continuation', 'continuation']
+
+
+def iter_continuation(model, asset, name, values, variable, sampling='maxima',
+                      section=None, value=0.0, direction=1, period=None,
+                      solver=RK4, time_step=1e-2, n_iter=5000, transient=1000,
+                      n_points=None, s0=None, v0=None, n_newton=4):
+    """Continue the attractors of the model along the values of a property,
+    yielding the sampled points of every value.
+
+    The model is compiled once with the property kept symbolic, see
+    `Model.compile`. Every value is integrated from the final state of the
+    previous value, the first *transient* steps are skipped and the points
+    are sampled during the next *n_iter* steps. The sample is located within
+    the step by Newton iterations on the cubic Hermite interpolation of the
+    step.
+
+    Parameters:
+        model (Model): Model of the system.
+        asset (Asset): Asset of the property, or None for `'gravity'`.
+        name (str): Name of the property, e.g. `'drag_coeff'`.
+        values (array): Values of the property, in the order of continuation.
+        variable (str): Variable name of the asset sampled.
+        sampling (str): `'maxima'` for the local maxima of the variable, or
+                        `'section'` for the crossings of the Poincaré section
+                        `section = value`.
+        section (str): Variable name defining the section, by default
+                       *variable*.
+        value (float): Displacement of the section.
+        direction (int): 1 for crossings with increasing displacement, -1 for
+                         decreasing, 0 for both.
+        period (float): Period of the section variable, e.g. `2*np.pi`.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        time_step (float): Time step of the integration.
+        n_iter (int): Maximum number of sampled steps of every value.
+        transient (int): Number of steps skipped at every value.
+        n_points (int): Optional number of points of every value, the value
+                        is left as soon as every run of the batch has them.
+        s0, v0 (array): Initial displacements and velocities with shape
+                        `(n_assets,)` or `(n_assets, n_batch)`, by default
+                        the initial conditions of the assets.
+        n_newton (int): Number of Newton iterations of the sampling time.
+
+    Yields:
+        value (float): Value of the property.
+        batch (array): Batch indices of the points.
+        time (array): Time of the points.
+        s, v (array): Displacements and velocities at the points, with shape
+                      `(n_assets, n_points)`.
+    """
+    if sampling not in ('maxima', 'section'):
+        raise ValueError("Unknown sampling '{}', expected 'maxima' or 'section'."
+                         .format(sampling))
+    var_names = [a.var_name for a in model.asset]
+    for var_name in (variable, section or variable):
+        if var_name not in var_names:
+            raise ValueError("Unknown variable '{}', expected one of {}."
+                             .format(var_name, var_names))
+    index = var_names.index(section or variable if sampling == 'section' else variable)
+
+    f = model.compile([(asset, name)])
+    s, v = _initial_batch(model, s0, v0)
+    n_batch = s.shape[1]
+    dt = float(time_step)
+    t = model.time_start
+
+    def distance_of(s, v):
+        if sampling == 'maxima':
+            # The maxima are the downward crossings of zero velocity.
+            return v[index]
+        return _section_distance(s, index, value, period)
+
+    for p_value in values:
+        p = np.full((1, n_batch), p_value, dtype=model.dtype)
+        accel = [lambda s, v, fun=fun: fun(s, v, p) for fun in f]
+        count = np.zeros(n_batch, dtype=int)
+        distance = distance_of(s, v)
+        reset(solver)
+        for i in range(1, transient + n_iter + 1):
+            s_next, v_next, _, t_next = solver(accel, s, v, t, dt)
+            distance_next = distance_of(s_next, v_next)
+            if sampling == 'maxima':
+                crossed = _crossed(distance, distance_next, -1)
+            else:
+                crossed = _crossed(distance, distance_next, direction, period)
+
+            if i > transient and np.any(crossed):
+                batch = np.flatnonzero(crossed)
+                s0_c, v0_c = s[:, batch], v[:, batch]
+                s1_c, v1_c = s_next[:, batch], v_next[:, batch]
+                theta = distance[batch] / (distance[batch] - distance_next[batch])
+                for _ in range(n_newton):
+                    s_c, v_c = hermite(s0_c, v0_c, s1_c, v1_c, dt, theta)
+                    if sampling == 'maxima':
+                        residual = v_c[index]
+                        slope = f[index](s_c, v_c, p[:, batch]) * dt
+                    else:
+                        residual = s_c[index] - (s0_c[index] - distance[batch])
+                        slope = v_c[index] * dt
+                    step = np.divide(residual, slope, out=np.zeros_like(theta),
+                                     where=slope != 0)
+                    theta = np.clip(theta - step, 0.0, 1.0)
+                s_c, v_c = hermite(s0_c, v0_c, s1_c, v1_c, dt, theta)
+                count[batch] += 1
+                yield p_value, batch, t + theta*dt, s_c, v_c
+
+            s, v, t, distance = s_next, v_next, t_next, distance_next
+            if n_points is not None and i > transient and np.all(count >= n_points):
+                break
+
+
+def continuation(model, asset, name, values, variable, sampling='maxima',
+                 section=None, value=0.0, direction=1, period=None,
+                 solver=RK4, time_step=1e-2, n_iter=5000, transient=1000,
+                 n_points=None, s0=None, v0=None, n_newton=4):
+    """Compute the bifurcation diagram of the model along the values of a
+    property, see `iter_continuation`. Only the sampled points are stored.
+
+    Returns:
+        DataFrame with the columns of the property, e.g. `drag_coeff_theta`,
+        `batch` and `time`, and the displacement and velocity of every
+        variable, e.g. `theta` and `thetadot`.
+    """
+    points = {'value': [], 'batch': [], 'time': [], 's': [], 'v': []}
+    for p_value, batch, time, s, v in iter_continuation(
+            model, asset, name, values, variable, sampling, section, value,
+            direction, period, solver, time_step, n_iter, transient, n_points,
+            s0, v0, n_newton):
+        points['value'].append(np.full(len(batch), p_value, dtype=float))
+        points['batch'].append(batch)
+        points['time'].append(time)
+        points['s'].append(s)
+        points['v'].append(v)
+
+    n = len(model.asset)
+    concat = lambda arrays, shape: np.concatenate(arrays, axis=-1) \
+        if arrays else np.empty(shape)
+    data = {model.parameter_symbol(asset, name).name: concat(points['value'], (0,)),
+            'batch': concat(points['batch'], (0,)).astype(int),
+            'time': concat(points['time'], (0,))}
+    s, v = concat(points['s'], (n, 0)), concat(points['v'], (n, 0))
+    for i, a in enumerate(model.asset):
+        data[a.var_name] = s[i]
+        data[a.var_name + 'dot'] = v[i]
+    return pd.DataFrame(data=data)
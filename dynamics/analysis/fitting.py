@@ -0,0 +1,191 @@
+"""The module `dynamics.analysis.fitting` estimates the properties of the
+components from measured trajectories. The model is derived once with the
+estimated properties kept symbolic, and the candidate parameter sets of each
+finite-difference Jacobian are integrated together in one vectorised batch."""
+
+import attr
+import numpy as np
+from scipy.optimize import least_squares
+
+from dynamics.tools.solver import RK4, hermite, reset
+
+__all__ = ['FitResult', 'fit', 'sample_batch']
+
+
+@attr.s(frozen=True)
+class FitResult:
+    """Results of the parameter estimation.
+
+    +--------------------+-------------------------------------------------+
+    | Attributes         | Details                                         |
+    +====================+=================================================+
+    | ``parameters``     | Names of the parameters, e.g. `mass_theta`.     |
+    +--------------------+-------------------------------------------------+
+    | ``values``         | Fitted values of the parameters.                |
+    +--------------------+-------------------------------------------------+
+    | ``standard_error`` | Standard error of the fitted values.            |
+    +--------------------+-------------------------------------------------+
+    | ``covariance``     | Covariance matrix of the fitted values.         |
+    +--------------------+-------------------------------------------------+
+    | ``cost``           | Half of the sum of squared residuals.           |
+    +--------------------+-------------------------------------------------+
+    | ``n_batches``      | Number of batched integrations.                 |
+    +--------------------+-------------------------------------------------+
+    | ``success``        | Whether the optimiser converged.                |
+    +--------------------+-------------------------------------------------+
+    """
+    parameters: list = attr.attrib()
+    values: np.ndarray = attr.attrib()
+    standard_error: np.ndarray = attr.attrib()
+    covariance: np.ndarray = attr.attrib()
+    cost: float = attr.attrib()
+    n_batches: int = attr.attrib()
+    success: bool = attr.attrib()
+    message: str = attr.attrib()
+
+    def as_dict(self):
+        """Fitted values by parameter name."""
+        return dict(zip(self.parameters, self.values))
+
+
+def sample_batch(f, p, s0, v0, t0, dt, time, solver=RK4):
+    """Integrate the parametric accelerations *f* for a batch of parameter
+    sets and sample the displacements at the given times.
+
+    Parameters:
+        f (list): Functions `f(s, v, p)` from `Model.compile`.
+        p (array): Parameter sets with shape `(n_parameters, n_batch)`.
+        s0, v0 (array): Initial displacements and velocities.
+        t0 (float): Initial time.
+        dt (float): Time step.
+        time (array): Sorted sampling times, not before *t0*.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+
+    Returns:
+        Displacements with shape `(n_time, n_assets, n_batch)`, interpolated
+        between the steps by cubic Hermite interpolation.
+    """
+    p = np.asarray(p)
+    position = (np.asarray(time) - t0) / dt
+    step = np.floor(position).astype(int)
+    theta = position - step
+    # Only the steps around the sampling times are kept.
+    needed = np.zeros(step.max() + 2, dtype=bool)
+    needed[step] = needed[step + 1] = True
+
+    accel = [lambda s, v, fun=fun: fun(s, v, p) for fun in f]
+    s = np.repeat(np.asarray(s0)[:, None], p.shape[1], axis=1)
+    v = np.repeat(np.asarray(v0)[:, None], p.shape[1], axis=1)
+    states, t = {0: (s, v)}, t0
+    reset(solver)
+    for i in range(1, len(needed)):
+        s, v, _, t = solver(accel, s, v, t, dt)
+        if needed[i]:
+            states[i] = (s, v)
+
+    s_lo = np.array([states[k][0] for k in step])
+    v_lo = np.array([states[k][1] for k in step])
+    s_hi = np.array([states[k + 1][0] for k in step])
+    v_hi = np.array([states[k + 1][1] for k in step])
+    sampled, _ = hermite(s_lo, v_lo, s_hi, v_hi, dt, theta[:, None, None])
+    return sampled
+
+
+class _Objective:
+    """Residuals and forward-difference Jacobian of the fit. Both are
+    computed by one batched integration of the parameter set and its
+    perturbations, which is cached for the last parameter set."""
+
+    def __init__(self, f, s0, v0, t0, dt, time, data, columns, solver, rel_step):
+        self.f, self.s0, self.v0, self.t0, self.dt = f, s0, v0, t0, dt
+        self.time, self.data, self.columns = time, data, columns
+        self.solver, self.rel_step = solver, rel_step
+        self.n_batches = 0
+        self._x = None
+
+    def evaluate(self, x):
+        if self._x is not None and np.array_equal(x, self._x):
+            return
+        step = self.rel_step * np.maximum(np.abs(x), 1.0)
+        p = np.column_stack([x] + [x + np.eye(len(x))[i]*step[i]
+                                   for i in range(len(x))])
+        sampled = sample_batch(self.f, p, self.s0, self.v0, self.t0, self.dt,
+                               self.time, self.solver)[:, self.columns, :]
+        residual = (sampled - self.data[..., None]).reshape(-1, p.shape[1])
+
+        self._x = np.array(x, copy=True)
+        self._residual = residual[:, 0]
+        self._jacobian = (residual[:, 1:] - residual[:, :1]) / step
+        self.n_batches += 1
+
+    def residual(self, x):
+        self.evaluate(x)
+        return self._residual
+
+    def jacobian(self, x):
+        self.evaluate(x)
+        return self._jacobian
+
+
+def fit(model, parameters, time, displacement, assets=None, solver=RK4,
+        time_step=1e-3, initial_guess=None, bounds=(-np.inf, np.inf),
+        rel_step=1e-6, **kwargs):
+    """Fit properties of the components to measured displacements by
+    nonlinear least squares.
+
+    Parameters:
+        model (Model): Model of the system, integrated from `time_start` and
+                       the initial conditions of the solutions of its assets.
+        parameters (list): List of `(asset, property)` pairs to fit, e.g.
+                           `(asset, 'drag_coeff')`.
+        time (array): Measured time with shape `(n_time,)`.
+        displacement (array): Measured displacements with shape `(n_time,)`
+                              or `(n_time, n_measured)`.
+        assets (list): Assets measured by the columns of *displacement*,
+                       by default all assets of the model.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        time_step (float): Time step of the integration.
+        initial_guess (array): Initial parameter values, by default the
+                               current properties of the components.
+        bounds (tuple): Lower and upper bounds of the parameters.
+        rel_step (float): Relative step of the finite-difference Jacobian.
+        kwargs (~): Keyword argument(s) passed to `scipy.optimize.least_squares`.
+
+    Returns:
+        FitResult of the fitted values with their standard errors.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    assets = model.asset if assets is None else assets
+    data = np.asarray(displacement, dtype=np.float64).reshape(len(time), len(assets))
+    if np.any(np.diff(time) < 0) or time[0] < model.time_start:
+        raise ValueError("Measured time must be sorted and not before the "
+                         "start time of the model.")
+
+    columns = [model.asset.index(asset) for asset in assets]
+    s0 = np.array([asset.solution.disp_0 for asset in model.asset], dtype=np.float64)
+    v0 = np.array([asset.solution.velo_0 for asset in model.asset], dtype=np.float64)
+    if initial_guess is None:
+        initial_guess = [getattr(asset.component, name) for asset, name in parameters]
+    x0 = np.asarray(initial_guess, dtype=np.float64)
+
+    objective = _Objective(model.compile(parameters), s0, v0, model.time_start,
+                           float(time_step), time, data, columns, solver, rel_step)
+    result = least_squares(objective.residual, x0, jac=objective.jacobian,
+                           bounds=bounds, **kwargs)
+
+    # Covariance from the Gauss-Newton approximation of the Hessian.
+    dof = max(data.size - len(x0), 1)
+    variance = 2 * result.cost / dof
+    covariance = variance * np.linalg.pinv(result.jac.T @ result.jac)
+
+    return FitResult(
+        parameters=[model.parameter_symbol(asset, name).name
+                    for asset, name in parameters],
+        values=result.x,
+        standard_error=np.sqrt(np.diag(covariance)),
+        covariance=covariance,
+        cost=result.cost,
+        n_batches=objective.n_batches,
+        success=result.success,
+        message=result.message,
+    )
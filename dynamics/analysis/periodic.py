@@ -0,0 +1,186 @@
+"""The module `dynamics.analysis.periodic` finds the periodic steady states of
+the model by shooting. Instead of integrating until the transients die out,
+the initial state reproducing itself after one period is found by Newton
+iterations on the flow map over a single period, and the stability of the
+orbit is given by its Floquet multipliers."""
+
+import attr
+import numpy as np
+
+from dynamics.tools.solver import RK4, reset
+from .chaos import _initial_batch
+
+__all__ = ['PeriodicOrbit', 'shooting']
+
+
+@attr.s(frozen=True)
+class PeriodicOrbit:
+    """Periodic orbit found by `shooting`.
+
+    +------------------+---------------------------------------------------+
+    | Attributes       | Details                                           |
+    +==================+===================================================+
+    | ``displacement`` | Initial displacements of the orbit.               |
+    +------------------+---------------------------------------------------+
+    | ``velocity``     | Initial velocities of the orbit.                  |
+    +------------------+---------------------------------------------------+
+    | ``period``       | Period of the orbit.                              |
+    +------------------+---------------------------------------------------+
+    | ``multipliers``  | Floquet multipliers, the eigenvalues of the       |
+    |                  | monodromy matrix.                                 |
+    +------------------+---------------------------------------------------+
+    | ``monodromy``    | Jacobian of the flow map over one period, in the  |
+    |                  | order of the displacements and the velocities.    |
+    +------------------+---------------------------------------------------+
+    | ``residual``     | Norm of the difference of the states after one    |
+    |                  | period.                                           |
+    +------------------+---------------------------------------------------+
+    | ``n_iterations`` | Number of Newton iterations.                      |
+    +------------------+---------------------------------------------------+
+    | ``autonomous``   | Whether the period was solved for.                |
+    +------------------+---------------------------------------------------+
+    | ``success``      | Whether the iterations converged.                 |
+    +------------------+---------------------------------------------------+
+    """
+    displacement: np.ndarray = attr.attrib()
+    velocity: np.ndarray = attr.attrib()
+    period: float = attr.attrib()
+    multipliers: np.ndarray = attr.attrib()
+    monodromy: np.ndarray = attr.attrib()
+    residual: float = attr.attrib()
+    n_iterations: int = attr.attrib()
+    autonomous: bool = attr.attrib()
+    success: bool = attr.attrib()
+
+    @property
+    def stable(self):
+        """Whether the orbit is asymptotically stable, i.e. every multiplier
+        is inside the unit circle, up to a tolerance of 1e-6 for the errors
+        of the integration. The multiplier 1 along the orbit of an autonomous
+        model is left out."""
+        magnitude = np.abs(self.multipliers)
+        if self.autonomous:
+            magnitude = np.delete(magnitude, np.argmin(np.abs(self.multipliers - 1)))
+        return bool(np.all(magnitude < 1 - 1e-6))
+
+
+def _flow_tangent(f, n, x, t0, period, n_steps, solver):
+    """Integrate the state *x* over one period with the tangent-linear
+    equations, returning the final state and the monodromy matrix."""
+    n_vectors = 2*n
+    deviation = np.eye(2*n)
+    s, v = x[:n, None], x[n:, None]
+    dt = float(period) / n_steps
+    t = t0
+    reset(solver)
+    for _ in range(n_steps):
+        s_aug = np.concatenate([s, deviation[:n].reshape(n*n_vectors, 1)])
+        v_aug = np.concatenate([v, deviation[n:].reshape(n*n_vectors, 1)])
+        s_aug, v_aug, _, t = solver(f, s_aug, v_aug, t, dt)
+        s, v = s_aug[:n], v_aug[:n]
+        deviation = np.concatenate([s_aug[n:].reshape(n, n_vectors),
+                                    v_aug[n:].reshape(n, n_vectors)])
+    return np.concatenate([s[:, 0], v[:, 0]]), deviation
+
+
+def _flow_difference(f, n, x, t0, period, n_steps, solver, epsilon):
+    """Integrate the state *x* over one period together with a perturbation of
+    every component in one batch, returning the final state and the monodromy
+    matrix by forward differences."""
+    step = epsilon * np.maximum(1.0, np.abs(x))
+    batch = np.concatenate([x[:, None], x[:, None] + np.diag(step)], axis=1)
+    s, v = batch[:n], batch[n:]
+    dt = float(period) / n_steps
+    t = t0
+    reset(solver)
+    for _ in range(n_steps):
+        s, v, _, t = solver(f, s, v, t, dt)
+    final = np.concatenate([s, v])
+    return final[:, 0], (final[:, 1:] - final[:, :1]) / step
+
+
+def shooting(model, period, s0=None, v0=None, autonomous=False, forcing=None,
+             solver=RK4, n_steps=200, tol=1e-10, max_iter=20, epsilon=1e-7):
+    """Find a periodic steady state of the model by the shooting method.
+
+    The initial state `x` of the orbit solves `phi(x) = x` for the flow map
+    `phi` over one period, by Newton iterations with the monodromy matrix
+    `dphi/dx`. The monodromy matrix is integrated with the tangent-linear
+    equations of the model, see `Model.compile_tangent`, or by forward
+    differences in a single batched integration for a forced model.
+
+    For an autonomous (self-excited) model the period is unknown and solved
+    for from the initial guess, with the phase condition that the orbit
+    crosses the plane through the initial guess normal to the flow. The Newton
+    steps are truncated least-squares solutions, so along a family of orbits
+    of a conservative model the iterations converge to an orbit close to the
+    initial guess.
+
+    Parameters:
+        model (Model): Model of the system.
+        period (float): Period of the forcing, or initial guess of the period
+                        of an autonomous model.
+        s0, v0 (array): Initial guess of the displacements and velocities, by
+                        default the initial conditions of the assets.
+        autonomous (bool): Whether the period is solved for.
+        forcing (Forcing): Optional generalised forces, see `Model.compile`,
+                           periodic with the period from `time_start`.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        n_steps (int): Number of steps of the integration over one period.
+        tol (float): Tolerance on the norm of `phi(x) - x`.
+        max_iter (int): Maximum number of Newton iterations.
+        epsilon (float): Relative perturbation of the forward differences.
+
+    Returns:
+        PeriodicOrbit
+    """
+    if autonomous and forcing is not None:
+        raise ValueError("A forced model has the period of its forcing.")
+    n = len(model.asset)
+    s, v = _initial_batch(model, s0, v0)
+    if s.shape[1] != 1:
+        raise ValueError("Shooting takes a single initial guess.")
+    x = np.concatenate([s[:, 0], v[:, 0]]).astype(float)
+    period = float(period)
+    t0 = model.time_start
+
+    if forcing is None:
+        f = model.compile_tangent(2*n)
+        flow = lambda x, period: _flow_tangent(f, n, x, t0, period, n_steps, solver)
+    else:
+        f = model.compile(forcing=forcing)
+        flow = lambda x, period: _flow_difference(f, n, x, t0, period, n_steps,
+                                                  solver, epsilon)
+    if autonomous:
+        rhs = model.compile()
+        field = lambda x: np.concatenate(
+            [x[n:], [fun(x[:n], x[n:]) for fun in rhs]]).astype(float)
+        # The phase is fixed on the plane through the initial guess normal
+        # to the flow, which also keeps the orbit off the equilibria.
+        anchor, normal = x.copy(), field(x)
+
+    success = False
+    for iteration in range(max_iter + 1):
+        final, monodromy = flow(x, period)
+        residual = final - x
+        if np.linalg.norm(residual) < tol:
+            success = True
+            break
+        if iteration == max_iter:
+            break
+        jacobian = monodromy - np.eye(2*n)
+        if autonomous:
+            # Unknowns (x, period) with the phase condition.
+            jacobian = np.block([[jacobian, field(final)[:, None]],
+                                 [normal[None, :], np.zeros((1, 1))]])
+            residual = np.concatenate([residual, [normal @ (x - anchor)]])
+        # Directions of nearly singular values, e.g. along a family of orbits
+        # of a conservative model, are left out of the step.
+        step = np.linalg.lstsq(jacobian, -residual, rcond=1e-6)[0]
+        x = x + step[:2*n]
+        if autonomous:
+            period += step[2*n]
+
+    return PeriodicOrbit(x[:n], x[n:], period, np.linalg.eigvals(monodromy),
+                         monodromy, float(np.linalg.norm(final - x)), iteration,
+                         autonomous, success)
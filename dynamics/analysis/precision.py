@@ -0,0 +1,124 @@
+"""The module `dynamics.analysis.precision` compares the accuracy of the
+numerical integrators against their cost. Each solver is run over a range
+of time steps and its error against a high-accuracy reference solution is
+tabulated with the number of evaluations of the accelerations and the wall
+time, from which the cheapest solver meeting a tolerance is selected."""
+
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from scipy.integrate import solve_ivp
+
+from dynamics.tools.solver import _evaluate, euler, improved_euler, RK2, RK4, reset
+
+__all__ = ['reference_solution', 'work_precision', 'select_solver',
+           'plot_work_precision']
+
+
+def reference_solution(f, s0, v0, t0, time_end, rtol=1e-12, atol=1e-12):
+    """Integrate the accelerations *f* with the adaptive DOP853 method of
+    `scipy.integrate.solve_ivp` at a tight tolerance.
+
+    Returns:
+        Dense output of the solution, called with the time to give the
+        displacements followed by the velocities.
+    """
+    n = len(s0)
+
+    def fun(t, y):
+        return np.concatenate([y[n:], _evaluate(f, y[:n], y[n:], t)])
+
+    solution = solve_ivp(fun, (t0, time_end), np.concatenate([s0, v0]),
+                         method='DOP853', rtol=rtol, atol=atol, dense_output=True)
+    return solution.sol
+
+
+def work_precision(model, solvers=(euler, improved_euler, RK2, RK4),
+                   time_steps=(1e-1, 5e-2, 2e-2, 1e-2, 5e-3, 2e-3, 1e-3),
+                   time_end=10.0, reference=None):
+    """Run every solver over the time steps and measure its error and cost.
+
+    Parameters:
+        model (Model): Model of the system, integrated from `time_start` and
+                       the initial conditions of the solutions of its assets.
+        solvers (list): Numerical integrators from `dynamics.tools.solver`.
+        time_steps (list): Time steps of the runs.
+        time_end (float): End time of the runs.
+        reference (callable): Reference solution, by default from
+                              `reference_solution`.
+
+    Returns:
+        DataFrame with one row per run and the columns `solver`, `time_step`,
+        `n_steps`, `error` (maximum absolute error of the displacements over
+        the steps), `rhs_evaluations` and `wall_time`.
+    """
+    f = model.compile()
+    n = len(model.asset)
+    s0 = np.array([asset.solution.disp_0 for asset in model.asset], dtype=np.float64)
+    v0 = np.array([asset.solution.velo_0 for asset in model.asset], dtype=np.float64)
+    t0 = model.time_start
+    if reference is None:
+        reference = reference_solution(f, s0, v0, t0, time_end)
+
+    # Count the evaluations of the accelerations by the first function.
+    counter = [0]
+    def counted(s, v, fun=f[0]):
+        counter[0] += 1
+        return fun(s, v)
+    f_counted = [counted] + f[1:]
+
+    rows = []
+    for solver in solvers:
+        for dt in time_steps:
+            n_steps = int(round((time_end - t0) / dt))
+            displacement = np.empty((n_steps, n))
+            reset(solver)
+
+            counter[0] = 0
+            s, v, t = s0, v0, t0
+            start = perf_counter()
+            for i in range(n_steps):
+                s, v, _, t = solver(f_counted, s, v, t, dt)
+                displacement[i] = s
+            wall_time = perf_counter() - start
+
+            time = t0 + dt * np.arange(1, n_steps + 1)
+            error = np.abs(displacement - reference(time)[:n].T).max()
+            rows.append({'solver': solver.__name__, 'time_step': dt,
+                         'n_steps': n_steps, 'error': error,
+                         'rhs_evaluations': counter[0], 'wall_time': wall_time})
+
+    return pd.DataFrame(rows)
+
+
+def select_solver(table, tolerance, cost='rhs_evaluations'):
+    """Select the cheapest run of a work-precision table with an error within
+    the tolerance.
+
+    Parameters:
+        table (DataFrame): Table from `work_precision`.
+        tolerance (float): Maximum error.
+        cost (str): Column measuring the cost, `rhs_evaluations` or `wall_time`.
+
+    Returns:
+        The row of the cheapest run, or None if no run meets the tolerance.
+    """
+    accurate = table[table['error'] <= tolerance]
+    if accurate.empty:
+        return None
+    return accurate.loc[accurate[cost].idxmin()]
+
+
+def plot_work_precision(table, cost='rhs_evaluations', ax=None):
+    """Plot the error of each solver against the cost on log-log axes."""
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        _, ax = plt.subplots()
+    for solver, runs in table.groupby('solver', sort=False):
+        ax.loglog(runs[cost], runs['error'], 'o-', label=solver)
+    ax.set_xlabel(cost.replace('_', ' '))
+    ax.set_ylabel('maximum error')
+    ax.legend()
+    return ax
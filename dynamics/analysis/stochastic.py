@@ -0,0 +1,139 @@
+"""The module `dynamics.analysis.stochastic` computes the statistics of the
+response of the model to additive white noise of the accelerations, from
+fixed, per-path or sampled initial conditions. Many sample paths are
+integrated as one vectorised batch with a stochastic solver, and the mean and
+variance of every variable are accumulated over the batches at every sampling
+time, so no sample path is stored."""
+
+import numpy as np
+import pandas as pd
+
+from dynamics.tools.solver import StochasticHeun, reset
+from .chaos import _initial_batch
+
+__all__ = ['ensemble_moments']
+
+
+class _Moments:
+    """Streaming mean and variance of batches of samples at every sampling
+    time, by the update of Welford generalised to batches (Chan et al.).
+
+    Parameters:
+        shape (tuple): Shape of the statistics, the number of sampling times
+                       first.
+    """
+
+    def __init__(self, shape) -> None:
+        self.count = np.zeros(shape[0], dtype=int)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, index, samples):
+        """Add a batch of samples at the sampling time *index*, along the last
+        axis of *samples*."""
+        n, count = samples.shape[-1], self.count[index]
+        mean = samples.mean(axis=-1)
+        m2 = ((samples - mean[..., None])**2).sum(axis=-1)
+        delta = mean - self.mean[index]
+        self.count[index] = count + n
+        self.mean[index] += delta * n / (count + n)
+        self.m2[index] += m2 + delta**2 * count * n / (count + n)
+
+    @property
+    def variance(self):
+        """Unbiased variance of the samples, NaN for less than two samples."""
+        count = self.count.reshape((-1,) + (1,) * (self.m2.ndim - 1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 1, self.m2 / (count - 1), np.nan)
+
+
+def ensemble_moments(model, sigma, n_paths=1000, solver=StochasticHeun, seed=0,
+                     time_step=1e-2, n_iter=1000, stride=1, batch_size=None,
+                     s0=None, v0=None, initial=None, forcing=None):
+    """Mean and variance of the response of the model to additive white noise
+    of the accelerations, over an ensemble of sample paths.
+
+    The sample paths are integrated in batches of *batch_size* paths, every
+    batch with a stochastic solver of its own seeded from *seed*, so the
+    statistics are reproducible for a given batch size. Every *stride* steps
+    the mean and variance of the batch are merged into the running
+    statistics, so the memory does not grow with the number of paths.
+
+    Parameters:
+        model (Model): Model of the system.
+        sigma (float or array): Intensity of the noise of the accelerations,
+                                or of every asset with shape `(n_assets,)`.
+        n_paths (int): Number of sample paths.
+        solver (class): Stochastic solver of `dynamics.tools.solver`, e.g.
+                        `StochasticHeun` or `EulerMaruyama`.
+        seed (int): Seed of the ensemble.
+        time_step (float): Time step of the integration.
+        n_iter (int): Number of steps.
+        stride (int): Number of steps between the sampling times.
+        batch_size (int): Number of paths integrated at a time, by default
+                          every path in a single batch.
+        s0, v0 (array): Initial displacements and velocities with shape
+                        `(n_assets,)`, or `(n_assets, n_paths)` for an
+                        initial state of every path, by default the initial
+                        conditions of the assets.
+        initial (callable): Optional sampler of the initial conditions,
+                            `initial(rng, size)` returns the displacements
+                            and velocities of *size* paths with shape
+                            `(n_assets, size)`, *rng* a `numpy.random.Generator`
+                            seeded from the batch; excludes *s0* and *v0*.
+        forcing (Forcing): Optional deterministic generalised forces, see
+                           `Model.compile`.
+
+    Returns:
+        DataFrame indexed by the sampling times, with the mean and variance
+        of the displacement and velocity of every variable, e.g.
+        `theta_mean`, `theta_var`, `thetadot_mean` and `thetadot_var`.
+    """
+    n = len(model.asset)
+    if initial is not None and (s0 is not None or v0 is not None):
+        raise ValueError("The initial conditions are either sampled or given.")
+    s0, v0 = _initial_batch(model, s0, v0)
+    if s0.shape[1] not in (1, n_paths):
+        raise ValueError("Initial conditions must have shape ({0},) or ({0}, {1}), "
+                         "got {2}.".format(n, n_paths, s0.shape))
+    sigma = np.asarray(sigma, dtype=np.float64)
+    if sigma.ndim and sigma.shape != (n,):
+        raise ValueError("Noise intensity must be a scalar or have shape ({},), "
+                         "got {}.".format(n, sigma.shape))
+    batch_size = n_paths if batch_size is None else min(int(batch_size), n_paths)
+
+    f = model.compile() if forcing is None else model.compile(forcing=forcing)
+    dt = float(time_step)
+    n_samples = n_iter // stride + 1
+    moments = _Moments((n_samples, 2, n))
+
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_paths // batch_size))
+    for k, batch_seed in enumerate(seeds):
+        size = min(batch_size, n_paths - k*batch_size)
+        stochastic = solver(sigma, batch_seed)
+        if initial is not None:
+            rng = np.random.default_rng(batch_seed.spawn(1)[0])
+            s, v = _initial_batch(model, *initial(rng, size))
+            if s.shape != (n, size):
+                raise ValueError("The sampler must return shape ({}, {}), got {}."
+                                 .format(n, size, s.shape))
+        elif s0.shape[1] == 1:
+            s, v = np.repeat(s0, size, axis=1), np.repeat(v0, size, axis=1)
+        else:
+            paths = slice(k*batch_size, k*batch_size + size)
+            s, v = s0[:, paths].copy(), v0[:, paths].copy()
+        t = model.time_start
+        reset(stochastic)
+        moments.update(0, np.stack([s, v]))
+        for i in range(1, n_iter + 1):
+            s, v, _, t = stochastic(f, s, v, t, dt)
+            if i % stride == 0:
+                moments.update(i // stride, np.stack([s, v]))
+
+    time = model.time_start + dt * stride * np.arange(n_samples)
+    data = {}
+    for i, asset in enumerate(model.asset):
+        for j, suffix in enumerate(('', 'dot')):
+            data[asset.var_name + suffix + '_mean'] = moments.mean[:, j, i]
+            data[asset.var_name + suffix + '_var'] = moments.variance[:, j, i]
+    return pd.DataFrame(data=data, index=pd.Index(time, name='time'))
@@ -0,0 +1,236 @@
+"""The module `dynamics.analysis.surrogate` answers repeated queries of the
+state of a model from a table of precomputed trajectories. A grid of initial
+conditions and properties is integrated once in a single batch, the sampled
+states are stored in a table which can be memory-mapped from disk, and the
+state at any time and point of the grid is interpolated from it. The error of
+the interpolation is estimated from validation runs held out of the grid."""
+
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+
+from dynamics.tools.solver import RK4, hermite, reset
+
+__all__ = ['Surrogate', 'build_surrogate']
+
+
+class Surrogate:
+    """Interpolation table of the trajectories of a model over a grid of
+    initial conditions and properties, see `build_surrogate`.
+
+    Parameters:
+        axes (dict): Values of every axis of the grid by name, e.g.
+                     `theta_0` for the initial displacement of `theta` or
+                     `drag_coeff_theta` for a property.
+        time (array): Uniform sampling times of the table.
+        variables (list): Variable names of the assets.
+        table (array): States with shape `(*grid, n_time, 2, n_assets)`, the
+                       displacements and velocities of every sampling time.
+        error (DataFrame): Maximum and RMS error of every variable from the
+                           validation runs.
+
+    The state is interpolated by cubic Hermite interpolation in time and
+    multilinear interpolation over the grid.
+    """
+
+    def __init__(self, axes, time, variables, table, error=None) -> None:
+        self.axes = {name: np.asarray(values, dtype=np.float64)
+                     for name, values in axes.items()}
+        self.time = np.asarray(time, dtype=np.float64)
+        self.variables = list(variables)
+        self.table = table
+        self.error = error
+        self._dt = self.time[1] - self.time[0]
+
+    def __call__(self, t, **point):
+        """The interpolated displacements and velocities at the time *t* and
+        the point of the grid given by the values of every axis, e.g.
+        `surrogate(1.5, theta_0=0.3, drag_coeff_theta=0.2)`.
+
+        The time and the values may be arrays broadcast together.
+
+        Returns:
+            s, v (array): Displacements and velocities with shape
+                          `(*shape, n_assets)`.
+        """
+        if set(point) != set(self.axes):
+            raise ValueError("Point must give the axes {}, got {}."
+                             .format(list(self.axes), list(point)))
+        values = np.broadcast_arrays(np.asarray(t, dtype=np.float64),
+                                     *[np.asarray(point[name], dtype=np.float64)
+                                       for name in self.axes])
+        t, values = values[0], values[1:]
+
+        index, weight = [], []
+        for (name, axis), value in zip(self.axes.items(), values):
+            if np.any(value < axis[0]) or np.any(value > axis[-1]):
+                raise ValueError("Value of '{}' is outside of [{}, {}]."
+                                 .format(name, axis[0], axis[-1]))
+            i = np.clip(np.searchsorted(axis, value, side='right') - 1, 0, len(axis) - 2)
+            index.append(i)
+            weight.append((value - axis[i]) / (axis[i + 1] - axis[i]))
+        # The times within a rounding error of the table are on its ends.
+        tolerance = 1e-6 * self._dt
+        if np.any(t < self.time[0] - tolerance) or np.any(t > self.time[-1] + tolerance):
+            raise ValueError("Time is outside of [{}, {}]."
+                             .format(self.time[0], self.time[-1]))
+        t = np.clip(t, self.time[0], self.time[-1])
+        position = (t - self.time[0]) / self._dt
+        k = np.clip(np.floor(position).astype(int), 0, len(self.time) - 2)
+
+        lo = hi = 0.0
+        for corner in itertools.product((0, 1), repeat=len(index)):
+            w = np.ones(t.shape)
+            for c, wi in zip(corner, weight):
+                w = w * (wi if c else 1 - wi)
+            grid = tuple(i + c for i, c in zip(index, corner))
+            lo = lo + w[..., None, None] * self.table[grid + (k,)]
+            hi = hi + w[..., None, None] * self.table[grid + (k + 1,)]
+        theta = (position - k)[..., None]
+        return hermite(lo[..., 0, :], lo[..., 1, :], hi[..., 0, :], hi[..., 1, :],
+                       self._dt, theta)
+
+    def save(self, path):
+        """Save the table as `path.npy` and the axes, times and errors as
+        `path.json`."""
+        np.save(path + '.npy', np.asarray(self.table))
+        metadata = {'axes': {name: axis.tolist() for name, axis in self.axes.items()},
+                    'time': self.time.tolist(), 'variables': self.variables,
+                    'error': None if self.error is None else self.error.to_dict()}
+        with open(path + '.json', 'w') as file:
+            json.dump(metadata, file)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a table saved by `save`, memory-mapped by default so only the
+        queried entries are read from disk."""
+        with open(path + '.json') as file:
+            metadata = json.load(file)
+        table = np.load(path + '.npy', mmap_mode=mmap_mode)
+        error = None if metadata['error'] is None else pd.DataFrame(metadata['error'])
+        return cls(metadata['axes'], metadata['time'], metadata['variables'], table,
+                   error)
+
+
+def _axis_target(model, name):
+    """The `('disp_0' or 'velo_0', asset index)` of an initial condition axis,
+    or the `(asset, property)` pair of a property axis."""
+    for i, asset in enumerate(model.asset):
+        if name == asset.var_name + '_0':
+            return 'disp_0', i
+        if name == asset.var_name + 'dot_0':
+            return 'velo_0', i
+    for asset, prop in model.parameters:
+        if model.parameter_symbol(asset, prop).name == name:
+            return asset, prop
+    raise ValueError("Unknown axis '{}'.".format(name))
+
+
+def _integrate(model, f, parameters, points, names, solver, dt, n_steps, stride):
+    """Integrate the model for a batch of points with shape
+    `(n_axes, n_batch)`, returning the states of every *stride* steps with
+    shape `(n_samples, 2, n_assets, n_batch)`."""
+    n_batch = points.shape[1]
+    s = np.repeat(np.array([[asset.solution.disp_0] for asset in model.asset],
+                           dtype=np.float64), n_batch, axis=1)
+    v = np.repeat(np.array([[asset.solution.velo_0] for asset in model.asset],
+                           dtype=np.float64), n_batch, axis=1)
+    p = np.zeros((len(parameters), n_batch))
+    for name, values in zip(names, points):
+        target = _axis_target(model, name)
+        if target[0] == 'disp_0':
+            s[target[1]] = values
+        elif target[0] == 'velo_0':
+            v[target[1]] = values
+        else:
+            p[parameters.index(target)] = values
+    accel = [lambda s, v, fun=fun: fun(s, v, p) for fun in f] if parameters else f
+
+    t = model.time_start
+    samples = [(s, v)]
+    reset(solver)
+    for i in range(1, n_steps + 1):
+        s, v, _, t = solver(accel, s, v, t, dt)
+        if i % stride == 0:
+            samples.append((s, v))
+    return np.array(samples)
+
+
+def build_surrogate(model, axes, time_end, solver=RK4, time_step=1e-2, stride=1,
+                    n_validation=20, seed=0, dtype=np.float64):
+    """Build the interpolation table of the trajectories of the model over a
+    grid of initial conditions and properties.
+
+    Every point of the grid is integrated from `time_start` to *time_end* in
+    a single vectorised batch, with the properties kept symbolic in the
+    compiled model, see `Model.compile`. The error of the table is estimated
+    from *n_validation* runs at random points inside the grid, compared with
+    the interpolation at every step.
+
+    Parameters:
+        model (Model): Model of the system, the initial conditions and
+                       properties not on the grid are the current ones.
+        axes (dict): Values of every axis of the grid by name, e.g.
+                     `{'theta_0': np.linspace(0, 1, 11),
+                     'drag_coeff_theta': np.linspace(0, 0.5, 6)}`. The names
+                     are `<variable>_0` for the initial displacements,
+                     `<variable>dot_0` for the initial velocities and the
+                     names of the parameter symbols for the properties.
+        time_end (float): End time of the trajectories.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        time_step (float): Time step of the integration.
+        stride (int): Number of steps between the sampling times of the table,
+                      the last sampling time is rounded up to a whole number
+                      of strides past *time_end*.
+        n_validation (int): Number of validation runs.
+        seed (int): Seed of the validation points.
+        dtype (type): Precision of the table, e.g. `np.float32` to halve its
+                      size.
+
+    Returns:
+        Surrogate
+    """
+    names = list(axes)
+    grid = [np.asarray(axes[name], dtype=np.float64) for name in names]
+    for name, axis in zip(names, grid):
+        if axis.ndim != 1 or len(axis) < 2 or np.any(np.diff(axis) <= 0):
+            raise ValueError("Axis '{}' must have at least 2 increasing values."
+                             .format(name))
+    targets = [_axis_target(model, name) for name in names]
+    parameters = [target for target in targets
+                  if target[0] not in ('disp_0', 'velo_0')]
+    f = model.compile(parameters)
+
+    dt = float(time_step)
+    n_steps = int(round((time_end - model.time_start) / dt))
+    # The table covers *time_end* with a whole number of strides.
+    n_steps = -(-n_steps // stride) * stride
+    # The times of the table and of the validation are of the same steps.
+    time = model.time_start + dt * np.arange(0, n_steps + 1, stride)
+
+    shape = tuple(len(axis) for axis in grid)
+    points = np.array([mesh.ravel() for mesh in np.meshgrid(*grid, indexing='ij')])
+    samples = _integrate(model, f, parameters, points, names, solver, dt, n_steps,
+                         stride)
+    # (n_time, 2, n_assets, n_batch) to (*grid, n_time, 2, n_assets).
+    table = np.moveaxis(samples, -1, 0).reshape(shape + samples.shape[:-1]).astype(dtype)
+    variables = [asset.var_name for asset in model.asset]
+    surrogate = Surrogate(dict(zip(names, grid)), time, variables, table)
+
+    if n_validation:
+        rng = np.random.default_rng(seed)
+        held_out = np.array([rng.uniform(axis[0], axis[-1], n_validation)
+                             for axis in grid])
+        exact = _integrate(model, f, parameters, held_out, names, solver, dt,
+                           n_steps, 1)
+        steps = model.time_start + dt * np.arange(n_steps + 1)
+        s, v = surrogate(steps[:, None], **dict(zip(names, held_out)))
+        error = np.concatenate([s - exact[:, 0].transpose(0, 2, 1),
+                                v - exact[:, 1].transpose(0, 2, 1)], axis=-1)
+        error = error.reshape(-1, 2 * len(variables))
+        surrogate.error = pd.DataFrame(
+            {'max': np.abs(error).max(axis=0), 'rms': np.sqrt((error**2).mean(axis=0))},
+            index=variables + [var_name + 'dot' for var_name in variables])
+    return surrogate
@@ -1,12 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Optional
 
 import numpy as np
 import pandas as pd
-import sympy as sp
-from sympy.physics.vector import dynamicsymbols
 
 if TYPE_CHECKING:
+    from dynamics.model import Model
     from dynamics.tools import Body, Solution
 
 @dataclass
@@ -21,6 +20,8 @@ class Asset:
     solution: 'Solution'
     motion_func: callable
     connection: Optional['Asset'] = None
+    _model: Optional['Model'] = field(default=None, init=False, repr=False,
+                                      compare=False)
 
     @property
     def motion(self):
@@ -28,21 +29,53 @@ class Asset:
 
     @property
     def results(self):
-        x_sym, y_sym = self.motion
-        x_func = sp.lambdify(dynamicsymbols(self.var_name), x_sym, 'numpy')
-        y_func = sp.lambdify(dynamicsymbols(self.var_name), y_sym, 'numpy')
+        return self.get_results()
 
+    def get_results(self, position=None, velocity=None):
+        """Get the results of the asset.
+
+        Parameters:
+            position (array): Global positions with shape `(2, n_steps)`.
+            velocity (array): Global velocities with shape `(2, n_steps)`.
+
+        If the positions and velocities are not given, they are evaluated by
+        the kinematics of a model of this asset and its connections.
+        """
         n_data_points = len(self.solution.time)
+        dtype = self.solution.dtype
+
+        if position is None or velocity is None:
+            position, velocity = self._global_kinematics()
 
         data = {
             'asset': [self.name] * n_data_points,
             'variable': [self.var_name] * n_data_points,
             'time': self.solution.time,
-            'displacement': self.solution.displacement,
-            'velocity': self.solution.velocity,
-            'acceleration': self.solution.acceleration,
-            'x': x_func(np.array(self.solution.displacement, dtype=np.float64)),
-            'y': y_func(np.array(self.solution.displacement, dtype=np.float64)),
+            'displacement': np.array(self.solution.displacement, dtype=dtype),
+            'velocity': np.array(self.solution.velocity, dtype=dtype),
+            'acceleration': np.array(self.solution.acceleration, dtype=dtype),
+            'x': position[0],
+            'y': position[1],
+            'vx': velocity[0],
+            'vy': velocity[1],
         }
 
-        return pd.DataFrame(data=data)
\ No newline at end of file
+        return pd.DataFrame(data=data)
+
+    def _global_kinematics(self):
+        """Global positions and velocities of the asset from a model of the
+        chain of connections ending with this asset."""
+        from dynamics.model import Model
+
+        chain = [self]
+        while chain[0].connection is not None:
+            chain.insert(0, chain[0].connection)
+        if self._model is None or len(self._model.asset) != len(chain) or \
+                any(a is not b for a, b in zip(self._model.asset, chain)):
+            self._model = Model(chain)
+
+        dtype = self.solution.dtype
+        s = np.array([asset.solution.displacement for asset in chain], dtype=dtype)
+        v = np.array([asset.solution.velocity for asset in chain], dtype=dtype)
+        position, velocity = self._model.kinematics(s, v)
+        return position[-1], velocity[-1]
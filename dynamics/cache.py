@@ -0,0 +1,245 @@
+"""The module `dynamics.cache` memoises the results of whole simulation runs
+on disk. A run is identified by a hash of its complete specification: the
+structure of the model, the properties of the components, the initial
+conditions, the simulation parameters and the solver. A cache is opted in by
+registering it in a simulation,
+
+    simulation.register('cache', ResultCache('~/.cache/dynamics'))
+
+after which a repeated run returns the stored results without deriving or
+integrating the model again.
+"""
+
+import hashlib
+import os
+import tempfile
+from functools import partial
+from types import CodeType, FunctionType, ModuleType
+
+import numpy as np
+import pandas as pd
+
+import dynamics
+from dynamics.distributed import Job
+
+__all__ = ['ResultCache']
+
+
+def _describe_code(code):
+    """A canonical description of the body of a code object, with the code
+    objects of the nested functions."""
+    def const(value):
+        if isinstance(value, CodeType):
+            return _describe_code(value)
+        if isinstance(value, frozenset):
+            # The order of a set of strings changes with the hash seed.
+            return 'frozenset({})'.format(sorted(repr(item) for item in value))
+        return repr(value)
+    consts = ','.join(const(value) for value in code.co_consts)
+    return '{}|{}|{}'.format(code.co_code.hex(), consts, ','.join(code.co_names))
+
+
+def _code_names(code):
+    """Names of the globals and attributes read by a code object and the code
+    objects of its nested functions."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def _describe_function(function, seen=frozenset()):
+    """A canonical description of a function, its qualified name and a hash of
+    its code, defaults, closure and the globals it reads.
+
+    The functions read from the globals of other modules, e.g. `rotation`
+    from a motion function of a script, are described by their code only,
+    so the description does not walk the libraries. A value of the closure or
+    the globals which cannot be described raises TypeError.
+    """
+    code = function.__code__
+    parts = [_describe_code(code), _describe(function.__defaults__),
+             _describe(function.__kwdefaults__)]
+    if seen is not None and id(function) not in seen:
+        seen = seen | {id(function)}
+        cells = []
+        for cell in function.__closure__ or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                cells.append('<empty>')
+                continue
+            cells.append(_describe_function(contents, seen)
+                         if isinstance(contents, FunctionType) else _describe(contents))
+        parts.append(','.join(cells))
+        for name in sorted(_code_names(code)):
+            if name not in function.__globals__:
+                continue
+            value = function.__globals__[name]
+            if isinstance(value, FunctionType):
+                same_module = value.__module__ == function.__module__
+                value = _describe_function(value, seen if same_module else None)
+            else:
+                value = _describe(value)
+            parts.append('{}={}'.format(name, value))
+    # The body is hashed, so editing a function gives a new key.
+    body = '|'.join(parts)
+    return '{}.{}@{}:{}#{}'.format(function.__module__, function.__qualname__,
+                                   code.co_filename, code.co_firstlineno,
+                                   hashlib.sha256(body.encode()).hexdigest()[:16])
+
+
+def _describe(value):
+    """A canonical description of a value of the run specification, functions
+    are described by their qualified names and a hash of their code, defaults,
+    closure and globals, see `_describe_function`, and solvers by their
+    qualified names."""
+    if isinstance(value, dict):
+        return '{' + ','.join('{}:{}'.format(key, _describe(value[key]))
+                              for key in sorted(value)) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_describe(item) for item in value) + ']'
+    if isinstance(value, (int, float, np.integer, np.floating)) and \
+            not isinstance(value, bool):
+        # Integral properties describe the same run as their float values.
+        return float(value).hex()
+    if isinstance(value, (bool, str, type(None), np.dtype)):
+        return repr(value)
+    if isinstance(value, np.ndarray):
+        return 'ndarray({},{},{})'.format(
+            value.dtype.str, value.shape,
+            hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()[:16])
+    if isinstance(value, ModuleType):
+        return 'module:{}'.format(value.__name__)
+    if isinstance(value, partial):
+        return 'partial({},{},{})'.format(_describe(value.func), _describe(value.args),
+                                          _describe(value.keywords))
+    if isinstance(value, FunctionType):
+        return _describe_function(value)
+    if callable(value):
+        # Solver objects, e.g. `AdamsBashforth`, are named after their options.
+        kind = type(value)
+        return '{}.{}:{}'.format(kind.__module__, kind.__qualname__,
+                                 getattr(value, '__name__', ''))
+    raise TypeError("Cannot describe {!r} for the cache key.".format(value))
+
+
+class ResultCache:
+    """On-disk cache of the results of simulation runs.
+
+    Parameters:
+        directory (str): Directory of the cache, created if missing.
+        max_bytes (int): Size of the cache, the least recently used results
+                         are evicted beyond it.
+
+    Every run is stored as a compressed `.npz` file of the columns of its
+    results, named by the key of the run. The access time of a result is
+    kept as the modification time of its file, so several processes may
+    share a cache directory.
+    """
+
+    suffix = '.npz'
+
+    def __init__(self, directory, max_bytes=256 * 2**20) -> None:
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, model, parameters, solver):
+        """The key of a run of the model with the `SimulationParameters` and the
+        solver, a SHA-256 hex digest. Raises TypeError when a part of the run,
+        e.g. a value in the closure of a motion function, cannot be described,
+        the run must not be memoised then."""
+        job = Job.from_model(model, parameters, solver)
+        description = _describe([
+            dynamics.__version__,
+            list(job.assets),
+            [parameters.time_step, parameters.time_start, parameters.time_end,
+             parameters.dtype],
+            job.solver, job.simplification, job.gravity, list(job.direction_grav),
+        ])
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def get(self, key):
+        """The results stored under *key*, or None."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                columns = list(data['__columns__'])
+                results = pd.DataFrame({column: data[column] for column in columns},
+                                       index=data['__index__'])
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return results
+
+    def put(self, key, results):
+        """Store the results under *key*, evicting the least recently used
+        results beyond the size of the cache."""
+        arrays = {}
+        for column in results.columns:
+            array = np.asarray(results[column])
+            # Names are stored as fixed-width strings rather than pickled objects.
+            arrays[column] = array.astype(str) if array.dtype == object else array
+        arrays['__columns__'] = np.array(results.columns, dtype=str)
+        # The index is kept, so a hit returns the frame of a miss.
+        index = np.asarray(results.index)
+        arrays['__index__'] = index.astype(str) if index.dtype == object else index
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez_compressed(file, **arrays)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results beyond the size of the cache."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove every result of the cache."""
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                os.remove(os.path.join(self.directory, name))
+
+    @property
+    def size(self):
+        """Total size of the stored results in bytes."""
+        return sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory) if name.endswith(self.suffix))
+
+    def __len__(self):
+        return sum(name.endswith(self.suffix) for name in os.listdir(self.directory))
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
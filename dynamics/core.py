@@ -8,7 +8,8 @@ from functools import partial
 import attr
 import numpy as np
 
-from dynamics.tools.solver import euler
+from dynamics.realtime import run_realtime
+from dynamics.tools.solver import EulerMaruyama, euler
 
 class Simulation:
     """A simulation class for nonlinear dynamics that contains model, solver
@@ -22,6 +23,8 @@ class Simulation:
         self.register("model", None)
         self.register("solver", euler)
         self.register("results", None)
+        self.register("sensitivity", None)
+        self.register("cache", None)
         self.register("parameters", None)
 
     def register(self, alias, function, *args, **kwargs) -> None:
@@ -64,9 +67,79 @@ class Simulation:
         """
         delattr(self, alias)
 
-    def run(self) -> None:
+    def run(self, sensitivity=None, forcing=None) -> None:
         """Run the simulation for the given model and solver, the results are store
-        in attribute `results`."""
+        in attribute `results`. If a `dynamics.cache.ResultCache` is registered as
+        `cache`, the results of a repeated run are taken from the cache, except
+        for stochastic solvers without a seed.
+
+        Parameters:
+            sensitivity (list): Optional list of `(asset, property)` pairs, the
+                                sensitivities of the motion with respect to these
+                                properties are computed in the same run and stored
+                                in attribute `sensitivity`.
+            forcing (Forcing): Optional generalised forces or accelerations of the
+                               base driving the model, see
+                               `dynamics.tools.forcing`.
+        """
+        self._initialise_model()
+        # Runs with sensitivities or forcing, and unseeded stochastic runs
+        # which are not reproducible, are not memoised.
+        cached = self.cache is not None and not sensitivity and forcing is None \
+            and not (isinstance(self.solver, EulerMaruyama) and self.solver.seed is None)
+        if cached:
+            try:
+                key = self.cache.key(self.model, self.parameters, self.solver)
+            except TypeError:
+                # A run which cannot be identified is not memoised.
+                cached = False
+        if cached:
+            results = self.cache.get(key)
+            if results is not None:
+                self._restore_solutions(results)
+                self.results = results
+                return
+
+        self.model.solve(self.solver, sensitivity=sensitivity, forcing=forcing)
+        self.results = self.model.get_results()
+        if sensitivity:
+            self.sensitivity = self.model.get_sensitivity()
+        if cached:
+            self.cache.put(key, self.results)
+
+    def run_realtime(self, publish, speed=1.0, max_substeps=10, stop=None):
+        """Run the simulation in step with the wall clock, publishing every state
+        as it is computed instead of storing the results.
+
+        Parameters:
+            publish (callable): Called with every `dynamics.realtime.State`, or
+                                a queue the states are put in.
+            speed (float): Simulated seconds per wall-clock second.
+            max_substeps (int): Largest number of steps taken to catch up.
+            stop (threading.Event): Optional event ending the run.
+
+        Returns:
+            RealTimeStats: Latency and deadline statistics of the run, see
+                           `dynamics.realtime.run_realtime`.
+        """
+        self._initialise_model()
+        return run_realtime(self.model, self.solver, publish, speed=speed,
+                            max_substeps=max_substeps, stop=stop)
+
+    def _restore_solutions(self, results) -> None:
+        """Restore the solutions of the assets from cached results, which hold
+        the rows of every asset of the model in turn."""
+        n_data_points = len(results) // len(self.model.asset)
+        for i, asset in enumerate(self.model.asset):
+            rows = results.iloc[i * n_data_points:(i + 1) * n_data_points]
+            asset.solution.dtype = self.parameters.dtype
+            asset.solution.time = list(rows['time'])
+            asset.solution.displacement = list(rows['displacement'])
+            asset.solution.velocity = list(rows['velocity'])
+            asset.solution.acceleration = list(rows['acceleration'])
+
+    def _initialise_model(self) -> None:
+        """Check the simulation is complete and initialise the model."""
         if self.parameters == False:
             raise RuntimeError(
                     """Please use set_parameters method to set parameters before
@@ -79,19 +152,23 @@ class Simulation:
 
         self.model.initialise(time_step=self.parameters.time_step,
                               time_start=self.parameters.time_start,
-                              n_iter=self.parameters.n_iter)
-        self.model.solve(self.solver)
-        self.results = self.model.get_results()
+                              n_iter=self.parameters.n_iter,
+                              dtype=self.parameters.dtype)
 
     def reset(self) -> None:
         """Reset the simulation results a attribute."""
         self.parameters = None
         self.results = None
+        self.sensitivity = None
 
     def set_paramters(self, time_step: float = 1e-3,
-                      time_start: float = 0.0, time_end: float = 2.0) -> None:
-        """Set the simulation parameters."""
-        self.parameters = SimulationParameters(time_step, time_start, time_end)
+                      time_start: float = 0.0, time_end: float = 2.0,
+                      dtype=np.float64) -> None:
+        """Set the simulation parameters. The *dtype* (`np.float64` or
+        `np.float32`) sets the precision of the state buffers, the evaluation
+        of the accelerations and the stored results."""
+        self.parameters = SimulationParameters(time_step, time_start, time_end,
+                                               dtype)
 
 
 @attr.s(frozen=True)
@@ -100,6 +177,10 @@ class SimulationParameters:
     time_start: np.float_ = attr.attrib(converter=np.float_)
     time_end: np.float_ = attr.attrib(converter=np.float_)
     n_iter: np.int_ = attr.attrib(init=False, converter=np.int_)
+    dtype: np.dtype = attr.attrib(
+        default=np.float64, converter=np.dtype,
+        validator=attr.validators.in_([np.dtype(np.float32),
+                                       np.dtype(np.float64)]))
 
     def __attrs_post_init__(self):
         object.__setattr__(self, 'n_iter', 
@@ -0,0 +1,650 @@
+"""The module `dynamics.distributed` runs batches of simulation jobs on
+workers, either local processes or processes on other hosts, connected to a
+coordinator over TCP.
+
+A `Job` is a picklable description of a simulation: the assets of the model,
+the simulation parameters and the solver. The `Coordinator` serves the queue
+of jobs from a `multiprocessing.managers` server, the workers started by
+`run_worker` lease batches of jobs, run them and send back the compressed
+results. The jobs of a worker which stops responding are handed out again,
+and the results are collected in the order of the jobs.
+
+The connections exchange pickles, which can run arbitrary code when loaded.
+They are authenticated by the key of the coordinator, random by default, but
+the port should only be exposed to trusted networks.
+
+On a single host, `run_shared` avoids the serialisation of the results: the
+local workers write them directly into a `SharedResults` block of shared
+memory, and the results are NumPy views of the block.
+"""
+
+import io
+import os
+import socket
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager
+from multiprocessing.shared_memory import SharedMemory
+from uuid import uuid4
+
+import attr
+import numpy as np
+from scipy.constants import g as g_acc
+
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution
+from dynamics.tools.solver import RK4, reset
+
+__all__ = ['Job', 'Coordinator', 'run_worker', 'run_jobs', 'SharedResults',
+           'run_shared']
+
+_KEYS = ('time', 'displacement', 'velocity', 'acceleration')
+
+
+@attr.s(frozen=True)
+class Job:
+    """A picklable simulation job, the model is built again by the worker.
+
+    +--------------------+-------------+-------------------------------------+
+    | Attributes         | Default     | Details                             |
+    +====================+=============+=====================================+
+    | ``assets``         |             | Definitions of the assets, see      |
+    |                    |             | `from_model`.                       |
+    +--------------------+-------------+-------------------------------------+
+    | ``parameters``     |             | `SimulationParameters` of the run.  |
+    +--------------------+-------------+-------------------------------------+
+    | ``solver``         | RK4         | Solver of `dynamics.tools.solver`.  |
+    +--------------------+-------------+-------------------------------------+
+    | ``simplification`` | 'full'      | Simplification policy of the model. |
+    +--------------------+-------------+-------------------------------------+
+    | ``gravity``        | g           | Acceleration due to gravity.        |
+    +--------------------+-------------+-------------------------------------+
+    | ``direction_grav`` | (0, 1)      | Direction of gravity.               |
+    +--------------------+-------------+-------------------------------------+
+
+    The motion functions and the solver are pickled by reference, they must
+    be importable by the workers.
+    """
+    assets: tuple = attr.attrib(converter=tuple)
+    parameters = attr.attrib()
+    solver = attr.attrib(default=RK4)
+    simplification: str = attr.attrib(default='full')
+    gravity: float = attr.attrib(default=g_acc)
+    direction_grav: tuple = attr.attrib(default=(0, 1), converter=tuple)
+
+    @classmethod
+    def from_model(cls, model, parameters, solver=RK4):
+        """Job of the given model, with the current properties of the
+        components and initial conditions of the solutions.
+
+        Parameters:
+            model (Model): The model to run.
+            parameters (SimulationParameters): Time window and precision.
+            solver (method): Numerical integrator from `dynamics.tools.solver`.
+        """
+        index = {id(asset): i for i, asset in enumerate(model.asset)}
+        assets = []
+        for asset in model.asset:
+            if asset.connection is not None and id(asset.connection) not in index:
+                raise ValueError("The connection of asset '{}' is not in the model."
+                                 .format(asset.name))
+            disp_0, velo_0, _, _ = asset.solution.initial_conditions
+            spec = {
+                'name': asset.name,
+                'var_name': asset.var_name,
+                'motion_func': asset.motion_func,
+                'connection': None if asset.connection is None
+                              else index[id(asset.connection)],
+                'disp_0': disp_0,
+                'velo_0': velo_0,
+            }
+            spec.update({name: getattr(asset.component, name)
+                         for name in Model.properties})
+            assets.append(spec)
+        return cls(assets, parameters, solver, model.simplification,
+                   model.gravity, model.direction_grav)
+
+    @classmethod
+    def from_simulation(cls, simulation):
+        """Job of the model, parameters and solver of a simulation."""
+        return cls.from_model(simulation.model, simulation.parameters,
+                              simulation.solver)
+
+    def build(self):
+        """Build the model of the job."""
+        assets = [Asset(spec['name'], spec['var_name'],
+                        Body(*(spec[name] for name in Model.properties),
+                             name=spec['name']),
+                        Solution(spec['disp_0'], spec['velo_0'],
+                                 self.parameters.time_start),
+                        spec['motion_func'])
+                  for spec in self.assets]
+        for asset, spec in zip(assets, self.assets):
+            if spec['connection'] is not None:
+                asset.connection = assets[spec['connection']]
+
+        model = Model(assets, self.simplification)
+        model.gravity = self.gravity
+        model.initialise(direction_grav=self.direction_grav,
+                         time_step=self.parameters.time_step,
+                         n_iter=self.parameters.n_iter,
+                         time_start=self.parameters.time_start,
+                         dtype=self.parameters.dtype)
+        return model
+
+    def run(self, out=None):
+        """Run the job.
+
+        Parameters:
+            out (dict): Optional arrays the results are written into, with
+                        the keys and shapes of the returned arrays, e.g.
+                        views of a shared memory block.
+
+        Returns:
+            dict: The `time` with shape `(n_iter + 1,)`, and the `displacement`,
+                  `velocity` and `acceleration` of the assets with shape
+                  `(n_iter + 1, n_assets)`.
+        """
+        model = self.build()
+        # The derivation is cached by the model, a worker only derives and
+        # compiles the first job of every structure.
+        f = model.compile()
+        s, v = model._initial_state()
+
+        n_iter, dtype = int(model.n_iter), model.dtype
+        if out is None:
+            time_ = np.empty(n_iter + 1)
+            displacement = np.empty((n_iter + 1, len(s)), dtype=dtype)
+            velocity = np.empty_like(displacement)
+            acceleration = np.empty_like(displacement)
+        else:
+            time_, displacement, velocity, acceleration = (
+                out[key] for key in _KEYS)
+        time_[0], displacement[0], velocity[0] = model.time_start, s, v
+
+        t, dt = model.time_start, float(model.time_step)
+        reset(self.solver)
+        for i in range(n_iter):
+            s, v, a, t = self.solver(f, s, v, t, dt)
+            time_[i+1], displacement[i+1], velocity[i+1] = t, s, v
+            acceleration[i+1] = a
+        acceleration[0] = acceleration[1] if n_iter else 0.0
+
+        return dict(zip(_KEYS, (time_, displacement, velocity, acceleration)))
+
+
+def _compress(arrays):
+    """Compress a dict of arrays into bytes."""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _decompress(payload):
+    """Decompress the bytes of `_compress` into a dict of arrays."""
+    with np.load(io.BytesIO(payload)) as data:
+        return {key: data[key] for key in data.files}
+
+
+class _Scheduler:
+    """Queue of jobs shared by the coordinator and the workers.
+
+    A job is leased to a worker until its result is returned. A worker which
+    has not been heard of for *lease_timeout* seconds is considered lost and
+    its jobs are queued again, a job is given up after *max_retries* retries.
+    """
+
+    def __init__(self, jobs, lease_timeout, max_retries):
+        self._jobs = list(jobs)
+        self._lease_timeout = lease_timeout
+        self._max_retries = max_retries
+        self._lock = threading.Lock()
+        self._pending = deque(range(len(self._jobs)))
+        self._leases = {}
+        self._seen = {}
+        self._attempts = [0] * len(self._jobs)
+        self._results = {}
+        self._errors = {}
+
+    def lease(self, worker, size=1):
+        """Lease up to *size* jobs `(index, job)` to the worker, an empty list
+        if every remaining job is leased and None if the queue is finished."""
+        with self._lock:
+            self._seen[worker] = time.monotonic()
+            self._expire()
+            if self._finished():
+                return None
+            batch = []
+            while self._pending and len(batch) < size:
+                index = self._pending.popleft()
+                self._leases[index] = worker
+                self._attempts[index] += 1
+                batch.append((index, self._jobs[index]))
+            return batch
+
+    def complete(self, worker, index, payload):
+        """Store the compressed result of a job, the first result is kept if
+        a requeued job is completed twice."""
+        with self._lock:
+            self._seen[worker] = time.monotonic()
+            if index in self._results or index in self._errors:
+                return
+            self._results[index] = payload
+            self._leases.pop(index, None)
+            if index in self._pending:
+                self._pending.remove(index)
+
+    def fail(self, worker, index, message):
+        """Report the failure of a job, which is retried."""
+        with self._lock:
+            self._seen[worker] = time.monotonic()
+            if self._leases.get(index) == worker:
+                del self._leases[index]
+                self._retry(index, message)
+
+    def heartbeat(self, worker):
+        """Keep the leases of the worker alive."""
+        with self._lock:
+            self._seen[worker] = time.monotonic()
+
+    def finished(self):
+        """Whether every job is completed or given up."""
+        with self._lock:
+            self._expire()
+            return self._finished()
+
+    def progress(self):
+        """The numbers of completed, failed and all jobs."""
+        with self._lock:
+            return len(self._results), len(self._errors), len(self._jobs)
+
+    def collect(self):
+        """The compressed results and errors by index of job."""
+        with self._lock:
+            return dict(self._results), dict(self._errors)
+
+    def _finished(self):
+        return len(self._results) + len(self._errors) == len(self._jobs)
+
+    def _retry(self, index, message):
+        if self._attempts[index] > self._max_retries:
+            self._errors[index] = message
+        else:
+            self._pending.append(index)
+
+    def _expire(self):
+        now = time.monotonic()
+        lost = {worker for worker, seen in self._seen.items()
+                if now - seen > self._lease_timeout}
+        for index, worker in list(self._leases.items()):
+            if worker in lost:
+                del self._leases[index]
+                self._retry(index, "Worker '{}' was lost.".format(worker))
+        for worker in lost:
+            del self._seen[worker]
+
+
+_scheduler = None
+
+def _init_scheduler(jobs, lease_timeout, max_retries):
+    global _scheduler
+    _scheduler = _Scheduler(jobs, lease_timeout, max_retries)
+
+def _get_scheduler():
+    return _scheduler
+
+
+class _Manager(BaseManager):
+    """Manager of the connections to the scheduler of a coordinator."""
+
+_Manager.register('scheduler', callable=_get_scheduler)
+
+
+class Coordinator:
+    """A coordinator of simulation jobs. The queue of jobs is served over TCP
+    at attribute `address` once started, workers connect with `run_worker`.
+
+    Parameters:
+        jobs (list): The `Job`s to run.
+        address (tuple): Host and port of the server, port 0 picks a free port.
+        authkey (bytes): Key authenticating the workers, a random key by
+                         default. The workers connect with the attribute
+                         `authkey`.
+        lease_timeout (float): Seconds without contact after which a worker is
+                               lost and its jobs are queued again.
+        max_retries (int): Number of times a failed or lost job is retried.
+
+    The coordinator is a context manager, stopping its server and the local
+    workers on exit.
+    """
+
+    def __init__(self, jobs, address=('127.0.0.1', 0), authkey=None,
+                 lease_timeout=30.0, max_retries=2) -> None:
+        self.jobs = list(jobs)
+        self.address = address
+        self.authkey = os.urandom(32) if authkey is None else authkey
+        self.lease_timeout = lease_timeout
+        self.max_retries = max_retries
+        self.workers = []
+        self._manager = None
+        self._scheduler = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Start serving the queue of jobs."""
+        self._manager = _Manager(address=self.address, authkey=self.authkey)
+        self._manager.start(_init_scheduler, (self.jobs, self.lease_timeout,
+                                              self.max_retries))
+        self.address = self._manager.address
+        self._scheduler = self._manager.scheduler()
+
+    def start_workers(self, n_workers, batch_size=1, heartbeat=1.0):
+        """Start *n_workers* local worker processes, see `run_worker`."""
+        for _ in range(n_workers):
+            worker = Process(target=run_worker, daemon=True,
+                             args=(self.address, self.authkey, batch_size, heartbeat))
+            worker.start()
+            self.workers.append(worker)
+        return self.workers
+
+    def progress(self):
+        """The numbers of completed, failed and all jobs."""
+        return self._scheduler.progress()
+
+    def results(self, timeout=None, poll=0.1):
+        """Wait for the jobs and collect their results in order, see `Job.run`.
+
+        Parameters:
+            timeout (float): Seconds to wait, raises TimeoutError when exceeded.
+            poll (float): Seconds between checks of the queue.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._scheduler.finished():
+            if deadline is not None and time.monotonic() > deadline:
+                done, failed, total = self._scheduler.progress()
+                raise TimeoutError("{} of {} jobs are finished.".format(done + failed, total))
+            time.sleep(poll)
+
+        results, errors = self._scheduler.collect()
+        if errors:
+            raise RuntimeError("Jobs failed after {} retries: {}".format(
+                self.max_retries, "; ".join("{}: {}".format(index, errors[index])
+                                            for index in sorted(errors))))
+        return [_decompress(results[index]) for index in range(len(self.jobs))]
+
+    def stop(self):
+        """Stop the local workers and the server."""
+        for worker in self.workers:
+            worker.join(timeout=1.0)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self.workers = []
+        if self._manager is not None:
+            self._scheduler = None
+            self._manager.shutdown()
+            self._manager = None
+
+
+def _heartbeat(address, authkey, worker, interval, stop):
+    """Keep the leases of the worker alive over a connection of its own."""
+    manager = _Manager(address=address, authkey=authkey)
+    try:
+        manager.connect()
+        scheduler = manager.scheduler()
+        while not stop.wait(interval):
+            scheduler.heartbeat(worker)
+    except (ConnectionError, EOFError):
+        pass
+
+
+def run_worker(address, authkey, batch_size=1, heartbeat=1.0, name=None):
+    """Run jobs from the coordinator at *address* until its queue is finished.
+
+    Parameters:
+        address (tuple): Host and port of the coordinator.
+        authkey (bytes): Key authenticating the worker, the `authkey` of
+                         the coordinator.
+        batch_size (int): Number of jobs leased at a time.
+        heartbeat (float): Seconds between heartbeats, which should be well
+                           below the lease timeout of the coordinator.
+        name (str): Name of the worker, unique by default.
+
+    Returns:
+        int: The number of jobs completed by the worker.
+    """
+    worker = name or '{}-{}-{}'.format(socket.gethostname(), os.getpid(), uuid4().hex[:8])
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, daemon=True,
+                            args=(address, authkey, worker, heartbeat, stop))
+
+    n_done = 0
+    try:
+        manager = _Manager(address=address, authkey=authkey)
+        manager.connect()
+        scheduler = manager.scheduler()
+        beat.start()
+        while True:
+            batch = scheduler.lease(worker, batch_size)
+            if batch is None:
+                break
+            if not batch:
+                # The remaining jobs are leased, wait for them to be completed
+                # or handed out again.
+                time.sleep(heartbeat)
+                continue
+            for index, job in batch:
+                try:
+                    payload = _compress(job.run())
+                except Exception as error:
+                    scheduler.fail(worker, index, repr(error))
+                    continue
+                scheduler.complete(worker, index, payload)
+                n_done += 1
+    except (ConnectionError, EOFError):
+        # The coordinator has stopped.
+        pass
+    finally:
+        stop.set()
+    return n_done
+
+
+def run_jobs(jobs, n_workers=2, batch_size=1, **kwargs):
+    """Run the jobs on *n_workers* local workers, see `Coordinator`.
+
+    Returns:
+        list: The results of the jobs in order, see `Job.run`.
+    """
+    with Coordinator(jobs, **kwargs) as coordinator:
+        coordinator.start_workers(n_workers, batch_size)
+        return coordinator.results()
+
+
+@attr.s(frozen=True)
+class _Layout:
+    """Picklable layout of a `SharedResults` block, from which the workers
+    attach to it by name."""
+    name: str = attr.attrib()
+    n_runs: int = attr.attrib()
+    n_steps: int = attr.attrib()
+    n_coordinates: int = attr.attrib()
+    dtype: str = attr.attrib()
+
+    def arrays(self):
+        """The offset, shape and dtype of every array of the block, and the
+        size of the block in bytes."""
+        time_shape = (self.n_runs, self.n_steps)
+        state_shape = time_shape + (self.n_coordinates,)
+        arrays, offset = {}, 0
+        for key in _KEYS:
+            shape, dtype = (time_shape, np.dtype(np.float64)) if key == 'time' \
+                else (state_shape, np.dtype(self.dtype))
+            arrays[key] = offset, shape, dtype
+            offset += int(np.prod(shape)) * dtype.itemsize
+        return arrays, offset
+
+    def views(self, memory):
+        """The arrays of the block as views of the shared memory.
+
+        The views share a single base array, the memory is closed when the
+        base is garbage collected, i.e. when no view is left. Closing it
+        earlier would unmap the memory under the views.
+        """
+        arrays, size = self.arrays()
+        base = np.ndarray((size,), np.uint8, memory.buf)
+        weakref.finalize(base, memory.close)
+        return {key: base[offset:offset + int(np.prod(shape)) * dtype.itemsize]
+                .view(dtype).reshape(shape)
+                for key, (offset, shape, dtype) in arrays.items()}
+
+
+def _unlink(memory):
+    """Remove a shared memory block, the views of it stay valid."""
+    try:
+        memory.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class SharedResults:
+    """Results of simulation jobs in a single block of shared memory.
+
+    The block holds the `time` with shape `(n_runs, n_steps)` and the
+    `displacement`, `velocity` and `acceleration` with shape
+    `(n_runs, n_steps, n_coordinates)`, for the largest number of steps and of
+    assets of the jobs. The entries beyond the steps and assets of a job are
+    NaN.
+
+    Parameters:
+        jobs (list): The `Job`s of the results.
+
+    The arrays and the results of the jobs, see `result`, are views of the
+    block without copies. The block is removed by `close`, on exit as a
+    context manager, or when the object is garbage collected. The views
+    already handed out stay valid, the memory is released with the last of
+    them.
+    """
+
+    def __init__(self, jobs) -> None:
+        self.jobs = list(jobs)
+        if not self.jobs:
+            raise ValueError("No jobs to allocate.")
+        self._sizes = [(int(job.parameters.n_iter) + 1, len(job.assets))
+                       for job in self.jobs]
+        n_steps, n_coordinates = (int(n) for n in np.max(self._sizes, axis=0))
+        dtype = np.result_type(*(job.parameters.dtype for job in self.jobs)).str
+        _, size = _Layout('', len(self.jobs), n_steps, n_coordinates, dtype).arrays()
+        memory = SharedMemory(create=True, size=size)
+        self.layout = _Layout(memory.name, len(self.jobs), n_steps, n_coordinates,
+                              dtype)
+        self._finalizer = weakref.finalize(self, _unlink, memory)
+        self._views = self.layout.views(memory)
+        for view in self._views.values():
+            view.fill(np.nan)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def name(self):
+        """Name of the shared memory block."""
+        return self.layout.name
+
+    @property
+    def closed(self):
+        """Whether the block is removed."""
+        return not self._finalizer.alive
+
+    @property
+    def time(self):
+        """Times with shape `(n_runs, n_steps)`."""
+        return self._view('time')
+
+    @property
+    def displacement(self):
+        """Displacements with shape `(n_runs, n_steps, n_coordinates)`."""
+        return self._view('displacement')
+
+    @property
+    def velocity(self):
+        """Velocities with shape `(n_runs, n_steps, n_coordinates)`."""
+        return self._view('velocity')
+
+    @property
+    def acceleration(self):
+        """Accelerations with shape `(n_runs, n_steps, n_coordinates)`."""
+        return self._view('acceleration')
+
+    def result(self, index):
+        """The views of the results of the job *index*, with the keys and
+        shapes of `Job.run`."""
+        return _slices(self._view(), index, *self._sizes[index])
+
+    def results(self):
+        """The views of the results of every job in order."""
+        return [self.result(index) for index in range(len(self.jobs))]
+
+    def close(self):
+        """Remove the block."""
+        self._views = None
+        self._finalizer()
+
+    def _view(self, key=None):
+        if self._views is None:
+            raise ValueError("The shared results are closed.")
+        return self._views if key is None else self._views[key]
+
+
+def _slices(views, index, n_steps, n_assets):
+    """The views of the results of the job *index*."""
+    return {key: view[index, :n_steps] if key == 'time'
+            else view[index, :n_steps, :n_assets]
+            for key, view in views.items()}
+
+
+def _run_shared(layout, index, job):
+    """Run a job into its slice of a `SharedResults` block."""
+    views = layout.views(SharedMemory(name=layout.name))
+    job.run(out=_slices(views, index, int(job.parameters.n_iter) + 1,
+                        len(job.assets)))
+
+
+def run_shared(jobs, n_workers=2):
+    """Run the jobs on *n_workers* local processes writing the results into
+    shared memory, so no result is serialised.
+
+    Returns:
+        SharedResults: The results of the jobs, see `SharedResults.result`.
+        The caller owns the block and should close it, e.g. in a `with`
+        statement.
+    """
+    results = SharedResults(jobs)
+    try:
+        with ProcessPoolExecutor(n_workers) as executor:
+            futures = [executor.submit(_run_shared, results.layout, index, job)
+                       for index, job in enumerate(results.jobs)]
+            errors = {index: repr(future.exception())
+                      for index, future in enumerate(futures)
+                      if future.exception() is not None}
+        if errors:
+            raise RuntimeError("Jobs failed: {}".format(
+                "; ".join("{}: {}".format(index, errors[index])
+                          for index in sorted(errors))))
+    except BaseException:
+        results.close()
+        raise
+    return results
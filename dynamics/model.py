@@ -1,36 +1,264 @@
 """The module `dynamics.model` creates the dynamic model for the system
 defined."""
 
-from functools import reduce
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import reduce, wraps
+from time import perf_counter
 from typing import TYPE_CHECKING, List
 
 import pandas as pd
 import numpy as np
 import sympy as sp
+from scipy.constants import g as g_acc
+from sympy.core.function import AppliedUndef
 from sympy.physics.vector import dynamicsymbols
 from tqdm import tqdm
 
-from dynamics.tools import kinectic, potentialGrav, dissipated
+from dynamics.tools import BaseExcitation, kinectic, potentialGrav, dissipated
+from dynamics.tools.solver import TimeDependent, reset
 
 if TYPE_CHECKING:
     from dynamics.asset import Asset
 
+
+class _Store(OrderedDict):
+    """Store of the derivations shared by the models, evicting the least
+    recently used entries beyond *maxsize*."""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+# Parametric derivations shared by the models with the same structure.
+_derivations = _Store(maxsize=32)
+# Energies of the assets, terms and equations of motion shared by the models,
+# keyed by what they are derived from, see `Model.acceleration`. The energies
+# are keyed by the values of the properties as well, so a sweep over the
+# properties adds entries and the least recently used are evicted.
+_terms = _Store(maxsize=4096)
+
+# Process pool of the parallel derivations, shared by the models, as
+# `(n_workers, executor)`.
+_pool = None
+
+def _executor(n_workers, renew=False):
+    """The process pool of the parallel derivations, started again when the
+    number of workers changes or when *renew*, e.g. after a worker died."""
+    global _pool
+    if renew or _pool is None or _pool[0] != n_workers:
+        shutdown_pool()
+        _pool = (n_workers, ProcessPoolExecutor(n_workers))
+    return _pool[1]
+
+
+def shutdown_pool():
+    """Shut down the process pool of the parallel derivations, the next
+    parallel derivation starts a new one."""
+    global _pool
+    if _pool is not None:
+        _pool[1].shutdown()
+        _pool = None
+
+
+def clear_derivations():
+    """Clear the derivations and the terms shared by the models, e.g. to
+    release their memory, and shut down the process pool of the parallel
+    derivations. The models are derived again when they are next compiled."""
+    _derivations.clear()
+    _terms.clear()
+    shutdown_pool()
+
+
+def _timed(stage):
+    """Decorator recording the time of a derivation stage of the model."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._timer(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _simplify(expre, simplification):
+    """Simplify the expression according to the simplification policy, see
+    `Model`."""
+    if simplification == 'full':
+        return sp.simplify(expre)
+    elif simplification == 'targeted':
+        if isinstance(expre, sp.MatrixBase):
+            return expre.applyfunc(lambda x: sp.cancel(sp.trigsimp(x)))
+        return sp.cancel(sp.trigsimp(expre))
+    return expre
+
+
+def _time_derivative(expre):
+    """Evaluate the time derivative of the symbolic expression, see
+    `Model._time_derivative`."""
+    t = sp.Symbol("t")
+
+    if not t in expre.free_symbols:
+        raise ValueError('Variable t is not found in expersion: \
+                {}'.format(expre))
+
+    return sp.Derivative(expre, t).doit()
+
+
+def _coordinates(*expressions):
+    """Names of the coordinates in the expressions, without the `dot` suffix
+    of the velocities."""
+    names = set()
+    for expre in expressions:
+        for function in sp.sympify(expre).atoms(AppliedUndef):
+            name = function.func.__name__
+            names.add(name[:-3] if name.endswith('dot') else name)
+    return names
+
+
+def _energy(terms, var_names, simplification):
+    """Sum of the energy *terms*, with the time derivatives of the coordinates
+    *var_names* replaced by their velocity symbols."""
+    E = _simplify(reduce((lambda x, y: x + y), terms), simplification)
+    for var_name in var_names:
+        var_dot_exper = _time_derivative(dynamicsymbols(var_name))
+        E = E.subs(var_dot_exper, dynamicsymbols(var_name+'dot'))
+    return _simplify(E, simplification)
+
+
+def _lagrangian(T, V, simplification):
+    """Lagrangian of the kinetic energy *T* and the potential energy *V*."""
+    return _simplify(T - V, simplification)
+
+
+def _asset_energies(kinetic, potential, dissipation, var_names, simplification):
+    """Lagrangian and dissipation of an asset from its energy terms, and the
+    names of the coordinates they involve, see `Model.lagrangian`. The energies
+    of the assets are independent tasks of the derivation."""
+    T = _energy(kinetic, var_names, simplification)
+    V = _simplify(reduce((lambda x, y: x + y), potential), simplification)
+    L = sp.sympify(_lagrangian(T, V, simplification))
+    D = sp.sympify(_energy(dissipation, var_names, simplification))
+    return L, D, _coordinates(L, D)
+
+
+def _euler_lagrange_term(L, D, var_name):
+    """Term of the Euler-Lagrange equation of the coordinate *var_name* from
+    the Lagrangian *L* and the dissipation *D* of an asset."""
+    dL_dx = sp.diff(L , dynamicsymbols(var_name)).doit()
+    dL_dx_dot = sp.diff(L , dynamicsymbols(var_name+"dot"))
+    dL_dx_dot_dt = _time_derivative(dL_dx_dot) \
+        if sp.Symbol('t') in dL_dx_dot.free_symbols else 0
+    dD_dx_dot = sp.diff(D , dynamicsymbols(var_name+"dot")).doit()
+    return dL_dx_dot_dt - dL_dx - dD_dx_dot
+
+
+def _euler_lagrange(terms, var_names, simplification):
+    """Euler-Lagrange equation of a coordinate, the sum of the *terms* of the
+    assets, with the time derivatives of the coordinates *var_names* replaced
+    by their velocity and acceleration symbols. The equations of the
+    coordinates are independent tasks of the derivation."""
+    expression = _simplify(sp.Add(*terms), simplification)
+    for name in var_names:
+        x_dot = _time_derivative(dynamicsymbols(name))
+        x_ddot = sp.Derivative(dynamicsymbols(name+'dot'), sp.Symbol('t'))
+        expression = expression.subs(x_dot, dynamicsymbols(name+"dot"))
+        expression = expression.subs(x_ddot, dynamicsymbols(name+"ddot"))
+    return _simplify(expression, simplification)
+
+
+def _mass_reaction_row(expre, acc_symbols, simplification):
+    """Row of the mass matrix and reaction of the equation of motion *expre*."""
+    mass_row = []
+    react_row = expre
+    for acc_symbol in acc_symbols:
+        # The equations are linear in the accelerations, unlike `coeff`
+        # the derivative does not depend on the expanded form.
+        mass_row.append(sp.diff(expre, acc_symbol))
+        react_row = _simplify(react_row.subs(acc_symbol, 0), simplification)
+    return mass_row, react_row
+
+
 class Model:
     """A model class for evaluating the expression of motions of the system.
     The model object contains a list of Asset describing the motion of the
     system.
+
+    The *simplification* policy sets how the intermediate expressions are
+    simplified in the derivation:
+
+    +----------------+------------------------------------------------------+
+    | Policy         | Details                                              |
+    +================+======================================================+
+    | ``none``       | No simplification.                                   |
+    +----------------+------------------------------------------------------+
+    | ``targeted``   | `sp.trigsimp` followed by `sp.cancel`.               |
+    +----------------+------------------------------------------------------+
+    | ``cse``        | No simplification, common subexpressions are         |
+    |                | eliminated when the accelerations are lambdified.    |
+    +----------------+------------------------------------------------------+
+    | ``full``       | `sp.simplify` (default).                             |
+    +----------------+------------------------------------------------------+
+
+    The time of each stage of the last derivation is recorded in the
+    attribute `timings`.
+
+    The accelerations are derived once with the properties of the components
+    and the acceleration due to gravity (attribute `gravity`) as symbols, and
+    compiled into functions of a parameter vector. The derivation is shared by
+    all models with the same assets, motions, connections, direction of
+    gravity and simplification, so changing a property between runs does not
+    derive the model again. The shared derivations are evicted when least
+    recently used, and released by `clear_derivations`.
+
+    With *n_workers* greater than one, the independent tasks of the derivation
+    (the energies of every asset, the equation of every coordinate, the rows
+    of the mass and reaction matrices and the simplification of every
+    acceleration) are spread over a
+    pool of processes, shared by the models with the same number of workers.
+    The expressions are pickled between the processes.
     """
 
-    def __init__(self, asset: List['Asset']) -> None:
+    properties = ('mass', 'drag_coeff', 'length')
+    simplifications = ('none', 'targeted', 'cse', 'full')
+
+    def __init__(self, asset: List['Asset'], simplification: str = 'full',
+                 n_workers: int = 1) -> None:
+        if simplification not in self.simplifications:
+            raise ValueError("Unknown simplification '{}', expected one of {}."
+                             .format(simplification, self.simplifications))
         self.asset = [asset] if not isinstance(asset, list) else asset
+        self.simplification = simplification
+        self.n_workers = n_workers
+        self.timings = {}
         self.direction_grav = (0, 1)
         self.time_start = 0.0
         self.time_step = 1e-3
         self.n_iter = 100
+        self.dtype = np.dtype(np.float64)
+        self.gravity = g_acc
         self.results = None
+        self.sensitivity = None
+        self._symbolic = set()
+        self._kinematics = None
+        self._pool = None
 
     def initialise(self, direction_grav=None, time_step=None,
-                   n_iter=None, time_start=None) -> None:
+                   n_iter=None, time_start=None, dtype=None) -> None:
         """This class to initalise a set of prescribed
         motions based on the degree of freedom of the system. It should
         provide a way to generalise all energy methods."""
@@ -48,148 +276,712 @@ class Model:
         if n_iter:
             self.n_iter = n_iter
 
-    def acceleration(self):
-        """Evaluate the model of sytem of motion equations."""
-        L = self.lagrangian()
-        D = self._dissipation()
+        if dtype:
+            self.dtype = np.dtype(dtype)
 
-        equations = []
-        variables = []
-        for asset in self.asset:
-            var_name = asset.var_name
-            x_dot = self._time_derivative(dynamicsymbols(var_name))
-            x_ddot = sp.Derivative(dynamicsymbols(var_name+'dot'), sp.Symbol('t'))
-
-            dL_dx = sp.diff(L , dynamicsymbols(var_name)).doit()
-            dL_dx_dot_dt = self._time_derivative(sp.diff(L , dynamicsymbols(var_name+"dot")))
-            dD_dx_dot = sp.diff(D , dynamicsymbols(var_name+"dot")).doit()
-
-            expression = dL_dx_dot_dt - dL_dx - dD_dx_dot
-            expression = sp.simplify(expression)
-            equations.append(expression)
-            variables.append([var_name, x_dot, x_ddot])
-
-        for i, accel in enumerate(equations):
-            for variable in variables:
-                accel = accel.subs(variable[1], dynamicsymbols(variable[0]+"dot"))
-                accel = accel.subs(variable[2], dynamicsymbols(variable[0]+"ddot"))
-                equations[i] = accel
-            equations[i] = sp.simplify(equations[i])
+    def acceleration(self):
+        """Evaluate the model of sytem of motion equations.
+
+        The Lagrangian and the dissipation are sums over the assets, so the
+        equation of a coordinate is a sum of the terms of the assets. The
+        energies of the assets, their terms and the equations are kept in a
+        store shared by the models, keyed by what they are derived from, so
+        adding, removing or modifying an asset only derives its own energies
+        and the equations of the coordinates it involves again."""
+        energies = self._asset_energies()
+        var_names = [asset.var_name for asset in self.asset]
+        # The stages of the energies taken from the store take no time.
+        for stage in ('kinetic', 'potential', 'lagrangian', 'dissipation'):
+            self.timings.setdefault(stage, 0.0)
+
+        with self._timer('equations'):
+            terms, names = [], []
+            for var_name in var_names:
+                involved = [(L, D, coordinates) for L, D, coordinates in energies
+                            if var_name in coordinates]
+                terms.append(tuple(self._stored('term', _euler_lagrange_term, L, D, var_name)
+                                   for L, D, _ in involved))
+                names.append(tuple(name for name in var_names if any(
+                    name in coordinates for _, _, coordinates in involved)))
+            equations = self._map_stored('equation', _euler_lagrange, terms, names,
+                                         [self.simplification] * len(var_names))
 
         return equations
 
-    def solve(self, solver):
+    def _asset_energies(self):
+        """The Lagrangian and dissipation of every asset, and the names of the
+        coordinates they involve, from the store of terms. They depend on the
+        motions and properties of the asset and its connection.
+
+        Over a process pool, the energies of the new assets are derived in
+        parallel and timed as the stage `lagrangian`."""
+        keys = []
+        for asset in self.asset:
+            connection = asset.connection
+            keys.append(('energy', asset.var_name, asset.motion_func,
+                         tuple(self._property(asset, name) for name in self.properties),
+                         None if connection is None else
+                         (connection.var_name, connection.motion_func,
+                          self._property(connection, 'length')),
+                         self._property(None, 'gravity'), tuple(self.direction_grav),
+                         self.simplification))
+        energies = {key: _terms[key] for key in keys if key in _terms}
+        missing = {key: asset for key, asset in zip(keys, self.asset)
+                   if key not in energies}
+
+        if self._pool is None:
+            for key, asset in missing.items():
+                L = sp.sympify(self.lagrangian([asset]))
+                D = sp.sympify(self._dissipation([asset]))
+                energies[key] = (L, D, _coordinates(L, D))
+        elif missing:
+            assets = [[asset] for asset in missing.values()]
+            with self._timer('lagrangian'):
+                energies.update(zip(missing, self._map(
+                    _asset_energies, map(self._kinetic_terms, assets),
+                    map(self._potential_terms, assets),
+                    map(self._dissipation_terms, assets),
+                    map(self._energy_coordinates, assets),
+                    [self.simplification] * len(assets))))
+        _terms.update((key, energies[key]) for key in missing)
+        return [energies[key] for key in keys]
+
+    def solve(self, solver, sensitivity=None, forcing=None):
         """Solve the model using the given solver and direct numerical method, the system of
         equations are considered as `[M] x [A] = [R]`, where [M] is the mass equalavent
         matrix and [R] is the reaction equalavent matrix. Hence, acceleration can be solved
-        by [A] = inv([M]) x [R]."""
-        expre = self.acceleration()
+        by [A] = inv([M]) x [R].
+
+        Parameters:
+            solver (method): Numerical integrator from `dynamics.tools.solver`.
+            sensitivity (list): Optional list of `(asset, property)` pairs, e.g.
+                                `(asset, 'mass')`. The sensitivity equations of the
+                                displacements and velocities with respect to these
+                                properties are integrated along with the motion, the
+                                results are given by `get_sensitivity`.
+            forcing (Forcing): Optional generalised forces driving the model, see
+                               `compile`.
+        """
+        if sensitivity and forcing is not None:
+            raise ValueError("The sensitivities of a forced model are not supported.")
+        s, v = self._initial_state()
+
+        if sensitivity:
+            f, sens_symbols = self._sensitivity_functions(sensitivity)
+            n_sens = len(sens_symbols)
+            s = np.concatenate([s, np.zeros(n_sens, dtype=self.dtype)])
+            v = np.concatenate([v, np.zeros(n_sens, dtype=self.dtype)])
+            self.sensitivity = {
+                'parameters': [self.parameter_symbol(asset, name).name
+                               for asset, name in sensitivity],
+                'time': [self.time_start],
+                'displacement': [s[len(self.asset):]],
+                'velocity': [v[len(self.asset):]],
+            }
+        else:
+            f = self.compile(forcing=forcing)
+            self.sensitivity = None
+
+        for s, v, a, time in self._integrate(solver, f, s, v):
+            if sensitivity:
+                self.sensitivity['time'].append(time)
+                self.sensitivity['displacement'].append(s[len(self.asset):])
+                self.sensitivity['velocity'].append(v[len(self.asset):])
+
+    def compile(self, parameters=None, forcing=None):
+        """Compile the accelerations of the model into a list of functions
+        `f(s, v)` of the displacements and velocities, for the current values
+        of the properties.
 
-        var_names, acc_symbols, vel_symbols, dis_symbols = [], [], [], []
-        s, v, t = [], [], self.time_start
+        Parameters:
+            parameters (list): Optional list of `(asset, property)` pairs, the
+                               functions then take their values as a third
+                               argument `f(s, v, p)`.
+            forcing (Forcing): Optional generalised forces, a `Forcing` with one
+                               column per asset or a list of `(asset, Forcing)`
+                               pairs with one column each, or the accelerations
+                               of the base of the model, a `BaseExcitation`.
+                               The functions are then given as a
+                               `TimeDependent` list of functions `f(s, v, t)`.
+
+        The functions are vectorised, a batch of states with shape
+        `(n_assets, n_batch)` and parameters with shape `(n_parameters, n_batch)`
+        are evaluated in a single call.
+        """
+        f = self.compile_parametric()
+        values = list(self.parameter_values())
+        if forcing is not None:
+            if parameters:
+                raise ValueError("The parameters of a forced model are not supported.")
+            return self._forced([lambda s, v, fun=fun: fun(s, v, values) for fun in f],
+                                forcing, values)
+        if not parameters:
+            return [lambda s, v, fun=fun: fun(s, v, values) for fun in f]
+
+        index = [self._parameter_index(asset, name) for asset, name in parameters]
+        def bind(fun):
+            def bound(s, v, p):
+                full = list(values)
+                for i, value in zip(index, p):
+                    full[i] = value
+                return fun(s, v, full)
+            return bound
+        return [bind(fun) for fun in f]
+
+    def compile_parametric(self):
+        """Compile the accelerations into functions `f(s, v, p)` of the
+        displacements, velocities and the values of `parameters`, see
+        `parameter_values`. The derivation is cached, see `Model`."""
+        derivation = self._parametric_derivation()
+        if 'functions' not in derivation:
+            dis_symbols, vel_symbols, _ = self._state_symbols()
+            p_symbols = [self.parameter_symbol(asset, name)
+                         for asset, name in self.parameters]
+            derivation['functions'] = [
+                self._lambdify([dis_symbols, vel_symbols, p_symbols], acc)
+                for acc in derivation['matrix']]
+            derivation['timings'] = dict(self.timings)
+        return derivation['functions']
+
+    def _forced(self, f, forcing, values):
+        """Add the accelerations inv([M]) x [Q] of the generalised forces [Q] to
+        the accelerations *f*. The forces are added to the reaction matrix, so
+        a positive force accelerates its coordinate positively."""
+        forces = self._generalised_forces(forcing, values)
+        inverse_mass = self._inverse_mass_functions()
+
+        def bind(j, fun):
+            row = [(inverse_mass[j][k], force) for k, force in forces]
+            def forced(s, v, t):
+                acc = fun(s, v)
+                for inverse, force in row:
+                    acc = acc + inverse(s, values) * force(s, t)
+                return acc
+            return forced
+        return TimeDependent(bind(j, fun) for j, fun in enumerate(f))
+
+    def _generalised_forces(self, forcing, values):
+        """The `(asset index, Q(s, t))` of every forced coordinate."""
+        if isinstance(forcing, BaseExcitation):
+            excitation = self._excitation_functions()
+            def bind(row):
+                def force(s, t):
+                    acc = forcing(t)
+                    return row[0](s, values) * acc[0] + row[1](s, values) * acc[1]
+                return force
+            return [(k, bind(row)) for k, row in enumerate(excitation)]
+
+        def bind(table, column):
+            return lambda s, t: table(t)[column]
+        return [(k, bind(table, column))
+                for k, table, column in self._forcing_columns(forcing)]
+
+    def _forcing_columns(self, forcing):
+        """The `(asset index, Forcing, column)` of every forced coordinate."""
+        if isinstance(forcing, (list, tuple)):
+            columns = []
+            for asset, table in forcing:
+                if table.n_coordinates != 1:
+                    raise ValueError("The forcing of asset '{}' must have one column."
+                                     .format(asset.name))
+                index = [i for i, a in enumerate(self.asset) if a is asset]
+                if not index:
+                    raise ValueError("Asset '{}' is not in the model.".format(asset.name))
+                columns.append((index[0], table, 0))
+            return columns
+        if forcing.n_coordinates != len(self.asset):
+            raise ValueError("The forcing has {} columns for {} assets."
+                             .format(forcing.n_coordinates, len(self.asset)))
+        return [(k, forcing, k) for k in range(len(self.asset))]
+
+    def _inverse_mass_functions(self):
+        """Compile the inverse of the mass matrix into functions `f(s, p)` by
+        row and column. The derivation is cached, see `Model`."""
+        derivation = self._parametric_derivation()
+        if 'inverse_mass_functions' not in derivation:
+            dis_symbols, _, _ = self._state_symbols()
+            p_symbols = [self.parameter_symbol(asset, name)
+                         for asset, name in self.parameters]
+            inverse_mass = self._simplify(derivation['inverse_mass'])
+            derivation['inverse_mass_functions'] = [
+                [self._lambdify([dis_symbols, p_symbols], inverse_mass[j, k])
+                 for k in range(inverse_mass.shape[1])]
+                for j in range(inverse_mass.shape[0])]
+        return derivation['inverse_mass_functions']
+
+    def _excitation_functions(self):
+        """Compile the coefficients of the generalised forces of the x and y
+        accelerations of the base into functions `f(s, p)` by coordinate and
+        component. The inertial force `-mass * acceleration` of an asset gives
+        the coefficient `-mass * d(position)/d(coordinate)`, with the position
+        of the energies of the asset. The derivation is cached, see `Model`."""
+        derivation = self._parametric_derivation()
+        if 'excitation_functions' not in derivation:
+            dis_symbols, _, _ = self._state_symbols()
+            p_symbols = [self.parameter_symbol(asset, name)
+                         for asset, name in self.parameters]
+            self._symbolic = {(None if asset is None else asset.var_name, name)
+                              for asset, name in self.parameters}
+            try:
+                coefficients = [[0, 0] for _ in self.asset]
+                for asset in self.asset:
+                    mass = self._property(asset, 'mass')
+                    for i, motion in enumerate(self._motion(asset)):
+                        if asset.connection is not None:
+                            motion = motion + self._motion(asset.connection)[i]
+                        for k, dis_symbol in enumerate(dis_symbols):
+                            coefficients[k][i] -= mass * sp.diff(motion, dis_symbol)
+            finally:
+                self._symbolic = set()
+            derivation['excitation_functions'] = [
+                [self._lambdify([dis_symbols, p_symbols], self._simplify(coefficient))
+                 for coefficient in row] for row in coefficients]
+        return derivation['excitation_functions']
+
+    @property
+    def parameters(self):
+        """The `(asset, property)` pairs of the properties of every asset,
+        followed by `(None, 'gravity')` for the acceleration due to gravity."""
+        return [(asset, name) for asset in self.asset
+                for name in self.properties] + [(None, 'gravity')]
+
+    def parameter_values(self):
+        """Current values of `parameters`, from the components of the assets
+        and the attribute `gravity`."""
+        return np.array([self.gravity if asset is None else getattr(asset.component, name)
+                         for asset, name in self.parameters], dtype=self.dtype)
+
+    def get_sensitivity(self):
+        """Get the sensitivity of the displacements and velocities with respect
+        to the properties given to `solve`."""
+        if self.sensitivity is None:
+            raise RuntimeError("Model was solved without sensitivity parameters.")
+
+        parameters = self.sensitivity['parameters']
+        time = np.array(self.sensitivity['time'])
+        shape = (len(time), len(self.asset), len(parameters))
+        displacement = np.array(self.sensitivity['displacement']).reshape(shape)
+        velocity = np.array(self.sensitivity['velocity']).reshape(shape)
+
+        results = []
+        for i, asset in enumerate(self.asset):
+            for k, parameter in enumerate(parameters):
+                results.append(pd.DataFrame(data={
+                    'asset': [asset.name] * len(time),
+                    'variable': [asset.var_name] * len(time),
+                    'parameter': [parameter] * len(time),
+                    'time': time,
+                    'displacement': displacement[:, i, k],
+                    'velocity': velocity[:, i, k],
+                }))
+        return pd.concat(results)
+
+    def parameter_symbol(self, asset, name):
+        """Symbol of the component property *name* of the asset, e.g.
+        `mass_theta` for the mass of the asset with variable `theta`, or `g`
+        for `(None, 'gravity')`."""
+        if asset is None and name == 'gravity':
+            return sp.Symbol('g')
+        if name not in self.properties:
+            raise ValueError("Unknown property '{}', expected one of {}."
+                             .format(name, self.properties))
+        return sp.Symbol('{}_{}'.format(name, asset.var_name))
+
+    def _parameter_index(self, asset, name):
+        """Index of the `(asset, property)` pair in `parameters`."""
+        for i, (p_asset, p_name) in enumerate(self.parameters):
+            if p_asset is asset and p_name == name:
+                return i
+        raise ValueError("Unknown parameter '{}' of asset {}.".format(name, asset))
+
+    def _parameter_subs(self):
+        """Substitutions of the current values of `parameters`."""
+        return {self.parameter_symbol(asset, name): float(value)
+                for (asset, name), value in zip(self.parameters, self.parameter_values())}
+
+    def _parametric_derivation(self):
+        """Derive the parametric matrix of accelerations, or get it from the
+        derivations of the models with the same structure."""
+        key = (tuple((asset.var_name, asset.motion_func,
+                      None if asset.connection is None else asset.connection.var_name)
+                     for asset in self.asset),
+               tuple(self.direction_grav), self.simplification)
+        if key not in _derivations:
+            matrix, inverse_mass = self._acceleration_matrix(self.parameters)
+            derivation = {'matrix': matrix, 'inverse_mass': inverse_mass,
+                          'timings': dict(self.timings)}
+            _derivations[key] = derivation
+        else:
+            derivation = _derivations[key]
+            self.timings = dict(derivation['timings'])
+        return derivation
+
+    def _state_symbols(self):
+        """Symbols of the displacements, velocities and accelerations."""
+        dis_symbols, vel_symbols, acc_symbols = [], [], []
         for asset in self.asset:
-            var_names.append(asset.var_name)
-            acc_symbols.append(dynamicsymbols(asset.var_name+'ddot'))
-            vel_symbols.append(dynamicsymbols(asset.var_name+'dot'))
             dis_symbols.append(dynamicsymbols(asset.var_name))
+            vel_symbols.append(dynamicsymbols(asset.var_name+'dot'))
+            acc_symbols.append(dynamicsymbols(asset.var_name+'ddot'))
+        return dis_symbols, vel_symbols, acc_symbols
+
+    def _initial_state(self):
+        """Initial displacements and velocities from the solution of the assets."""
+        s, v = [], []
+        for asset in self.asset:
             x, dx, _, _ = asset.solution.initial_conditions
             s.append(x)
             v.append(dx)
-        s = np.array(s, dtype=np.float64)
-        v = np.array(v, dtype=np.float64)
-
-        mass_matrix, react_matrix = [], []
-        for accel_expre in expre:
-            mass_row = []
-            react_row = accel_expre
-            for acc_symbol in acc_symbols:
-                mass_row.append(accel_expre.coeff(acc_symbol))
-                react_row = sp.simplify(react_row.subs(acc_symbol, 0))
-            mass_matrix.append(mass_row)
-            react_matrix.append(react_row)
-        mass_matrix = sp.Matrix(mass_matrix).inv()
-        react_matrix = sp.Matrix(react_matrix)
+            asset.solution.dtype = self.dtype
+        return np.array(s, dtype=self.dtype), np.array(v, dtype=self.dtype)
+
+    def _acceleration_matrix(self, parameters=None):
+        """Evaluate the symbolic matrix of accelerations [A] = inv([M]) x [R] and
+        the inverse of the mass matrix inv([M]), keeping the `(asset, property)`
+        pairs of *parameters* symbolic."""
+        self.timings = {}
+        self._symbolic = {(None if asset is None else asset.var_name, name)
+                          for asset, name in parameters or []}
+        if self.n_workers > 1:
+            self._pool = _executor(self.n_workers)
+        try:
+            expre = self.acceleration()
+            _, _, acc_symbols = self._state_symbols()
+
+            with self._timer('acceleration_matrix'):
+                return self._solve_acceleration(expre, acc_symbols)
+        finally:
+            self._symbolic = set()
+            self._pool = None
+
+    def _solve_acceleration(self, expre, acc_symbols):
+        """Solve the equations of motion *expre* for the accelerations, the
+        inverse of the mass matrix is returned as well, unsimplified."""
+        n = len(expre)
+        rows = self._map_stored('row', _mass_reaction_row, expre, [tuple(acc_symbols)] * n,
+                                [self.simplification] * n)
+        mass_matrix = sp.Matrix([mass_row for mass_row, _ in rows]).inv()
+        react_matrix = sp.Matrix([react_row for _, react_row in rows])
 
         acc_matrix = mass_matrix*react_matrix
-        acc_matrix = sp.simplify(acc_matrix)
+        # The entries are simplified independently, as `sp.simplify` does for
+        # a matrix.
+        entries = self._map(_simplify, list(acc_matrix), [self.simplification] * n)
+        return sp.Matrix(entries), mass_matrix
+
+    def _sensitivity_functions(self, parameters):
+        """Lambdify the accelerations of the motion augmented by the forward
+        sensitivity equations. For the sensitivities `S = ds/dp` and `dS/dt`,
+        `d2S/dt2 = da/ds S + da/dv dS/dt + da/dp`, which is integrated as
+        extra displacements and velocities ordered by (asset, parameter)."""
+        acc_matrix = self._parametric_derivation()['matrix']
+
+        p_symbols = [self.parameter_symbol(asset, name) for asset, name in parameters]
+        values = self._parameter_subs()
+        sources = [[sp.diff(acc, p_symbol) for p_symbol in p_symbols]
+                   for acc in acc_matrix]
+        sens_dis, sens_vel, sens_acc = self._linearise(
+            acc_matrix, ['d' + p_symbol.name for p_symbol in p_symbols], sources)
+
+        dis_symbols, vel_symbols, _ = self._state_symbols()
+        args = [dis_symbols + sens_dis, vel_symbols + sens_vel]
+        f = [self._lambdify(args, acc.subs(values))
+             for acc in list(acc_matrix) + sens_acc]
+        return f, sens_dis
+
+    def compile_tangent(self, n_vectors=1):
+        """Lambdify the accelerations of the motion augmented by the
+        tangent-linear (variational) equations of *n_vectors* deviation
+        vectors, `d2(ds)/dt2 = da/ds ds + da/dv d(ds)/dt`.
+
+        The functions `f(s, v)` take the displacements and velocities followed
+        by the deviations, ordered by (asset, vector).
+        """
+        acc_matrix = self._parametric_derivation()['matrix'].subs(self._parameter_subs())
+        dev_dis, dev_vel, dev_acc = self._linearise(
+            acc_matrix, ['v{}'.format(k) for k in range(n_vectors)])
+
+        dis_symbols, vel_symbols, _ = self._state_symbols()
+        args = [dis_symbols + dev_dis, vel_symbols + dev_vel]
+        return [self._lambdify(args, acc) for acc in list(acc_matrix) + dev_acc]
 
-        acc_matrix = [sp.lambdify([dis_symbols, vel_symbols], acc) for acc in acc_matrix]
+    @_timed('linearise')
+    def _linearise(self, acc_matrix, names, sources=None):
+        """Linearise the accelerations for the deviations of the displacements
+        and velocities named by *names*, with the optional source terms
+        `sources[i][k]` of asset i and deviation k.
 
+        Returns:
+            dev_dis, dev_vel (list): Symbols of the deviations, ordered by
+                                     (asset, name).
+            dev_acc (list): Accelerations of the deviations, in the same order.
+        """
+        dis_symbols, vel_symbols, _ = self._state_symbols()
+        dev_dis, dev_vel = [], []
+        for dis_symbol in dis_symbols:
+            for name in names:
+                symbol = 'd{}_{}'.format(dis_symbol.func.__name__, name)
+                dev_dis.append(sp.Symbol(symbol))
+                dev_vel.append(sp.Symbol(symbol + 'dot'))
+
+        n_dev = len(names)
+        dev_acc = []
+        for i, acc in enumerate(acc_matrix):
+            jac_dis = [sp.diff(acc, dis_symbol) for dis_symbol in dis_symbols]
+            jac_vel = [sp.diff(acc, vel_symbol) for vel_symbol in vel_symbols]
+            for k in range(n_dev):
+                expre = sources[i][k] if sources else sp.Integer(0)
+                for j in range(len(dis_symbols)):
+                    expre += jac_dis[j] * dev_dis[j*n_dev + k]
+                    expre += jac_vel[j] * dev_vel[j*n_dev + k]
+                dev_acc.append(expre)
+
+        return dev_dis, dev_vel, dev_acc
+
+    def _integrate(self, solver, f, s, v):
+        """Integrate the lambdified accelerations *f* from the displacements *s*
+        and velocities *v* with the solver, storing the motion of the assets
+        and yielding the state of every step."""
+        t = self.time_start
+        # A python float keeps the time step from promoting float32 states.
+        dt = float(self.time_step)
+        reset(solver)
         for i in tqdm(range(self.n_iter)):
-            s, v, a, time = solver(acc_matrix, s, v, t, self.time_step)
+            s, v, a, time = solver(f, s, v, t, dt)
             self._update_asset(s, v, a, time)
             if i == 0:
                 self._update_asset_initial_acceleration(a)
             t = time
+            yield s, v, a, time
 
     def get_results(self):
-        """Get results from the assets."""
-        for i, asset in enumerate(self.asset):
-            if i == 0:
-                results_df = asset.results
-            if i != 0:
-                data = asset.results
-                results_df = pd.concat([results_df, data])
-        return results_df
-
-    def lagrangian(self):
-        """Evaluate the lagrangian of the model."""
-        T = self._kinectic_energy()
-        V = self._potential_energy()
-        return sp.simplify(T - V)
-
-    def _kinectic_energy(self):
-        """Evaluate the kinetic energy term of the Lagrangian."""
-        T = []
-        for asset in self.asset:
-            for i, motion in enumerate(asset.motion):
-                if asset.connection is not None:
-                    motion = motion + asset.connection.motion[i]
-                velo = self._time_derivative(motion)
-                T.append(kinectic(asset.component.mass, velo))
+        """Get results from the assets, with the global positions and velocities
+        of all assets evaluated in a single call of `kinematics`."""
+        dtype = self.asset[0].solution.dtype
+        s = np.array([asset.solution.displacement for asset in self.asset], dtype=dtype)
+        v = np.array([asset.solution.velocity for asset in self.asset], dtype=dtype)
+        position, velocity = self.kinematics(s, v)
 
-        T = sp.simplify(reduce((lambda x, y: x + y), T))
+        return pd.concat([asset.get_results(position[i], velocity[i])
+                          for i, asset in enumerate(self.asset)])
 
-        for asset in self.asset:
-            var_name = asset.var_name
-            var_dot_exper = self._time_derivative(dynamicsymbols(var_name))
-            T = T.subs(var_dot_exper, dynamicsymbols(var_name+'dot'))
+    def kinematics(self, s, v):
+        """Evaluate the global Cartesian positions and velocities of every
+        asset, including the motion of the assets it is connected to.
+
+        Parameters:
+            s (array): Displacements with shape `(n_assets, ...)`, e.g. the
+                       displacements of all steps `(n_assets, n_steps)`.
+            v (array): Velocities with the same shape.
+
+        Returns:
+            position, velocity (array): Arrays with shape `(n_assets, 2, ...)`.
 
-        return sp.simplify(T)
+        The expressions are lambdified into one vectorised function of the
+        lengths on the first call, which is reused until the motions or the
+        connections of the assets are changed.
+        """
+        key = [(asset.var_name, asset.motion_func, id(asset.connection))
+               for asset in self.asset]
+        if self._kinematics is None or self._kinematics[0] != key:
+            self._kinematics = (key, self._compile_kinematics())
+
+        s, v = np.asarray(s), np.asarray(v)
+        lengths = [asset.component.length for asset in self._kinematics_assets()]
+        values = np.array([np.broadcast_to(value, s.shape[1:]) for value
+                           in self._kinematics[1](s, v, lengths)], dtype=s.dtype)
+        values = values.reshape((2, len(self.asset), -1) + s.shape[1:])
+        return values[0], values[1]
+
+    def _compile_kinematics(self):
+        """Lambdify the global positions and velocities of the assets, as a
+        function of the lengths of `_kinematics_assets`."""
+        dis_symbols, vel_symbols, _ = self._state_symbols()
+        t = sp.Symbol('t')
+        velocity_subs = {sp.Derivative(dis_symbol, t): vel_symbol
+                         for dis_symbol, vel_symbol in zip(dis_symbols, vel_symbols)}
+
+        assets = self._kinematics_assets()
+        self._symbolic = {(asset.var_name, 'length') for asset in assets}
+        try:
+            positions, velocities = [], []
+            for asset in self.asset:
+                motion = self._global_motion(asset)
+                positions += motion
+                velocities += [sp.diff(x, t).subs(velocity_subs) for x in motion]
+        finally:
+            self._symbolic = set()
+
+        lengths = [self.parameter_symbol(asset, 'length') for asset in assets]
+        return sp.lambdify([dis_symbols, vel_symbols, lengths], positions + velocities)
+
+    def _kinematics_assets(self):
+        """The assets and the assets they are connected to."""
+        assets = []
+        for asset in self.asset:
+            while asset is not None:
+                if all(asset is not other for other in assets):
+                    assets.append(asset)
+                asset = asset.connection
+        return assets
+
+    def _global_motion(self, asset):
+        """Expressions of motion of the asset relative to the global origin."""
+        motion = list(self._motion(asset))
+        if asset.connection is not None:
+            motion = [x + x_connection for x, x_connection
+                      in zip(motion, self._global_motion(asset.connection))]
+        return motion
+
+    def lagrangian(self, assets=None):
+        """Evaluate the lagrangian of the model, or of the contributions of the
+        given *assets*."""
+        T = self._kinectic_energy(assets)
+        V = self._potential_energy(assets)
+        with self._timer('lagrangian'):
+            return _lagrangian(T, V, self.simplification)
+
+    @_timed('kinetic')
+    def _kinectic_energy(self, assets=None):
+        """Evaluate the kinetic energy term of the Lagrangian."""
+        assets = self.asset if assets is None else assets
+        return _energy(self._kinetic_terms(assets), self._energy_coordinates(assets),
+                       self.simplification)
 
-    def _potential_energy(self):
+    @_timed('potential')
+    def _potential_energy(self, assets=None):
         """Evaluate the kinetic energy term of the Lagrangian."""
+        V = self._potential_terms(self.asset if assets is None else assets)
+        return self._simplify(reduce((lambda x, y: x + y), V))
+
+    @_timed('dissipation')
+    def _dissipation(self, assets=None):
+        """Evaluate the Rayleigh dissipation term."""
+        assets = self.asset if assets is None else assets
+        return _energy(self._dissipation_terms(assets), self._energy_coordinates(assets),
+                       self.simplification)
+
+    def _kinetic_terms(self, assets):
+        """Kinetic energy terms of the motions of the assets."""
+        T = []
+        for asset in assets:
+            for i, motion in enumerate(self._motion(asset)):
+                if asset.connection is not None:
+                    motion = motion + self._motion(asset.connection)[i]
+                velo = self._time_derivative(motion)
+                T.append(kinectic(self._property(asset, 'mass'), velo))
+        return T
+
+    def _potential_terms(self, assets):
+        """Gravitational potential energy terms of the motions of the assets."""
         V = []
         direction_grav = self.direction_grav
-        for asset in self.asset:
-            # Gravitational potential energy
-            for i, motion in enumerate(asset.motion):
+        for asset in assets:
+            for i, motion in enumerate(self._motion(asset)):
                 if asset.connection is not None:
-                    motion = motion + asset.connection.motion[i]
+                    motion = motion + self._motion(asset.connection)[i]
                 disp = - (motion) * direction_grav[i]
-                V.append(potentialGrav(asset.component.mass, disp))
-            del disp
-
-        return sp.simplify(reduce((lambda x, y: x + y), V))
+                V.append(potentialGrav(self._property(asset, 'mass'), disp,
+                                       self._property(None, 'gravity')))
+        return V
 
-    def _dissipation(self):
-        """Evaluate the Rayleigh dissipation term."""
+    def _dissipation_terms(self, assets):
+        """Rayleigh dissipation terms of the motions of the assets."""
         D = []
-        for asset in self.asset:
-            for i, motion in enumerate(asset.motion):
+        for asset in assets:
+            for i, motion in enumerate(self._motion(asset)):
                 if asset.connection is not None:
-                    motion = motion + asset.connection.motion[i]
+                    motion = motion + self._motion(asset.connection)[i]
                 velo = self._time_derivative(motion)
-                D.append(dissipated(asset.component.drag_coeff, velo))
-
-        D = sp.simplify(reduce((lambda x, y: x + y), D))
-
-        for asset in self.asset:
-            var_name = asset.var_name
-            var_dot_exper = self._time_derivative(dynamicsymbols(var_name))
-            D = D.subs(var_dot_exper, dynamicsymbols(var_name+'dot'))
-
-        return sp.simplify(D)
+                D.append(dissipated(self._property(asset, 'drag_coeff'), velo))
+        return D
+
+    def _energy_coordinates(self, assets):
+        """Names of the coordinates of the energies of the assets, which
+        involve the coordinates of their connections as well."""
+        names = []
+        for asset in assets:
+            for a in (asset, asset.connection):
+                if a is not None and a.var_name not in names:
+                    names.append(a.var_name)
+        return names
+
+    def _simplify(self, expre):
+        """Simplify the expression according to the simplification policy."""
+        return _simplify(expre, self.simplification)
+
+    def _map(self, function, *iterables):
+        """Map the independent tasks of the derivation, over the process pool
+        of a parallel derivation."""
+        if self._pool is None:
+            return list(map(function, *iterables))
+        iterables = [list(iterable) for iterable in iterables]
+        try:
+            return list(self._pool.map(function, *iterables))
+        except BrokenProcessPool:
+            # A worker has died, the tasks are run again on a new pool.
+            self._pool = _executor(self.n_workers, renew=True)
+            return list(self._pool.map(function, *iterables))
+
+    def _map_stored(self, kind, function, *iterables):
+        """Map the tasks of the derivation as `_map`, keeping their results in
+        the store of terms keyed by their arguments, so only the new tasks are
+        run."""
+        keys = [(kind,) + task for task in zip(*iterables)]
+        # The results are collected before they are stored, as storing them
+        # may evict the others.
+        results = {key: _terms[key] for key in keys if key in _terms}
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        if missing:
+            results.update(zip(missing, self._map(function,
+                                                   *zip(*(key[1:] for key in missing)))))
+            _terms.update((key, results[key]) for key in missing)
+        return [results[key] for key in keys]
+
+    def _stored(self, kind, function, *args):
+        """Result of a task of the derivation from the store of terms, see
+        `_map_stored`."""
+        key = (kind,) + args
+        if key not in _terms:
+            result = function(*args)
+            _terms[key] = result
+            return result
+        return _terms[key]
+
+    def _lambdify(self, args, expre):
+        """Lambdify the expression, eliminating the common subexpressions for
+        the `cse` simplification policy."""
+        with self._timer('lambdify'):
+            return sp.lambdify(args, expre, cse=self.simplification == 'cse')
+
+    @contextmanager
+    def _timer(self, stage):
+        """Add the time spent in the block to the timing of *stage*."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + \
+                perf_counter() - start
+
+    def _property(self, asset, name):
+        """Value of the component property *name* of the asset, or its symbol
+        when the property is kept symbolic for the derivation. The asset `None`
+        with the name `gravity` is the acceleration due to gravity."""
+        var_name = None if asset is None else asset.var_name
+        if (var_name, name) in self._symbolic:
+            return self.parameter_symbol(asset, name)
+        if asset is None:
+            return self.gravity
+        return getattr(asset.component, name)
+
+    def _motion(self, asset):
+        """Expressions of motion of the asset, with a symbolic length when the
+        length is kept symbolic for the derivation."""
+        if (asset.var_name, 'length') in self._symbolic:
+            return asset.motion_func(self.parameter_symbol(asset, 'length'),
+                                     asset.var_name)
+        return asset.motion
 
     def _time_derivative(self, expre):
         """Evaluate the time derivative of the symbolic expression.
@@ -200,19 +992,8 @@ class Model:
         Returns:
             deriv (Symbol): Symbolic expression of the derivative.
         """
-        t = sp.Symbol("t")
+        return _time_derivative(expre)
 
-        if not t in expre.free_symbols:
-            raise ValueError('Variable t is not found in expersion: \
-                {}'.format(expre))
-
-        try:
-            deriv = sp.Derivative(expre, t).doit()
-        except Exception as err:
-            print('Unxpected Dynamics Error: {}').format(err)
-        else:
-            return deriv
-    
     def _update_asset(self, s, v, a, t):
         for i, asset in enumerate(self.asset):
             asset.solution.displacement.append(s[i])
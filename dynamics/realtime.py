@@ -0,0 +1,230 @@
+"""The module `dynamics.realtime` advances a model in step with the wall clock,
+e.g. for live demonstrations and hardware-in-the-loop tests. Every state is
+published as soon as it is computed, to a queue, a local UDP socket or any
+callable, instead of being stored for the results.
+
+The state of step `k` is due `k * time_step / speed` seconds after the start.
+When the integration lags behind, the due steps are taken as sub-steps and
+only the latest state is published, so the latency stays bounded.
+"""
+
+import socket
+import time
+from queue import Empty, Full
+
+import attr
+import numpy as np
+
+from dynamics.tools.solver import reset
+
+__all__ = ['State', 'RealTimeStats', 'QueuePublisher', 'SocketPublisher',
+           'run_realtime']
+
+
+@attr.s(frozen=True)
+class State:
+    """A published state of the model.
+
+    +------------------+---------------------------------------------------+
+    | Attributes       | Details                                           |
+    +==================+===================================================+
+    | ``step``         | Number of the step.                               |
+    +------------------+---------------------------------------------------+
+    | ``time``         | Time of the simulation.                           |
+    +------------------+---------------------------------------------------+
+    | ``displacement`` | Displacements of the assets.                      |
+    +------------------+---------------------------------------------------+
+    | ``velocity``     | Velocities of the assets.                         |
+    +------------------+---------------------------------------------------+
+    | ``wall_time``    | Time of publication, from `time.time`.            |
+    +------------------+---------------------------------------------------+
+    """
+    step: int = attr.attrib()
+    time: float = attr.attrib()
+    displacement: np.ndarray = attr.attrib()
+    velocity: np.ndarray = attr.attrib()
+    wall_time: float = attr.attrib()
+
+
+@attr.s(frozen=True)
+class RealTimeStats:
+    """Statistics of a real-time run.
+
+    +-----------------+----------------------------------------------------+
+    | Attributes      | Details                                            |
+    +=================+====================================================+
+    | ``n_steps``     | Number of steps taken.                             |
+    +-----------------+----------------------------------------------------+
+    | ``n_published`` | Number of states published.                        |
+    +-----------------+----------------------------------------------------+
+    | ``n_dropped``   | Number of states the publisher could not deliver.  |
+    +-----------------+----------------------------------------------------+
+    | ``n_missed``    | Number of states not published before the next one |
+    |                 | was due.                                           |
+    +-----------------+----------------------------------------------------+
+    | ``max_substeps``| Largest number of steps taken to catch up.         |
+    +-----------------+----------------------------------------------------+
+    | ``slip``        | Seconds of lag given up, when more than the        |
+    |                 | allowed sub-steps were due.                        |
+    +-----------------+----------------------------------------------------+
+    | ``latency``     | Seconds from the time each published state was due |
+    |                 | to its publication.                                |
+    +-----------------+----------------------------------------------------+
+    """
+    n_steps: int = attr.attrib()
+    n_published: int = attr.attrib()
+    n_dropped: int = attr.attrib()
+    n_missed: int = attr.attrib()
+    max_substeps: int = attr.attrib()
+    slip: float = attr.attrib()
+    latency: np.ndarray = attr.attrib()
+
+    def latency_percentile(self, q):
+        """The *q*-th percentile of the latency in seconds."""
+        return float(np.percentile(self.latency, q)) if len(self.latency) else 0.0
+
+    def as_dict(self):
+        """Summary of the statistics, with the mean, median, 99th percentile and
+        maximum of the latency."""
+        return {
+            'n_steps': self.n_steps,
+            'n_published': self.n_published,
+            'n_dropped': self.n_dropped,
+            'n_missed': self.n_missed,
+            'max_substeps': self.max_substeps,
+            'slip': self.slip,
+            'latency_mean': float(np.mean(self.latency)) if len(self.latency) else 0.0,
+            'latency_median': self.latency_percentile(50),
+            'latency_p99': self.latency_percentile(99),
+            'latency_max': float(np.max(self.latency)) if len(self.latency) else 0.0,
+        }
+
+
+class QueuePublisher:
+    """Publish the states to a `queue.Queue` or `multiprocessing.Queue` without
+    blocking. When the queue is full the oldest state is dropped, so a slow
+    consumer always receives the latest states."""
+
+    def __init__(self, queue) -> None:
+        self.queue = queue
+
+    def __call__(self, state):
+        try:
+            self.queue.put_nowait(state)
+            return True
+        except Full:
+            pass
+        try:
+            self.queue.get_nowait()
+        except Empty:
+            pass
+        try:
+            self.queue.put_nowait(state)
+        except Full:
+            pass
+        return False
+
+
+class SocketPublisher:
+    """Publish the states as UDP datagrams to *address*, each one holding the
+    float64 values `[step, time, wall_time, *displacement, *velocity]`, see
+    `unpack`. A datagram which cannot be sent at once is dropped."""
+
+    def __init__(self, address) -> None:
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def __call__(self, state):
+        data = np.concatenate([[state.step, state.time, state.wall_time],
+                               state.displacement, state.velocity])
+        try:
+            self.socket.sendto(data.astype(np.float64).tobytes(), self.address)
+            return True
+        except (BlockingIOError, ConnectionRefusedError):
+            return False
+
+    def close(self):
+        self.socket.close()
+
+    @staticmethod
+    def unpack(data):
+        """The `State` of a datagram."""
+        values = np.frombuffer(data, dtype=np.float64)
+        n_assets = (len(values) - 3) // 2
+        return State(int(values[0]), values[1], values[3:3+n_assets],
+                     values[3+n_assets:], values[2])
+
+
+def run_realtime(model, solver, publish, duration=None, speed=1.0,
+                 max_substeps=10, stop=None, clock=time.perf_counter,
+                 sleep=time.sleep):
+    """Integrate the model in step with the wall clock, publishing its states.
+
+    Parameters:
+        model (Model): An initialised model, its time step sets the period of
+                       the states.
+        solver (method): Numerical integrator from `dynamics.tools.solver`.
+        publish (callable): Called with every `State`, returns False if the
+                            state was dropped. A queue is wrapped with
+                            `QueuePublisher`.
+        duration (float): Simulated time, by default the `n_iter` steps of the
+                          model.
+        speed (float): Simulated seconds per wall-clock second.
+        max_substeps (int): Largest number of steps taken to catch up, the lag
+                            beyond is given up.
+        stop (threading.Event): Optional event ending the run.
+        clock (callable): Monotonic clock in seconds the run is paced by.
+        sleep (callable): Function waiting for the given seconds of *clock*.
+
+    Returns:
+        RealTimeStats: Latency and deadline statistics of the run.
+    """
+    if hasattr(publish, 'put_nowait'):
+        publish = QueuePublisher(publish)
+
+    f = model.compile()
+    s, v = model._initial_state()
+    t, dt = model.time_start, float(model.time_step)
+    n_iter = model.n_iter if duration is None else int(round(duration / dt))
+    period = dt / speed
+    reset(solver)
+
+    latency = []
+    n_published = n_dropped = n_missed = largest = 0
+    slip = 0.0
+    step = 0
+    origin = clock()
+
+    def emit(due):
+        nonlocal n_published, n_dropped, n_missed
+        delivered = publish(State(step, t, s, v, time.time()))
+        n_published += 1
+        n_dropped += delivered is False
+        latency.append(clock() - due)
+        n_missed += latency[-1] > period
+
+    emit(origin)
+    while step < n_iter and not (stop is not None and stop.is_set()):
+        now = clock()
+        # The rounding of the times does not hold back a step which is due.
+        n_due = min(int((now - origin) / period + 1e-9), n_iter) - step
+        if n_due <= 0:
+            sleep(origin + (step + 1) * period - now)
+            continue
+        if n_due > max_substeps:
+            # Too far behind to catch up, the simulation is slowed down.
+            slip += (n_due - max_substeps) * period
+            origin += (n_due - max_substeps) * period
+            n_due = max_substeps
+
+        for _ in range(n_due):
+            s, v, _, t = solver(f, s, v, t, dt)
+        step += n_due
+        largest = max(largest, n_due)
+        # Only the latest of the sub-steps is published.
+        n_missed += n_due - 1
+        emit(origin + step * period)
+
+    return RealTimeStats(step, n_published, n_dropped, n_missed, largest,
+                         slip, np.array(latency))
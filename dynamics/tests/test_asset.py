@@ -5,7 +5,10 @@ Unit test for model.py.
 from unittest import TestCase
 from unittest.mock import Mock
 
+import numpy as np
+
 from dynamics.asset import Asset
+from dynamics.tools import Body, Solution, rotation
 
 class TestAsset(TestCase):
     """Unit test for class Asset."""
@@ -23,6 +26,20 @@ class TestAsset(TestCase):
 
         self.assertEqual(asset.motion, 2)
 
+    def test_results(self):
+        """Test the results of a connected asset are in global coordinates."""
+        body = Body(length=1)
+        asset = Asset('mass', 'theta', body, Solution(disp_0=np.pi/2), rotation)
+        asset_1 = Asset('mass1', 'theta1', body, Solution(velo_0=1.0), rotation,
+                        asset)
+        results = asset_1.results
+
+        self.assertEqual(list(results.columns),
+                         ['asset', 'variable', 'time', 'displacement', 'velocity',
+                          'acceleration', 'x', 'y', 'vx', 'vy'])
+        np.testing.assert_allclose(results[['x', 'y', 'vx', 'vy']].values,
+                                   [[1, -1, 1, 0]], atol=1e-15)
+
 
 if __name__ == '__main__':
     from utils.test_utils import run_test
@@ -0,0 +1,87 @@
+"""
+Unit test for analysis/basins.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.basins import basins
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import RK4
+
+class TestBasins(TestCase):
+    """Unit test for the basins of attraction."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0.5, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(), rotation)
+        self.model = Model(self.asset)
+        self.theta, self.theta_dot = np.meshgrid(np.linspace(-3, 3, 21),
+                                                 np.linspace(-12, 12, 25))
+
+    def integrate(self, theta, theta_dot, time_end):
+        """Final displacements of a full integration of every point."""
+        f = self.model.compile()
+        s, v = np.array([theta.ravel()]), np.array([theta_dot.ravel()])
+        for _ in range(int(round(time_end / 2e-2))):
+            s, v, _, _ = RK4(f, s, v, 0.0, 2e-2)
+        return s[0].reshape(theta.shape)
+
+    def test_flips(self):
+        """Test the number of flips is the equilibrium reached by the full
+        integration, with less work than the full integration."""
+        result = basins(self.model, [self.theta], [self.theta_dot], time_step=2e-2)
+
+        self.assertEqual(result.labels.shape, (25, 21))
+        self.assertTrue(np.all(result.settled))
+        final = self.integrate(self.theta, self.theta_dot, 60.0)
+        np.testing.assert_array_equal(result.labels, np.rint(final / (2*np.pi)))
+        # Symmetric under (theta, theta_dot) -> (-theta, -theta_dot).
+        np.testing.assert_array_equal(result.labels, -result.labels[::-1, ::-1])
+        self.assertEqual(result.labels[12, 10], 0)
+        self.assertGreater(result.labels.max(), 1)
+
+        self.assertLess(result.work, self.theta.size * result.n_steps)
+        np.testing.assert_allclose(result.settle_time.max(), result.n_steps * 2e-2)
+        self.assertLess(result.settle_time[12, 10], 1.0)
+
+    def test_early_classification(self):
+        """A trajectory below the energy of the upright pendulum cannot flip,
+        classifying it there saves most of the work."""
+        def trapped(s, v, a):
+            wrapped = (s + np.pi) % (2*np.pi) - np.pi
+            energy = v[0]**2 / 2 - 9.80665 * np.cos(s[0])
+            return (energy < 0.9 * 9.80665) & (np.abs(wrapped[0]) < np.pi / 2)
+
+        at_rest = basins(self.model, [self.theta], [self.theta_dot], time_step=2e-2)
+        early = basins(self.model, [self.theta], [self.theta_dot], settle=trapped,
+                       time_step=2e-2)
+
+        np.testing.assert_array_equal(early.labels, at_rest.labels)
+        self.assertLess(early.work, at_rest.work / 4)
+        self.assertTrue(np.all(early.settle_time <= at_rest.settle_time))
+
+    def test_unsettled(self):
+        """Test the trajectories not settled are masked."""
+        result = basins(self.model, [[0.1, 3.0]], [[0.0, 0.0]], n_iter=100,
+                        time_step=2e-2, atol=1e-2)
+
+        self.assertEqual(list(result.settled), [False, False])
+        self.assertTrue(np.all(np.isnan(result.settle_time)))
+        self.assertEqual(result.work, 200)
+        self.assertEqual(result.displacement.shape, (1, 2))
+
+        with self.assertRaises(ValueError):
+            basins(self.model, [[0.1], [0.2]], [[0.0], [0.0]])
+        with self.assertRaises(ValueError):
+            basins(self.model, [[0.1]], [[0.0]], variable='phi')
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestBasins]
+
+    run_test(TEST_CLASSES)
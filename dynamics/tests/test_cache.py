@@ -0,0 +1,176 @@
+"""
+Unit test for cache.py.
+"""
+
+import os
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from dynamics.asset import Asset
+from dynamics.cache import ResultCache, _describe
+from dynamics.core import Simulation, SimulationParameters
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import (RK4, AdamsBashforth, EulerMaruyama,
+                                   StochasticHeun, euler)
+
+class TestResultCache(TestCase):
+    """Unit test for the on-disk cache of simulation results."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name)
+        self.body = Body(mass=1, drag_coeff=0.4, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(disp_0=1.0), rotation)
+        self.model = Model(self.asset)
+        self.parameters = SimulationParameters(1e-2, 0.0, 1.0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def simulation(self):
+        simulation = Simulation()
+        simulation.register('model', self.model)
+        simulation.register('solver', RK4)
+        simulation.register('cache', self.cache)
+        simulation.set_paramters(time_step=1e-2, time_end=1.0)
+        return simulation
+
+    def test_key(self):
+        """Test the key changes with every part of the run specification."""
+        key = self.cache.key(self.model, self.parameters, RK4)
+
+        self.assertEqual(key, self.cache.key(self.model, self.parameters, RK4))
+        self.assertNotEqual(key, self.cache.key(self.model, self.parameters, euler))
+        self.assertNotEqual(key, self.cache.key(self.model, self.parameters,
+                                                AdamsBashforth(3)))
+        self.assertNotEqual(key, self.cache.key(
+            self.model, SimulationParameters(1e-2, 0.0, 2.0), RK4))
+        self.body.mass = 2
+        self.assertNotEqual(key, self.cache.key(self.model, self.parameters, RK4))
+        self.body.mass = 1.0
+        self.assertEqual(key, self.cache.key(self.model, self.parameters, RK4))
+        self.asset.solution = Solution(disp_0=0.5)
+        self.assertNotEqual(key, self.cache.key(self.model, self.parameters, RK4))
+
+    def test_function(self):
+        """Test functions of the same name and line are told apart by their
+        code and defaults."""
+        def compiled(source):
+            namespace = {}
+            exec(compile(source, 'motion.py', 'exec'), namespace)
+            return namespace['motion']
+
+        source = "def motion(x, l=1):\n    return x * l"
+        description = _describe(compiled(source))
+
+        self.assertEqual(description, _describe(compiled(source)))
+        self.assertNotEqual(description,
+                            _describe(compiled(source.replace('*', '+'))))
+        self.assertNotEqual(description,
+                            _describe(compiled(source.replace('l=1', 'l=2'))))
+
+    def test_closure(self):
+        """Test motion functions from one factory are told apart by their
+        closures, and a closure which cannot be described is not memoised."""
+        def make(scale):
+            return lambda length, var_name: [scale * x for x in rotation(length, var_name)]
+
+        keys = []
+        for motion in (make(1.0), make(2.0), make(1.0)):
+            self.asset.motion_func = motion
+            keys.append(self.cache.key(self.model, self.parameters, RK4))
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], keys[2])
+
+        simulation = self.simulation()
+        final = []
+        for motion in (make(1.0), make(2.0)):
+            self.asset.motion_func = motion
+            self.asset.solution.clear()
+            simulation.run()
+            final.append(self.asset.solution.displacement[-1])
+        self.assertEqual(len(self.cache), 2)
+        self.assertNotEqual(final[0], final[1])
+
+        self.asset.motion_func = make(object())
+        with self.assertRaises(TypeError):
+            self.cache.key(self.model, self.parameters, RK4)
+        self.asset.motion_func = make(1.0)
+        self.asset.solution.clear()
+        with patch.object(self.cache, 'key', side_effect=TypeError):
+            simulation.run()
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_round_trip(self):
+        """Test the results are stored and loaded unchanged, with the index of
+        the rows of every asset in turn."""
+        results = pd.DataFrame({'asset': ['mass', 'mass', 'tip'], 'time': [0.0, 0.1, 0.0],
+                                'x': np.ones(3, dtype=np.float32)}, index=[0, 1, 0])
+        self.cache.put('run', results)
+
+        loaded = self.cache.get('run')
+        pd.testing.assert_frame_equal(loaded, results)
+        self.assertIsNone(self.cache.get('other'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_simulation(self):
+        """Test a repeated run takes its results from the cache."""
+        simulation = self.simulation()
+        simulation.run()
+        expected = simulation.results
+        self.assertEqual(len(self.cache), 1)
+
+        self.asset.solution.clear()
+        with patch.object(Model, 'solve') as solve:
+            simulation.run()
+        solve.assert_not_called()
+        pd.testing.assert_frame_equal(simulation.results, expected)
+        np.testing.assert_allclose(self.asset.solution.displacement,
+                                   expected['displacement'])
+
+    def test_stochastic(self):
+        """Test the key changes with the noise and the seed of a stochastic
+        solver, and unseeded stochastic runs are not memoised."""
+        key = self.cache.key(self.model, self.parameters, EulerMaruyama(0.1, seed=1))
+
+        self.assertEqual(key, self.cache.key(self.model, self.parameters,
+                                             EulerMaruyama(0.1, seed=1)))
+        for solver in (EulerMaruyama(5.0, seed=1), EulerMaruyama(0.1, seed=2),
+                       EulerMaruyama([0.1], seed=1), StochasticHeun(0.1, seed=1)):
+            self.assertNotEqual(key, self.cache.key(self.model, self.parameters, solver))
+
+        simulation = self.simulation()
+        simulation.register('solver', EulerMaruyama(0.1))
+        simulation.run()
+        self.assertEqual(len(self.cache), 0)
+        simulation.register('solver', EulerMaruyama(0.1, seed=1))
+        simulation.run()
+        self.assertEqual(len(self.cache), 1)
+
+    def test_eviction(self):
+        """Test the least recently used results are evicted."""
+        results = pd.DataFrame({'x': np.random.default_rng(0).random(1000)})
+        for key in ('a', 'b', 'c'):
+            self.cache.put(key, results)
+            time.sleep(0.01)
+        size = os.path.getsize(self.cache._path('a'))
+        self.cache.get('a')
+        time.sleep(0.01)
+
+        self.cache.max_bytes = 3 * size
+        self.cache.put('d', results)
+        self.assertEqual(sorted(key for key in 'abcd' if key in self.cache),
+                         ['a', 'c', 'd'])
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestResultCache]
+
+    run_test(TEST_CLASSES)
@@ -0,0 +1,94 @@
+"""
+Unit test for analysis/chaos.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.chaos import iter_lyapunov, lyapunov, poincare
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+
+class TestLyapunov(TestCase):
+    """Unit test for the Lyapunov exponents."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0.4, length=1)
+        asset = Asset('mass', 'theta', self.body, Solution(disp_0=0.1), rotation)
+        self.model = Model(asset)
+
+    def test_damped_spectrum(self):
+        """The exponents of the damped pendulum sum to the phase space
+        contraction rate -c/m, near the equilibrium both are -c/(2m)."""
+        exponents = lyapunov(self.model, n_vectors=2, n_iter=5000)
+
+        self.assertEqual(exponents.shape, (2,))
+        self.assertAlmostEqual(exponents.sum(), -0.4, places=4)
+        np.testing.assert_allclose(exponents, [-0.2, -0.2], atol=0.05)
+
+    def test_batch(self):
+        """Test the largest exponent over a grid of initial conditions."""
+        theta, theta_dot = np.meshgrid(np.linspace(-1, 1, 3), np.linspace(-1, 1, 4))
+        exponents = lyapunov(self.model, n_iter=2000, s0=[theta.ravel()],
+                             v0=[theta_dot.ravel()])
+
+        self.assertEqual(exponents.shape, (1, 12))
+        self.assertTrue(np.all(exponents < 0))
+
+    def test_iter_lyapunov(self):
+        """Test the running estimate at every renormalisation."""
+        estimates = list(iter_lyapunov(self.model, n_iter=100, renormalise=10,
+                                       transient=25))
+
+        self.assertEqual(len(estimates), 10)
+        self.assertAlmostEqual(estimates[-1][0], 1.0)
+
+        with self.assertRaises(ValueError):
+            next(iter_lyapunov(self.model, n_vectors=3))
+
+
+class TestPoincare(TestCase):
+    """Unit test for the Poincaré sections."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0, length=1)
+        asset = Asset('mass', 'theta', self.body, Solution(disp_0=1.0), rotation)
+        self.model = Model(asset)
+
+    def test_section(self):
+        """The undamped pendulum crosses theta = 0 upwards once per period
+        with the velocity given by the conservation of energy."""
+        results = poincare(self.model, 'theta', n_iter=1000, time_step=5e-2)
+
+        self.assertEqual(list(results.columns), ['batch', 'time', 'theta', 'thetadot'])
+        self.assertEqual(len(results), 23)
+        np.testing.assert_allclose(results['theta'], 0.0, atol=1e-12)
+        np.testing.assert_allclose(results['thetadot'],
+                                   np.sqrt(2 * 9.80665 * (1 - np.cos(1.0))), rtol=1e-4)
+        np.testing.assert_allclose(np.diff(results['time']), 2.1395, rtol=1e-4)
+
+    def test_periodic_section(self):
+        """Test the sections of a periodic variable for a batch of a swinging
+        and a rotating pendulum."""
+        results = poincare(self.model, 'theta', direction=0, period=2*np.pi,
+                           n_iter=400, time_step=5e-2, s0=[[1.0, 0.0]],
+                           v0=[[0.0, 10.0]])
+
+        counts = results.groupby('batch').size()
+        self.assertEqual(counts[0], 19)
+        self.assertEqual(counts[1], 28)
+        rotating = results[results['batch'] == 1]['theta']
+        np.testing.assert_allclose(np.mod(rotating + 1, 2*np.pi) - 1, 0.0, atol=1e-12)
+
+    def test_unknown_variable(self):
+        """Test section of a variable not in the model."""
+        with self.assertRaises(ValueError):
+            poincare(self.model, 'phi')
+
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+    TEST_CLASSES = [TestLyapunov, TestPoincare]
+    run_test(TEST_CLASSES)
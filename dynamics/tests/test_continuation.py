@@ -0,0 +1,80 @@
+"""
+Unit test for analysis/continuation.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.continuation import continuation, iter_continuation
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+
+class TestContinuation(TestCase):
+    """Unit test for the bifurcation diagrams."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(disp_0=1.0), rotation)
+        self.model = Model(self.asset)
+
+    def test_maxima(self):
+        """The mass does not change the motion of the pendulum, the maxima are
+        the initial amplitude for every value."""
+        results = continuation(self.model, self.asset, 'mass', [1.0, 2.0, 3.0],
+                               'theta', n_iter=500, transient=50, time_step=5e-2)
+
+        self.assertEqual(list(results.columns),
+                         ['mass_theta', 'batch', 'time', 'theta', 'thetadot'])
+        self.assertEqual(list(results.groupby('mass_theta').size()), [11, 11, 12])
+        np.testing.assert_allclose(results['theta'], 1.0, rtol=1e-3)
+        np.testing.assert_allclose(results['thetadot'], 0.0, atol=1e-12)
+        self.assertTrue(np.all(np.diff(results['time']) > 0))
+        self.assertEqual(self.body.mass, 1)
+
+        # Without Newton iterations the maxima are only interpolated linearly.
+        results = continuation(self.model, self.asset, 'mass', [1.0], 'theta',
+                               n_iter=500, transient=50, time_step=5e-2, n_newton=0)
+        self.assertGreater(np.abs(results['thetadot']).max(), 1e-6)
+
+    def test_warm_start(self):
+        """Every value starts from the final state of the previous value, the
+        motion damped at the first value stays at rest without damping."""
+        results = continuation(self.model, self.asset, 'drag_coeff', [1.0, 0.0],
+                               'theta', n_iter=300, transient=600, time_step=5e-2)
+
+        undamped = results[results['drag_coeff_theta'] == 0.0]
+        self.assertGreater(len(undamped), 0)
+        self.assertTrue(np.all(undamped['theta'] < 1e-6))
+
+    def test_section(self):
+        """Test the section crossings of a batch, stopping every value after
+        the number of points."""
+        points = list(iter_continuation(self.model, self.asset, 'length', [1.0, 4.0],
+                                        'theta', sampling='section', time_step=5e-2,
+                                        transient=0, n_points=3,
+                                        s0=[[1.0, 0.5]], v0=[[0.0, 0.0]]))
+
+        for length in (1.0, 4.0):
+            batch = np.concatenate([b for value, b, _, _, _ in points if value == length])
+            counts = np.bincount(batch)
+            self.assertEqual(counts.min(), 3)
+        value, batch, time, s, v = points[0]
+        np.testing.assert_allclose(s[0], 0.0, atol=1e-12)
+        np.testing.assert_allclose(v[0][batch == 0],
+                                   np.sqrt(2 * 9.80665 * (1 - np.cos(1.0))), rtol=1e-3)
+
+    def test_unknown(self):
+        """Test the sampling and variables not supported."""
+        with self.assertRaises(ValueError):
+            continuation(self.model, self.asset, 'mass', [1.0], 'theta', sampling='mean')
+        with self.assertRaises(ValueError):
+            continuation(self.model, self.asset, 'mass', [1.0], 'phi')
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestContinuation]
+
+    run_test(TEST_CLASSES)
@@ -6,7 +6,13 @@ from unittest import TestCase
 import unittest
 from unittest.mock import Mock
 
+import numpy as np
+
+from dynamics.asset import Asset
 from dynamics.core import Simulation, SimulationParameters
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import RK4
 
 class TestSimulation(TestCase):
     """Unit test for class Simulation."""
@@ -65,8 +71,59 @@ class TestSimulation(TestCase):
         )
 
         self.assertEqual(self.simulation.parameters.n_iter, 1000)
+        self.assertEqual(self.simulation.parameters.dtype, np.float64)
         self.assertTrue(isinstance(self.simulation.parameters, SimulationParameters))
 
+    def test_set_parameters_dtype(self):
+        """Test method set_parameters for the precision of the simulation."""
+        self.simulation.set_paramters(dtype=np.float32)
+        self.assertEqual(self.simulation.parameters.dtype, np.float32)
+
+        with self.assertRaises(ValueError):
+            self.simulation.set_paramters(dtype=np.int64)
+
+
+class TestSimulationPrecision(TestCase):
+    """Accuracy of float32 simulations against float64 for the pendulum
+    examples."""
+
+    def run_pendulum(self, dtype, n_links, time_end):
+        body = Body(mass=1, drag_coeff=0.4, length=1)
+        assets = [Asset('mass', 'theta', body, Solution(disp_0=3.12), rotation)]
+        for i in range(1, n_links):
+            assets.append(Asset('mass{}'.format(i), 'theta{}'.format(i), body,
+                                Solution(disp_0=0.0), rotation, assets[-1]))
+
+        simulation = Simulation()
+        simulation.register('model', Model(assets))
+        simulation.register('solver', RK4)
+        simulation.set_paramters(time_step=25e-4, time_end=time_end,
+                                 dtype=dtype)
+        simulation.run()
+        return simulation.results
+
+    def assert_precision_loss(self, n_links, time_end, tolerance):
+        results_64 = self.run_pendulum(np.float64, n_links, time_end)
+        results_32 = self.run_pendulum(np.float32, n_links, time_end)
+
+        for column in ['displacement', 'velocity', 'acceleration', 'x', 'y']:
+            self.assertEqual(results_32[column].dtype, np.float32)
+            self.assertEqual(results_64[column].dtype, np.float64)
+
+        error = np.abs(results_32['displacement'].values
+                       - results_64['displacement'].values).max()
+        self.assertGreater(error, 0.0)
+        self.assertLess(error, tolerance)
+
+    def test_single_pendulum(self):
+        """float32 stays within 1e-4 rad of float64 over 6000 RK4 steps."""
+        self.assert_precision_loss(1, 15, 1e-4)
+
+    def test_double_pendulum(self):
+        """float32 stays within 1e-4 rad of float64 over 800 RK4 steps of the
+        chaotic double pendulum."""
+        self.assert_precision_loss(2, 2, 1e-4)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
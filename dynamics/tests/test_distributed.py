@@ -0,0 +1,145 @@
+"""
+Unit test for distributed.py.
+"""
+
+import gc
+import pickle
+from multiprocessing import AuthenticationError
+from multiprocessing.shared_memory import SharedMemory
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.asset import Asset
+from dynamics.core import SimulationParameters
+from dynamics.distributed import (Coordinator, Job, SharedResults, _compress,
+                                  _decompress, run_jobs, run_shared,
+                                  run_worker)
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import RK4
+
+def failing_solver(f, s0, v0, t0, dt):
+    raise FloatingPointError("diverged")
+
+class TestDistributed(TestCase):
+    """Unit test for the coordinator and workers of simulation jobs."""
+
+    def setUp(self):
+        self.parameters = SimulationParameters(1e-2, 0.0, 1.0)
+        self.jobs = []
+        for length in (0.5, 1.0, 1.5, 2.0):
+            asset = Asset('mass', 'theta', Body(1, 0.2, length),
+                          Solution(disp_0=1.0), rotation)
+            self.jobs.append(Job.from_model(Model(asset), self.parameters, RK4))
+
+    def test_job(self):
+        """Test a job is picklable and runs its model."""
+        job = pickle.loads(pickle.dumps(self.jobs[0]))
+        result = job.run()
+
+        self.assertEqual(result['time'].shape, (101,))
+        self.assertEqual(result['displacement'].shape, (101, 1))
+        self.assertAlmostEqual(result['time'][-1], 1.0)
+        self.assertEqual(result['displacement'][0, 0], 1.0)
+        for key, value in _decompress(_compress(result)).items():
+            np.testing.assert_array_equal(value, result[key])
+
+    def test_connection(self):
+        """Test the connections of the assets are kept by a job."""
+        body = Asset('body', 'theta', Body(), Solution(1.0), rotation)
+        arm = Asset('arm', 'phi', Body(), Solution(), rotation, connection=body)
+        model = Job.from_model(Model([body, arm]), self.parameters).build()
+
+        self.assertIs(model.asset[1].connection, model.asset[0])
+        with self.assertRaises(ValueError):
+            Job.from_model(Model(arm), self.parameters)
+
+    def test_run_jobs(self):
+        """Test the results are collected in the order of the jobs."""
+        results = run_jobs(self.jobs, n_workers=2, batch_size=2)
+
+        self.assertEqual(len(results), 4)
+        for job, result in zip(self.jobs, results):
+            np.testing.assert_allclose(result['displacement'],
+                                       job.run()['displacement'])
+
+    def test_worker_lost(self):
+        """Test the jobs of a lost worker are handed out again."""
+        with Coordinator(self.jobs, lease_timeout=1.0) as coordinator:
+            # A worker leasing jobs and never reporting back.
+            self.assertEqual(len(coordinator._scheduler.lease('lost', 3)), 3)
+            coordinator.start_workers(1, heartbeat=0.2)
+            results = coordinator.results(timeout=60)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(len(result['time']) == 101 for result in results))
+
+    def test_authkey(self):
+        """Test the coordinators have random keys rejecting other workers."""
+        with Coordinator(self.jobs) as coordinator:
+            self.assertEqual(len(coordinator.authkey), 32)
+            self.assertNotEqual(coordinator.authkey, Coordinator([]).authkey)
+            with self.assertRaises(AuthenticationError):
+                run_worker(coordinator.address, b'dynamics')
+            self.assertEqual(coordinator.progress(), (0, 0, 4))
+
+    def test_retries(self):
+        """Test a failing job is retried and reported."""
+        jobs = [self.jobs[0], Job(self.jobs[1].assets, self.parameters, failing_solver)]
+        with Coordinator(jobs, max_retries=1) as coordinator:
+            coordinator.start_workers(2)
+            with self.assertRaisesRegex(RuntimeError, "diverged"):
+                coordinator.results(timeout=60)
+            self.assertEqual(coordinator.progress(), (1, 1, 2))
+
+    def test_run_shared(self):
+        """Test the results are written into shared memory."""
+        jobs = self.jobs + [Job.from_model(
+            Model(Asset('mass', 'theta', Body(), Solution(0.5), rotation)),
+            SimulationParameters(1e-2, 0.0, 0.5))]
+        with run_shared(jobs, n_workers=2) as results:
+            self.assertEqual(results.displacement.shape, (5, 101, 1))
+            for job, result in zip(jobs, results.results()):
+                expected = job.run()
+                for key, value in expected.items():
+                    self.assertEqual(result[key].shape, value.shape)
+                    np.testing.assert_array_equal(result[key], value)
+            # The results are views, and the padding of the shorter job NaN.
+            self.assertIsNotNone(results.result(0)['velocity'].base)
+            self.assertTrue(np.all(np.isnan(results.time[4, 51:])))
+            name = results.name
+
+        self.assertTrue(results.closed)
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=name)
+
+    def test_shared_lifetime(self):
+        """Test the views outlive the shared memory block."""
+        results = SharedResults(self.jobs[:1])
+        name = results.name
+        time_ = results.result(0)['time']
+        del results
+        gc.collect()
+
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=name)
+        time_[:] = 1.0
+        self.assertEqual(time_.sum(), 101.0)
+
+    def test_shared_failure(self):
+        """Test a failing job is reported and the block removed."""
+        jobs = [self.jobs[0], Job(self.jobs[1].assets, self.parameters, failing_solver)]
+        shared = SharedResults(jobs)
+        shared.close()
+        with self.assertRaisesRegex(ValueError, "closed"):
+            shared.result(0)
+        with self.assertRaisesRegex(RuntimeError, "diverged"):
+            run_shared(jobs)
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestDistributed]
+
+    run_test(TEST_CLASSES)
@@ -0,0 +1,71 @@
+"""
+Unit test for analysis/fitting.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.fitting import fit, sample_batch
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+
+class TestFitting(TestCase):
+    """Unit test for the parameter estimation."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0.4, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(disp_0=1.0), rotation)
+        self.model = Model(self.asset)
+        self.parameters = [(self.asset, 'drag_coeff'), (self.asset, 'length')]
+        self.time = np.linspace(0.0, 5.0, 101)
+
+    def measure(self, noise=0.0):
+        f = self.model.compile(self.parameters)
+        sampled = sample_batch(f, [[0.4], [1.0]], [1.0], [0.0], 0.0, 1e-3, self.time)
+        rng = np.random.default_rng(0)
+        return sampled[:, 0, 0] + rng.normal(0.0, noise, len(self.time))
+
+    def test_sample_batch(self):
+        """Test sampling of a batch of parameter sets."""
+        f = self.model.compile(self.parameters)
+        p = [[0.4, 0.4, 0.0], [1.0, 2.0, 1.0]]
+        sampled = sample_batch(f, p, [1.0], [0.0], 0.0, 1e-2, self.time)
+
+        self.assertEqual(sampled.shape, (101, 1, 3))
+        np.testing.assert_allclose(sampled[0], 1.0)
+        # A longer pendulum is slower, without drag the amplitude is kept.
+        self.assertNotAlmostEqual(sampled[-1, 0, 0], sampled[-1, 0, 1])
+        self.assertAlmostEqual(np.abs(sampled[:, 0, 2]).max(), 1.0, places=2)
+
+    def test_fit(self):
+        """Test recovering the drag coefficient and length."""
+        self.body.drag_coeff, self.body.length = 0.2, 1.3
+        result = fit(self.model, self.parameters, self.time, self.measure(),
+                     time_step=1e-2)
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.parameters, ['drag_coeff_theta', 'length_theta'])
+        np.testing.assert_allclose(result.values, [0.4, 1.0], atol=1e-3)
+
+    def test_fit_uncertainty(self):
+        """Test the standard errors of a fit to noisy measurements."""
+        result = fit(self.model, self.parameters, self.time,
+                     self.measure(noise=0.01), time_step=1e-2)
+
+        self.assertTrue(np.all(result.standard_error > 0))
+        self.assertTrue(np.all(np.abs(result.values - [0.4, 1.0])
+                               < 4 * result.standard_error))
+        self.assertEqual(result.as_dict()['length_theta'], result.values[1])
+
+    def test_fit_time(self):
+        """Test fit with unsorted measured time."""
+        with self.assertRaises(ValueError):
+            fit(self.model, self.parameters, self.time[::-1], self.measure())
+
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+    TEST_CLASSES = [TestFitting]
+    run_test(TEST_CLASSES)
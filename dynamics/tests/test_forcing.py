@@ -0,0 +1,167 @@
+"""
+Unit test for tools/forcing.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.precision import reference_solution
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import BaseExcitation, Body, Forcing, Solution, rotation
+from dynamics.tools.solver import RK4, AdamsBashforthMoulton, TimeDependent
+
+class TestForcing(TestCase):
+    """Unit test for the tabulated generalised forces."""
+
+    def test_interpolation(self):
+        """Test the interpolation of uniform and non-uniform tables."""
+        time = np.linspace(0.0, 1.0, 1001)
+        force = np.column_stack([np.sin(time), np.cos(time)])
+        uniform = Forcing(time, force)
+        warped = Forcing(time**2, force)
+
+        for t in (0.0, 0.1234, 0.5, 0.99999, 1.0):
+            np.testing.assert_allclose(uniform(t), [np.sin(t), np.cos(t)], atol=1e-7)
+            np.testing.assert_allclose(warped(t), [np.sin(t**0.5), np.cos(t**0.5)],
+                                       atol=1e-3)
+        self.assertTrue(uniform._uniform)
+        self.assertFalse(warped._uniform)
+
+    def test_outside(self):
+        """Test the forces outside of the sampling times."""
+        hold = Forcing([0.0, 1.0], [2.0, 3.0])
+        zero = Forcing([0.0, 1.0], [2.0, 3.0], outside='zero')
+
+        np.testing.assert_array_equal(hold(-1.0), [2.0])
+        np.testing.assert_array_equal(hold(2.0), [3.0])
+        np.testing.assert_array_equal(zero(2.0), [0.0])
+        with self.assertRaises(ValueError):
+            Forcing([0.0, 0.0, 1.0], [1.0, 2.0, 3.0])
+        with self.assertRaises(ValueError):
+            Forcing([0.0, 1.0], [1.0, 2.0], outside='wrap')
+
+    def test_replay(self):
+        """Test replaying a long recording in order."""
+        time = np.arange(2_000_000) * 1e-5
+        forcing = Forcing(time, np.sin(time))
+        for t in np.linspace(0.0, 19.9, 50):
+            self.assertAlmostEqual(forcing(t)[0], np.sin(t), places=8)
+
+
+class TestModelForcing(TestCase):
+    """Unit test for the models driven by generalised forces."""
+
+    def setUp(self):
+        self.body = Body(mass=2, drag_coeff=0, length=0.5)
+        self.asset = Asset('mass', 'theta', self.body, Solution(), rotation)
+        self.model = Model(self.asset)
+        self.model.gravity = 0.0
+        self.time = np.linspace(0.0, 5.0, 5001)
+        self.forcing = Forcing(self.time, np.sin(3 * self.time))
+
+    def exact(self, t):
+        # Without gravity and drag, theta'' = Q(t) / (m L^2).
+        return (t / 3 - np.sin(3 * t) / 9) / (2 * 0.5**2)
+
+    def test_compile(self):
+        """Test the forced accelerations are functions of the time."""
+        f = self.model.compile(forcing=self.forcing)
+
+        self.assertIsInstance(f, TimeDependent)
+        self.assertAlmostEqual(f[0](np.array([0.3]), np.array([0.0]), 0.5),
+                               np.sin(1.5) / 0.5, places=5)
+        with self.assertRaises(ValueError):
+            self.model.compile(forcing=Forcing(self.time, np.ones((5001, 2))))
+
+    def test_fixed_step(self):
+        """Test a forced model with the fixed-step solvers."""
+        for solver in (RK4, AdamsBashforthMoulton()):
+            self.asset.solution.clear()
+            self.model.initialise(time_step=1e-2, n_iter=500)
+            self.model.solve(solver, forcing=[(self.asset, self.forcing)])
+
+            np.testing.assert_allclose(self.asset.solution.displacement,
+                                       self.exact(np.array(self.asset.solution.time)),
+                                       atol=1e-5)
+
+    def test_adaptive_step(self):
+        """Test a forced model with an adaptive solver."""
+        f = self.model.compile(forcing=self.forcing)
+        solution = reference_solution(f, np.zeros(1), np.zeros(1), 0.0, 5.0,
+                                      rtol=1e-8, atol=1e-10)
+
+        np.testing.assert_allclose(solution(self.time)[0], self.exact(self.time),
+                                   atol=1e-5)
+
+    def test_double_pendulum(self):
+        """Test the forces enter the reaction matrix of a coupled model."""
+        asset_1 = Asset('mass_1', 'phi', Body(), Solution(), rotation,
+                        connection=self.asset)
+        model = Model([self.asset, asset_1], simplification='cse')
+        forcing = Forcing([0.0, 1.0], [[1.0, 0.0], [1.0, 0.0]])
+        f = model.compile(forcing=forcing)
+        free = model.compile()
+        s, v = np.array([0.3, -0.2]), np.array([0.1, 0.4])
+
+        # The accelerations of a unit force on the first coordinate are the
+        # first column of inv([M]).
+        delta = np.array([fun(s, v, 0.5) - fun_0(s, v) for fun, fun_0 in zip(f, free)])
+        inverse = np.array([[entry(s, list(model.parameter_values())) for entry in row]
+                            for row in model._inverse_mass_functions()], dtype=float)
+        np.testing.assert_allclose(delta, inverse[:, 0])
+        self.assertGreater(delta[0], 0)
+
+    def test_base_excitation(self):
+        """Test an acceleration of the base against gravity, which pulls the
+        assets against the direction of gravity as an acceleration of the base
+        along it does."""
+        asset_1 = Asset('mass_1', 'phi', Body(1.5, 0.1, 0.8), Solution(), rotation,
+                        connection=self.asset)
+        model = Model([self.asset, asset_1], simplification='cse')
+        model.direction_grav = (0.6, 0.8)
+        rng = np.random.default_rng(0)
+        s, v = rng.normal(size=(2, 2, 20))
+
+        model.gravity = 9.0
+        expected = [fun(s, v) for fun in model.compile()]
+        model.gravity = 0.0
+        for excitation in (BaseExcitation([0.0, 1.0], [[5.4, 7.2]] * 2),
+                           BaseExcitation([0.0, 1.0], [9.0, 9.0], direction=(0.6, 0.8))):
+            f = model.compile(forcing=excitation)
+            np.testing.assert_allclose([fun(s, v, 0.5) for fun in f], expected,
+                                       rtol=1e-10, atol=1e-12)
+
+    def test_base_excitation_table(self):
+        """Test a small horizontal shaking of the base of a pendulum, for which
+        theta'' = -(g theta + a(t)) / L."""
+        self.body.drag_coeff = 0.0
+        self.model.gravity = 9.80665
+        excitation = BaseExcitation(self.time, 0.01 * np.sin(3 * self.time),
+                                    direction=(1, 0))
+        f = self.model.compile(forcing=excitation)
+        solution = reference_solution(f, np.zeros(1), np.zeros(1), 0.0, 5.0)
+
+        omega = np.sqrt(9.80665 / 0.5)
+        # The response from rest to a(t) = A sin(3t).
+        amplitude = -0.01 / 0.5 / (omega**2 - 9)
+        exact = amplitude * (np.sin(3 * self.time) - 3 / omega * np.sin(omega * self.time))
+        np.testing.assert_allclose(solution(self.time)[0], exact, atol=1e-6)
+        with self.assertRaises(ValueError):
+            BaseExcitation(self.time, np.ones((5001, 3)))
+        with self.assertRaises(ValueError):
+            BaseExcitation(self.time, np.ones((5001, 2)), direction=(1, 0))
+        with self.assertRaises(ValueError):
+            BaseExcitation(self.time, np.ones(5001), direction=(0, 0))
+
+        # The direction is a unit vector whatever its length.
+        diagonal = BaseExcitation([0.0, 1.0], [2.0, 2.0], direction=(1, 1))
+        np.testing.assert_allclose(diagonal(0.5), [np.sqrt(2), np.sqrt(2)])
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestForcing, TestModelForcing]
+
+    run_test(TEST_CLASSES)
@@ -2,12 +2,21 @@
 Unit test for model.py.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
+import numpy as np
+import sympy as sp
 from sympy.physics.vector import dynamicsymbols
 
-from dynamics.model import Model
+import dynamics.model as model_module
+
+from dynamics.asset import Asset
+from dynamics.model import Model, clear_derivations
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import RK4, _evaluate
 
 class TestModel(TestCase):
     """Unit test for class Model."""
@@ -44,6 +53,326 @@ class TestModel(TestCase):
         self.assertEqual(model._potential_energy(), 2*dynamicsymbols('x'))
 
 
+    def test_time_derivative_error(self):
+        """Test an error of the time derivative is raised, not hidden."""
+        x = dynamicsymbols('x')
+        with patch('dynamics.model.sp.Derivative', side_effect=TypeError('derivative')):
+            with self.assertRaisesRegex(TypeError, 'derivative'):
+                model_module._time_derivative(x)
+
+    def test_parameter_symbol(self):
+        """Test method parameter_symbol for the component properties."""
+        asset = Mock(var_name='x')
+        model = Model(asset)
+
+        self.assertEqual(model.parameter_symbol(asset, 'mass').name, 'mass_x')
+        with self.assertRaises(ValueError):
+            model.parameter_symbol(asset, 'stiffness')
+
+
+class TestModelParametric(TestCase):
+    """Unit test for the parametric derivation of class Model."""
+
+    def setUp(self):
+        # A motion of its own keeps the derivation out of the shared cache.
+        def motion(length, var_name):
+            return rotation(length, var_name)
+        self.body = Body(mass=1, drag_coeff=0.4, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(disp_0=1.0), motion)
+        self.model = Model(self.asset, simplification='none')
+        self.model.initialise(time_step=1e-2, n_iter=100)
+
+    def test_parameters(self):
+        """Test the parameters and their current values."""
+        self.assertEqual([name for _, name in self.model.parameters],
+                         ['mass', 'drag_coeff', 'length', 'gravity'])
+        np.testing.assert_allclose(self.model.parameter_values(),
+                                   [1, 0.4, 1, 9.80665])
+        self.assertEqual(self.model.parameter_symbol(None, 'gravity').name, 'g')
+
+    def test_derived_once(self):
+        """Test changing the properties does not derive the model again."""
+        with patch.object(Model, '_acceleration_matrix',
+                          wraps=self.model._acceleration_matrix) as derivation:
+            self.model.solve(RK4)
+            self.body.length = 2
+            self.model.gravity = 0.0
+            self.asset.solution.clear()
+            self.model.solve(RK4)
+            Model(self.asset, simplification='none').compile()
+        self.assertEqual(derivation.call_count, 1)
+
+        # Without gravity the pendulum starting at rest does not move.
+        np.testing.assert_allclose(self.asset.solution.displacement, 1.0)
+
+    def test_clear_derivations(self):
+        """Test the shared derivations are bounded and cleared."""
+        with patch.object(model_module._derivations, 'maxsize', 1), \
+                patch.object(Model, '_acceleration_matrix',
+                             wraps=self.model._acceleration_matrix) as derivation:
+            self.model.compile()
+            self.model.compile()
+            Model(self.asset).compile()
+            self.assertEqual(len(model_module._derivations), 1)
+            self.model.compile()
+            self.assertEqual(derivation.call_count, 3)
+
+            clear_derivations()
+            self.assertEqual(len(model_module._derivations), 0)
+            self.assertEqual(len(model_module._terms), 0)
+            self.model.compile()
+            self.assertEqual(derivation.call_count, 4)
+
+    def test_compile(self):
+        """Test the accelerations follow the current properties."""
+        accel = self.model.compile()[0]
+        self.assertAlmostEqual(accel([np.pi/2], [1.0]), -9.80665 - 0.4)
+
+        self.body.length, self.body.mass = 2, 2
+        accel = self.model.compile()[0]
+        self.assertAlmostEqual(accel([np.pi/2], [1.0]), -9.80665/2 - 0.2)
+
+        accel = self.model.compile([(self.asset, 'length')])[0]
+        self.assertAlmostEqual(accel([np.pi/2], [1.0], [4]), -9.80665/4 - 0.2)
+
+
+class TestModelKinematics(TestCase):
+    """Unit test for the kinematics of class Model."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(), rotation)
+        self.asset_1 = Asset('mass1', 'theta1', Body(length=2), Solution(),
+                             rotation, self.asset)
+        self.model = Model([self.asset, self.asset_1])
+
+    def test_kinematics(self):
+        """Test the global positions and velocities of a double pendulum."""
+        s = np.array([[0.0, np.pi/2], [np.pi/2, 0.0]])
+        v = np.array([[1.0, 0.0], [0.0, 1.0]])
+        position, velocity = self.model.kinematics(s, v)
+
+        self.assertEqual(position.shape, (2, 2, 2))
+        np.testing.assert_allclose(position[0], [[0, 1], [-1, 0]], atol=1e-15)
+        np.testing.assert_allclose(position[1], [[2, 1], [-1, -2]], atol=1e-15)
+        np.testing.assert_allclose(velocity[0], [[1, 0], [0, 0]], atol=1e-15)
+        np.testing.assert_allclose(velocity[1], [[1, 2], [0, 0]], atol=1e-15)
+
+    def test_kinematics_compiled_once(self):
+        """Test the kinematics are only lambdified again for changed motions,
+        a changed length is a parameter of the compiled function."""
+        self.model.kinematics([0.0, 0.0], [0.0, 0.0])
+        compiled = self.model._kinematics
+        self.model.kinematics([1.0, 0.0], [0.0, 0.0])
+        self.assertIs(self.model._kinematics, compiled)
+
+        self.body.length = 2
+        position, _ = self.model.kinematics([0.0, 0.0], [0.0, 0.0])
+        self.assertIs(self.model._kinematics, compiled)
+        np.testing.assert_allclose(position[:, 1], [-2, -4])
+
+        self.asset_1.connection = None
+        position, _ = self.model.kinematics([0.0, 0.0], [0.0, 0.0])
+        self.assertIsNot(self.model._kinematics, compiled)
+        np.testing.assert_allclose(position[:, 1], [-2, -2])
+
+
+class TestModelSimplification(TestCase):
+    """Unit test for the simplification policies of class Model."""
+
+    def setUp(self):
+        body = Body(mass=1, drag_coeff=0.3, length=1)
+        self.asset = Asset('mass', 'theta', body, Solution(), rotation)
+        self.asset_1 = Asset('mass1', 'theta1', body, Solution(), rotation, self.asset)
+        rng = np.random.default_rng(0)
+        self.s, self.v = rng.normal(size=(2, 2, 50))
+
+    def test_policies(self):
+        """Test the accelerations are the same for every policy."""
+        expected = _evaluate(Model(self.asset).compile(), self.s[:1], self.v[:1])
+        for policy in ['none', 'targeted', 'cse']:
+            model = Model(self.asset, simplification=policy)
+            accel = _evaluate(model.compile(), self.s[:1], self.v[:1])
+            np.testing.assert_allclose(accel, expected, rtol=1e-12)
+
+    def test_policies_double_pendulum(self):
+        """Test the unsimplified accelerations of the double pendulum."""
+        accel = [_evaluate(Model([self.asset, self.asset_1], simplification=policy)
+                           .compile(), self.s, self.v) for policy in ['none', 'cse']]
+        np.testing.assert_allclose(accel[0], accel[1], rtol=1e-10)
+
+    def test_timings(self):
+        """Test the timings of the derivation stages."""
+        model = Model(self.asset, simplification='none')
+        model.compile()
+
+        self.assertEqual(set(model.timings),
+                         {'kinetic', 'potential', 'lagrangian', 'dissipation',
+                          'equations', 'acceleration_matrix', 'lambdify'})
+        self.assertTrue(all(value >= 0 for value in model.timings.values()))
+
+    def test_parallel(self):
+        """Test a derivation over a pool of processes matches the serial one."""
+        assets = [self.asset, self.asset_1]
+        models = [Model(assets, simplification='none', n_workers=n_workers)
+                  for n_workers in (1, 2, 2)]
+        derivations = []
+        clear_derivations()
+        self.addCleanup(model_module.shutdown_pool)
+        with patch('dynamics.model.ProcessPoolExecutor',
+                   wraps=ProcessPoolExecutor) as executor:
+            for model in models:
+                # The terms of the previous derivation are not reused, the
+                # pool is kept.
+                model_module._terms.clear()
+                derivations.append(model._acceleration_matrix(model.parameters))
+        serial, parallel, again = derivations
+
+        self.assertEqual(serial[0], parallel[0])
+        self.assertEqual(serial[1], parallel[1])
+        self.assertEqual(parallel, again)
+        self.assertIsNone(models[1]._pool)
+        # The pool is shared by the derivations, and shut down with them.
+        self.assertEqual(executor.call_count, 1)
+        clear_derivations()
+        self.assertIsNone(model_module._pool)
+
+    def test_broken_pool(self):
+        """Test the tasks are run again on a new pool when a worker died."""
+        model = Model(self.asset, n_workers=2)
+        self.addCleanup(model_module.shutdown_pool)
+        model._pool = Mock(**{'map.side_effect': BrokenProcessPool})
+
+        self.assertEqual(model._map(abs, iter([-1, 2])), [1, 2])
+        self.assertIs(model._pool, model_module._pool[1])
+
+    def test_unknown_policy(self):
+        """Test an unknown simplification policy."""
+        with self.assertRaises(ValueError):
+            Model(self.asset, simplification='fast')
+
+
+def swing(length, var_name):
+    """Motion of a pendulum, defined here so that its derivation is not shared
+    with the other tests."""
+    return rotation(length, var_name)
+
+def swing_sideways(length, var_name):
+    """Motion of a pendulum with its angle measured from the horizontal."""
+    x, y = rotation(length, var_name)
+    return -y, x
+
+class TestModelIncremental(TestCase):
+    """Unit test for the incremental derivation of class Model."""
+
+    def setUp(self):
+        # Every test starts from an empty store of terms.
+        clear_derivations()
+        self.addCleanup(clear_derivations)
+        body = Body(mass=1, drag_coeff=0.3, length=1)
+        self.assets = [Asset('mass', 'theta', body, Solution(), swing)]
+        self.assets.append(Asset('mass1', 'phi', body, Solution(), swing, self.assets[0]))
+        self.assets.append(Asset('mass2', 'psi', body, Solution(), swing))
+
+    def derive(self, assets):
+        """Derive the model of the assets, counting the energies and equations
+        which are derived."""
+        model = Model(assets, simplification='none')
+        with patch.object(Model, 'lagrangian', autospec=True,
+                          side_effect=Model.lagrangian) as lagrangian, \
+                patch('dynamics.model._euler_lagrange',
+                      wraps=model_module._euler_lagrange) as equation:
+            matrix, _ = model._acceleration_matrix(model.parameters)
+        return matrix, lagrangian.call_count, equation.call_count
+
+    def test_add_remove(self):
+        """Test only the terms of a new asset are derived."""
+        self.assertEqual(self.derive(self.assets[:1])[1:], (1, 1))
+        # The second asset involves both coordinates, the third only its own.
+        self.assertEqual(self.derive(self.assets[:2])[1:], (1, 2))
+        self.assertEqual(self.derive(self.assets)[1:], (1, 1))
+        self.assertEqual(self.derive(self.assets[:2])[1:], (0, 0))
+
+    def test_modify(self):
+        """Test modifying an asset derives the terms it is involved in."""
+        matrix, _, _ = self.derive(self.assets)
+        self.assets[1].motion_func = swing_sideways
+        self.assertEqual(self.derive(self.assets)[1:], (1, 2))
+        self.assets[1].motion_func = swing
+        self.assets[2].motion_func = swing_sideways
+        self.assertEqual(self.derive(self.assets)[1:], (1, 1))
+        # An equivalent motion gives the same terms, which are not derived again.
+        self.assets[2].motion_func = rotation
+        self.assertEqual(self.derive(self.assets)[1:], (1, 0))
+        self.assets[2].motion_func = swing
+        self.assertEqual(self.derive(self.assets), (matrix, 0, 0))
+
+    def test_bounded(self):
+        """Test the store of terms evicts the least recently used terms."""
+        matrix, _, _ = self.derive(self.assets)
+        clear_derivations()
+        with patch.object(model_module._terms, 'maxsize', 2):
+            self.assertEqual(self.derive(self.assets)[0], matrix)
+            self.assertEqual(len(model_module._terms), 2)
+
+    def test_accelerations(self):
+        """Test the incremental derivation matches the whole derivation."""
+        self.derive(self.assets[:1])
+        incremental = self.derive(self.assets[:2])[0]
+
+        whole = Model(self.assets[:2], simplification='none')
+        whole._symbolic = {(asset.var_name, name) for asset in self.assets[:2]
+                           for name in Model.properties} | {(None, 'gravity')}
+        L, D = whole.lagrangian(), whole._dissipation()
+        var_names = ['theta', 'phi']
+        equations = [model_module._euler_lagrange(
+            [model_module._euler_lagrange_term(L, D, var_name)], var_names, 'none')
+            for var_name in var_names]
+        dis, vel, acc = whole._state_symbols()
+        expected, _ = whole._solve_acceleration(equations, acc)
+
+        p = [whole.parameter_symbol(asset, name) for asset, name in whole.parameters]
+        rng = np.random.default_rng(0)
+        s, v, values = rng.normal(size=2), rng.normal(size=2), rng.uniform(0.5, 2, len(p))
+        np.testing.assert_allclose(
+            np.array(sp.lambdify([dis, vel, p], list(incremental))(s, v, values), dtype=float),
+            np.array(sp.lambdify([dis, vel, p], list(expected))(s, v, values), dtype=float))
+
+class TestModelSensitivity(TestCase):
+    """Unit test for the forward sensitivity of class Model."""
+
+    def solve_pendulum(self, sensitivity=False, **properties):
+        body = Body(**dict(dict(mass=1, drag_coeff=0.4, length=1), **properties))
+        asset = Asset('mass', 'theta', body, Solution(disp_0=1.0), rotation)
+        model = Model(asset)
+        model.initialise(time_step=1e-2, n_iter=300)
+        model.solve(RK4, sensitivity=[(asset, 'drag_coeff'), (asset, 'length')]
+                    if sensitivity else None)
+        return model
+
+    def test_sensitivity(self):
+        """Test the sensitivities against central finite differences."""
+        model = self.solve_pendulum(sensitivity=True)
+        results = model.get_sensitivity()
+        self.assertEqual(len(results), 2 * 301)
+
+        h = 1e-5
+        for name, value in [('drag_coeff', 0.4), ('length', 1.0)]:
+            upper = self.solve_pendulum(**{name: value + h}).get_results()
+            lower = self.solve_pendulum(**{name: value - h}).get_results()
+            finite_diff = (upper['displacement'].values
+                           - lower['displacement'].values) / (2*h)
+            sensitivity = results[results['parameter'] == name + '_theta']
+            np.testing.assert_allclose(sensitivity['displacement'].values,
+                                       finite_diff, atol=1e-6)
+
+    def test_sensitivity_missing(self):
+        """Test method get_sensitivity without sensitivity parameters."""
+        model = self.solve_pendulum()
+        with self.assertRaises(RuntimeError):
+            model.get_sensitivity()
+
+
 if __name__ == '__main__':
     from utils.test_utils import run_test
     TEST_CLASSES = [TestModel]
@@ -0,0 +1,77 @@
+"""
+Unit test for analysis/periodic.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.periodic import shooting
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Forcing, Solution, rotation
+from dynamics.tools.solver import RK4
+
+class TestShooting(TestCase):
+    """Unit test for the periodic steady states."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0.5, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(), rotation)
+        self.model = Model(self.asset)
+
+    def test_forced(self):
+        """The orbit of the forced damped pendulum is the steady state of a
+        long integration, and the product of the multipliers is the phase
+        space contraction exp(-c/m T) over one period."""
+        time = np.linspace(0.0, 40.0, 40001)
+        forcing = Forcing(time, 2 * np.sin(np.pi * time))
+        orbit = shooting(self.model, 2.0, forcing=forcing)
+
+        self.assertTrue(orbit.success)
+        self.assertLess(orbit.n_iterations, 8)
+        self.assertTrue(orbit.stable)
+        self.assertAlmostEqual(np.prod(orbit.multipliers).real, np.exp(-0.5 * 2.0),
+                               places=5)
+
+        f = self.model.compile(forcing=forcing)
+        s, v, t = np.zeros(1), np.zeros(1), 0.0
+        for _ in range(19 * 200):
+            s, v, _, t = RK4(f, s, v, t, 1e-2)
+        np.testing.assert_allclose(np.concatenate([s, v]),
+                                   np.concatenate([orbit.displacement, orbit.velocity]),
+                                   atol=1e-3)
+
+    def test_equilibrium(self):
+        """Without forcing the orbit of a given period is the equilibrium, with
+        the multipliers of the linearised pendulum."""
+        orbit = shooting(self.model, 1.0, s0=[0.3], v0=[0.0])
+
+        np.testing.assert_allclose(orbit.displacement, 0.0, atol=1e-10)
+        omega = np.sqrt(9.80665 - 0.25**2)
+        np.testing.assert_allclose(np.sort_complex(orbit.multipliers),
+                                   np.exp(-0.25 + np.array([-1j, 1j]) * omega), atol=1e-7)
+
+    def test_autonomous(self):
+        """Test the period of an orbit of the undamped pendulum is solved for."""
+        self.body.drag_coeff = 0
+        orbit = shooting(self.model, 2.14, s0=[1.0], v0=[0.0], autonomous=True, tol=1e-8)
+
+        self.assertTrue(orbit.success)
+        self.assertAlmostEqual(orbit.period, 2.1395, places=4)
+        self.assertAlmostEqual(orbit.displacement[0], 1.0, places=3)
+        self.assertFalse(orbit.stable)
+
+    def test_invalid(self):
+        """Test the options not supported."""
+        with self.assertRaises(ValueError):
+            shooting(self.model, 2.0, autonomous=True, forcing=Forcing([0.0, 1.0], [0.0, 0.0]))
+        with self.assertRaises(ValueError):
+            shooting(self.model, 2.0, s0=[[0.0, 1.0]])
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestShooting]
+
+    run_test(TEST_CLASSES)
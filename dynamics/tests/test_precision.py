@@ -0,0 +1,51 @@
+"""
+Unit test for analysis/precision.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.precision import select_solver, work_precision
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import RK4
+
+class TestWorkPrecision(TestCase):
+    """Unit test for the work-precision harness."""
+
+    @classmethod
+    def setUpClass(cls):
+        body = Body(mass=1, drag_coeff=0.4, length=1)
+        asset = Asset('mass', 'theta', body, Solution(disp_0=3.12), rotation)
+        cls.table = work_precision(Model(asset), time_steps=(1e-2, 5e-3, 2.5e-3),
+                                   time_end=5.0)
+
+    def test_orders(self):
+        """Test the observed order of convergence of the solvers."""
+        orders = {'euler': 1, 'improved_euler': 2, 'RK2': 2, 'RK4': 4}
+        for solver, runs in self.table.groupby('solver'):
+            slope = np.polyfit(np.log(runs['time_step']), np.log(runs['error']), 1)[0]
+            self.assertAlmostEqual(slope, orders[solver], delta=0.25)
+
+    def test_rhs_evaluations(self):
+        """Test the number of evaluations of the accelerations per step."""
+        stages = {'euler': 1, 'improved_euler': 2, 'RK2': 2, 'RK4': 4}
+        for _, run in self.table.iterrows():
+            self.assertEqual(run['rhs_evaluations'],
+                             stages[run['solver']] * run['n_steps'])
+        self.assertTrue(np.all(self.table['wall_time'] > 0))
+
+    def test_select_solver(self):
+        """Test selecting the cheapest solver within a tolerance."""
+        run = select_solver(self.table, 1e-6)
+        self.assertEqual(run['solver'], RK4.__name__)
+        self.assertEqual(run['time_step'], 1e-2)
+        self.assertIsNone(select_solver(self.table, 1e-16))
+
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+    TEST_CLASSES = [TestWorkPrecision]
+    run_test(TEST_CLASSES)
@@ -0,0 +1,140 @@
+"""
+Unit test for realtime.py.
+"""
+
+import socket
+from queue import Queue
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.asset import Asset
+from dynamics.core import Simulation
+from dynamics.model import Model
+from dynamics.realtime import QueuePublisher, SocketPublisher, State, run_realtime
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import RK4
+
+class FakeClock:
+    """A clock advanced by the sleeps and the slow publishers only, so the
+    computation takes no time."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestRealTime(TestCase):
+    """Unit test for the real-time stepping."""
+
+    def setUp(self):
+        asset = Asset('mass', 'theta', Body(1, 0.2, 1), Solution(disp_0=1.0), rotation)
+        self.model = Model(asset)
+        self.model.initialise(time_step=1e-2, n_iter=30)
+        self.model.compile()
+        self.clock = FakeClock()
+
+    def run_realtime(self, publish, **kwargs):
+        return run_realtime(self.model, RK4, publish, clock=self.clock,
+                            sleep=self.clock.sleep, **kwargs)
+
+    def test_paced(self):
+        """Test the states are published in step with the clock."""
+        queue = Queue()
+        stats = self.run_realtime(queue)
+
+        states = [queue.get_nowait() for _ in range(queue.qsize())]
+        self.assertEqual(stats.n_steps, 30)
+        self.assertEqual([state.step for state in states], list(range(31)))
+        self.assertAlmostEqual(states[-1].time, 0.3)
+        self.assertAlmostEqual(self.clock.now, 0.3)
+        self.assertLess(stats.latency_percentile(100), 1e-9)
+        self.assertEqual((stats.n_missed, stats.max_substeps), (0, 1))
+
+    def test_catch_up(self):
+        """Test a lagging run catches up with sub-steps."""
+        published = []
+        def slow(state):
+            published.append(state)
+            if state.step == 5:
+                self.clock.sleep(0.045)
+
+        stats = self.run_realtime(slow, speed=1.0, max_substeps=10)
+
+        # Step 5 is published late, the steps 6 to 9 are due by then and
+        # only the last of them is published.
+        self.assertEqual(stats.n_steps, 30)
+        self.assertEqual(stats.max_substeps, 4)
+        self.assertEqual(stats.n_missed, 4)
+        self.assertEqual(stats.slip, 0.0)
+        self.assertAlmostEqual(stats.latency.max(), 0.045)
+        self.assertEqual(published[-1].step, 30)
+
+    def test_slip(self):
+        """Test the lag beyond the allowed sub-steps is given up."""
+        def slow(state):
+            if state.step == 5:
+                self.clock.sleep(0.1)
+
+        stats = self.run_realtime(slow, max_substeps=2)
+
+        # Ten steps are due when step 5 is published, eight are given up.
+        self.assertEqual(stats.n_steps, 30)
+        self.assertAlmostEqual(stats.slip, 0.08)
+        self.assertEqual(stats.max_substeps, 2)
+        self.assertAlmostEqual(self.clock.now, 0.38)
+
+    def test_queue_publisher(self):
+        """Test a full queue drops its oldest state."""
+        queue = Queue(maxsize=2)
+        publish = QueuePublisher(queue)
+        states = [State(i, 0.0, np.zeros(1), np.zeros(1), 0.0) for i in range(3)]
+
+        self.assertTrue(publish(states[0]))
+        self.assertTrue(publish(states[1]))
+        self.assertFalse(publish(states[2]))
+        self.assertEqual([queue.get().step for _ in range(2)], [1, 2])
+
+    def test_socket_publisher(self):
+        """Test publishing the states to a local socket."""
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(1.0)
+        publish = SocketPublisher(receiver.getsockname())
+        try:
+            publish(State(3, 0.03, np.array([1.0]), np.array([-2.0]), 10.0))
+            state = SocketPublisher.unpack(receiver.recv(1024))
+        finally:
+            publish.close()
+            receiver.close()
+
+        self.assertEqual(state.step, 3)
+        self.assertEqual(state.time, 0.03)
+        np.testing.assert_array_equal(state.displacement, [1.0])
+        np.testing.assert_array_equal(state.velocity, [-2.0])
+
+    def test_simulation(self):
+        """Test the real-time mode of a simulation."""
+        simulation = Simulation()
+        simulation.register('model', self.model)
+        simulation.register('solver', RK4)
+        simulation.set_paramters(time_step=1e-2, time_end=0.1)
+        queue = Queue()
+        stats = simulation.run_realtime(queue, speed=2.0)
+
+        # Under load the steps catching up publish only their latest state.
+        self.assertEqual(stats.n_steps, 10)
+        self.assertEqual(queue.qsize(), stats.n_published)
+        self.assertEqual([queue.get() for _ in range(stats.n_published)][-1].step, 10)
+        self.assertIsNone(simulation.results)
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestRealTime]
+
+    run_test(TEST_CLASSES)
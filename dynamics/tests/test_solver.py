@@ -0,0 +1,190 @@
+"""
+Unit test for tools/solver.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.precision import work_precision
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import (AdamsBashforth, AdamsBashforthMoulton,
+                                   EulerMaruyama, MultiRate, RK4, StochasticHeun,
+                                   TimeDependent, euler, improved_euler, reset)
+
+class TestMultistep(TestCase):
+    """Unit test for the Adams-Bashforth(-Moulton) solvers."""
+
+    def setUp(self):
+        body = Body(mass=1, drag_coeff=0.4, length=1)
+        self.asset = Asset('mass', 'theta', body, Solution(disp_0=3.12), rotation)
+        self.model = Model(self.asset)
+
+    def test_orders(self):
+        """Test the observed order of convergence and the evaluations of the
+        accelerations per step after the RK4 start."""
+        solvers = [AdamsBashforth(2), AdamsBashforth(4), AdamsBashforthMoulton(4)]
+        table = work_precision(self.model, solvers, time_steps=(1e-2, 5e-3, 2.5e-3),
+                               time_end=5.0)
+
+        for name, order, evaluations in [('AB2', 2, 1), ('AB4', 4, 1), ('ABM4', 4, 2)]:
+            runs = table[table['solver'] == name]
+            slope = np.polyfit(np.log(runs['time_step']), np.log(runs['error']), 1)[0]
+            self.assertAlmostEqual(slope, order, delta=0.3)
+
+            order_start = int(name[-1]) - 1
+            expected = 4 * order_start + evaluations * (runs['n_steps'] - order_start)
+            np.testing.assert_array_equal(runs['rhs_evaluations'], expected)
+
+    def test_history(self):
+        """Test the history is cleared by reset and a change of time step."""
+        solver = AdamsBashforth(3)
+        f = [lambda s, v: -s[0]]
+        s, v = np.array([1.0]), np.array([0.0])
+        for _ in range(3):
+            s, v, _, _ = solver(f, s, v, 0.0, 1e-2)
+        self.assertEqual(len(solver._acceleration), 3)
+
+        solver(f, s, v, 0.0, 2e-2)
+        self.assertEqual(len(solver._acceleration), 1)
+        solver.reset()
+        self.assertEqual(len(solver._acceleration), 0)
+
+        with self.assertRaises(ValueError):
+            AdamsBashforth(5)
+
+    def test_model_solve(self):
+        """Test solving the model with a multistep solver."""
+        self.model.initialise(time_step=1e-2, n_iter=200)
+        self.model.solve(AdamsBashforthMoulton(4))
+        multistep = np.array(self.asset.solution.displacement)
+
+        self.asset.solution.clear()
+        self.model.solve(RK4)
+        np.testing.assert_allclose(multistep, self.asset.solution.displacement,
+                                   atol=1e-5)
+
+
+class TestMultiRate(TestCase):
+    """Unit test for the multi-rate solver."""
+
+    def setUp(self):
+        # A short light link at the end of a long heavy pendulum.
+        self.slow = Asset('mass', 'theta', Body(mass=10, drag_coeff=0, length=10),
+                          Solution(disp_0=0.5), rotation)
+        self.fast = Asset('tip', 'phi', Body(mass=0.1, drag_coeff=0, length=0.05),
+                          Solution(disp_0=0.2), rotation, connection=self.slow)
+        self.model = Model([self.slow, self.fast], simplification='cse')
+        self.counts = [0, 0]
+
+    def integrate(self, solver, dt, time_end=5.0):
+        def counted(i, fun):
+            def accel(s, v):
+                self.counts[i] += 1
+                return fun(s, v)
+            return accel
+        f = [counted(i, fun) for i, fun in enumerate(self.model.compile())]
+        s, v, t = np.array([0.5, 0.2]), np.zeros(2), 0.0
+        self.counts = [0, 0]
+        for _ in range(int(round(time_end / dt))):
+            s, v, _, t = solver(f, s, v, t, dt)
+        return np.concatenate([s, v])
+
+    def test_single_rate(self):
+        """Test a single group is a step of its method."""
+        f = [lambda s, v: -s[0] - 0.1*v[1], lambda s, v: -4*s[1]]
+        forced = TimeDependent([lambda s, v, t: -s[0] + np.sin(t), lambda s, v, t: -s[1]])
+        s, v = np.array([1.0, 0.5]), np.array([0.0, 0.1])
+        for fun in (f, forced):
+            np.testing.assert_array_equal(MultiRate([1, 1])(fun, s, v, 0.2, 1e-2)[:2],
+                                          RK4(fun, s, v, 0.2, 1e-2)[:2])
+
+    def test_accuracy(self):
+        """The sub-cycled link is as accurate as single rate steps of the link,
+        with less evaluations of the accelerations."""
+        reference = self.integrate(RK4, 1e-4)
+        single = self.integrate(RK4, 5e-3)
+        single_counts = list(self.counts)
+        multi = self.integrate(MultiRate([1, 10]), 5e-2)
+
+        np.testing.assert_allclose(single, reference, atol=1e-4)
+        np.testing.assert_allclose(multi, reference, atol=1e-4)
+        # Per step: the start, 2 passes of the pendulum and 10 sub-steps of
+        # the link, 4 stages each, the first stage of a pass taken from the
+        # start.
+        self.assertEqual(self.counts, [100 * (1 + 2*4 - 2), 100 * (1 + 10*4 - 1)])
+        self.assertLess(sum(self.counts), sum(single_counts))
+        self.assertGreater(np.abs(self.integrate(RK4, 5e-2) - reference).max(), 1e-3)
+
+    def test_model_solve(self):
+        """Test solving the model with the multi-rate solver."""
+        self.model.initialise(time_step=5e-2, n_iter=20)
+        self.model.solve(MultiRate([1, 10]))
+        multi = np.array(self.fast.solution.displacement)
+        for asset in self.model.asset:
+            asset.solution.clear()
+        self.model.initialise(time_step=5e-3, n_iter=200)
+        self.model.solve(RK4)
+        np.testing.assert_allclose(multi, self.fast.solution.displacement[::10],
+                                   atol=1e-5)
+
+        with self.assertRaises(ValueError):
+            self.model.solve(MultiRate([1, 10, 1]))
+        with self.assertRaises(ValueError):
+            MultiRate([1, 0])
+        with self.assertRaises(ValueError):
+            MultiRate([1, 10], method=AdamsBashforth(2))
+
+
+class TestStochastic(TestCase):
+    """Unit test for the stochastic solvers."""
+
+    def setUp(self):
+        body = Body(mass=1, drag_coeff=0.4, length=1)
+        self.model = Model(Asset('mass', 'theta', body, Solution(disp_0=1.0), rotation))
+        self.f = self.model.compile()
+
+    def integrate(self, solver, s, v, n_iter=50):
+        reset(solver)
+        for _ in range(n_iter):
+            s, v, _, _ = solver(self.f, s, v, 0.0, 1e-2)
+        return s, v
+
+    def test_deterministic(self):
+        """Test the solvers without noise are the Euler methods."""
+        s0, v0 = np.array([[1.0, 2.0]]), np.array([[0.0, -1.0]])
+        for stochastic, method in ((EulerMaruyama(0.0), euler),
+                                   (StochasticHeun(0.0), improved_euler)):
+            for result, expected in zip(self.integrate(stochastic, s0, v0),
+                                        self.integrate(method, s0, v0)):
+                np.testing.assert_allclose(result, expected, rtol=1e-14)
+
+    def test_seed(self):
+        """Test the sample paths are reproducible after a reset and independent
+        within a batch."""
+        s0, v0 = np.ones((1, 10)), np.zeros((1, 10))
+        solver = StochasticHeun(0.5, seed=1)
+        s, v = self.integrate(solver, s0, v0)
+        s_again, v_again = self.integrate(solver, s0, v0)
+
+        np.testing.assert_array_equal(s, s_again)
+        np.testing.assert_array_equal(v, v_again)
+        self.assertFalse(np.array_equal(v, self.integrate(StochasticHeun(0.5, 2),
+                                                          s0, v0)[1]))
+        self.assertEqual(solver.__name__, 'StochasticHeun[0.5]-1')
+
+    def test_free(self):
+        """Test the velocity variance of free coordinates grows as
+        `sigma**2 t`, with a noise intensity per coordinate."""
+        self.f = [lambda s, v: 0.0, lambda s, v: 0.0]
+        for solver in (EulerMaruyama([0.5, 0.0], 0), StochasticHeun([0.5, 0.0], 0)):
+            s, v = self.integrate(solver, np.zeros((2, 2000)), np.zeros((2, 2000)))
+
+            self.assertEqual(v.shape, (2, 2000))
+            self.assertAlmostEqual(v[0].var() / (0.25 * 0.5), 1.0, delta=0.1)
+            np.testing.assert_array_equal(v[1], 0.0)
+
+        with self.assertRaises(ValueError):
+            EulerMaruyama(np.ones((2, 2)))
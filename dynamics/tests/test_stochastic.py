@@ -0,0 +1,107 @@
+"""
+Unit test for analysis/stochastic.py.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.stochastic import _Moments, ensemble_moments
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import EulerMaruyama, StochasticHeun
+
+class TestStochastic(TestCase):
+    """Unit test for the statistics of the response to noise."""
+
+    def setUp(self):
+        self.asset = Asset('mass', 'theta', Body(1, 0, 1), Solution(), rotation)
+        self.model = Model(self.asset)
+        self.model.gravity = 0.0
+
+    def test_moments(self):
+        """Test the streaming statistics of batches are those of all the
+        samples."""
+        samples = np.random.default_rng(0).normal(3.0, 2.0, (4, 2, 1, 100))
+        moments = _Moments((4, 2, 1))
+        for batch in np.split(samples, [7, 40, 41], axis=-1):
+            for index in range(4):
+                moments.update(index, batch[index])
+
+        np.testing.assert_array_equal(moments.count, 100)
+        np.testing.assert_allclose(moments.mean, samples.mean(axis=-1))
+        np.testing.assert_allclose(moments.variance, samples.var(axis=-1, ddof=1))
+        self.assertTrue(np.all(np.isnan(_Moments((1, 2)).variance)))
+
+    def test_free(self):
+        """Test the variances of a free coordinate driven by white noise,
+        `sigma**2 t` for the velocity and `sigma**2 t**3 / 3` for the
+        displacement."""
+        for solver in (EulerMaruyama, StochasticHeun):
+            table = ensemble_moments(self.model, 0.5, n_paths=4000, solver=solver,
+                                     n_iter=200, stride=20, batch_size=1500)
+
+            time = table.index.values
+            self.assertEqual(list(table.columns), ['theta_mean', 'theta_var',
+                                                   'thetadot_mean', 'thetadot_var'])
+            np.testing.assert_allclose(time, np.linspace(0, 2, 11))
+            np.testing.assert_allclose(table['thetadot_var'].values[1:], 0.25 * time[1:],
+                                       rtol=0.1)
+            np.testing.assert_allclose(table['theta_var'].values[1:], 0.25 * time[1:]**3 / 3,
+                                       rtol=0.1)
+            np.testing.assert_allclose(table['thetadot_mean'], 0.0, atol=0.05)
+            self.assertEqual(table['theta_var'].iloc[0], 0.0)
+
+    def test_seed(self):
+        """Test the statistics are reproducible and a damped pendulum reaches a
+        stationary variance."""
+        self.model.gravity = 9.80665
+        self.asset.component.drag_coeff = 0.5
+        table = ensemble_moments(self.model, 0.5, n_paths=200, n_iter=1000,
+                                 stride=100, seed=3)
+
+        again = ensemble_moments(self.model, 0.5, n_paths=200, n_iter=1000,
+                                 stride=100, seed=3)
+        np.testing.assert_array_equal(table.values, again.values)
+        # Bounded by the potential well, unlike a free coordinate.
+        self.assertLess(table['theta_var'].iloc[-1], 0.1)
+
+        with self.assertRaises(ValueError):
+            ensemble_moments(self.model, [0.5, 0.5])
+        with self.assertRaises(ValueError):
+            ensemble_moments(self.model, 0.5, s0=[[0.0, 1.0]])
+
+    def test_initial(self):
+        """Test the ensemble of initial states of every path, given or sampled,
+        drifting freely without noise."""
+        v0 = np.linspace(-1, 1, 50).reshape(1, -1)
+        table = ensemble_moments(self.model, 0.0, n_paths=50, n_iter=100, stride=50,
+                                 batch_size=7, s0=[0.5], v0=v0)
+
+        time = table.index.values
+        np.testing.assert_allclose(table['theta_mean'], 0.5)
+        np.testing.assert_allclose(table['thetadot_var'], v0.var(ddof=1))
+        np.testing.assert_allclose(table['theta_var'], v0.var(ddof=1) * time**2)
+
+        def initial(rng, size):
+            return np.zeros((1, size)), rng.normal(0.0, 1.0, (1, size))
+        table = ensemble_moments(self.model, 0.0, n_paths=2000, n_iter=10,
+                                 batch_size=300, initial=initial)
+        again = ensemble_moments(self.model, 0.0, n_paths=2000, n_iter=10,
+                                 batch_size=300, initial=initial)
+        np.testing.assert_array_equal(table.values, again.values)
+        np.testing.assert_allclose(table['thetadot_var'], 1.0, rtol=0.1)
+        self.assertEqual(table['theta_var'].iloc[0], 0.0)
+
+        with self.assertRaises(ValueError):
+            ensemble_moments(self.model, 0.5, n_paths=5, v0=[[0.0, 1.0, 2.0]])
+        with self.assertRaises(ValueError):
+            ensemble_moments(self.model, 0.5, s0=[0.0], initial=initial)
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestStochastic]
+
+    run_test(TEST_CLASSES)
@@ -0,0 +1,106 @@
+"""
+Unit test for analysis/surrogate.py.
+"""
+
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from dynamics.analysis.surrogate import Surrogate, build_surrogate
+from dynamics.asset import Asset
+from dynamics.model import Model
+from dynamics.tools import Body, Solution, rotation
+from dynamics.tools.solver import RK4
+
+class TestSurrogate(TestCase):
+    """Unit test for the interpolation tables of trajectories."""
+
+    def setUp(self):
+        self.body = Body(mass=1, drag_coeff=0.2, length=1)
+        self.asset = Asset('mass', 'theta', self.body, Solution(), rotation)
+        self.model = Model(self.asset)
+        self.axes = {'theta_0': np.linspace(0.0, 1.5, 16),
+                     'drag_coeff_theta': np.linspace(0.0, 1.0, 11)}
+        self.surrogate = build_surrogate(self.model, self.axes, 5.0, stride=5)
+
+    def test_nodes(self):
+        """Test the table at the points of the grid and the sampling times is
+        the integration of the model."""
+        self.assertEqual(self.surrogate.table.shape, (16, 11, 101, 2, 1))
+        self.body.drag_coeff = 0.3
+        self.asset.solution = Solution(disp_0=0.7)
+        self.model.initialise(time_step=1e-2, n_iter=500)
+        self.model.solve(RK4)
+
+        s, v = self.surrogate(self.surrogate.time, theta_0=0.7, drag_coeff_theta=0.3)
+        np.testing.assert_allclose(s[:, 0], self.asset.solution.displacement[::5],
+                                   atol=1e-12)
+        np.testing.assert_allclose(v[:, 0], self.asset.solution.velocity[::5],
+                                   atol=1e-12)
+
+    def test_error(self):
+        """Test the validation error decreases on a finer grid."""
+        error = self.surrogate.error
+        self.assertEqual(list(error.index), ['theta', 'thetadot'])
+        self.assertTrue(np.all(error['rms'] <= error['max']))
+        self.assertLess(error.loc['theta', 'max'], 0.05)
+
+        fine = build_surrogate(self.model, {name: np.linspace(axis[0], axis[-1], 2*len(axis) - 1)
+                                            for name, axis in self.axes.items()},
+                               5.0, stride=5)
+        self.assertLess(fine.error.loc['theta', 'max'], error.loc['theta', 'max'] / 2)
+
+    def test_save(self):
+        """Test a saved table is memory-mapped when loaded."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pendulum')
+            self.surrogate.save(path)
+            loaded = Surrogate.load(path)
+
+            self.assertIsInstance(loaded.table, np.memmap)
+            point = {'theta_0': [0.25, 1.1], 'drag_coeff_theta': 0.45}
+            for expected, actual in zip(self.surrogate([1.234, 4.2], **point),
+                                        loaded([1.234, 4.2], **point)):
+                np.testing.assert_array_equal(expected, actual)
+            np.testing.assert_array_equal(loaded.error, self.surrogate.error)
+            del loaded
+
+    def test_stride(self):
+        """Test the table covers the end time with a whole number of strides."""
+        surrogate = build_surrogate(self.model, self.axes, 1.0, stride=3, n_validation=0)
+
+        np.testing.assert_allclose(surrogate.time[-2:], [0.99, 1.02])
+        s, _ = surrogate(1.0, theta_0=0.5, drag_coeff_theta=0.1)
+        self.assertEqual(s.shape, (1,))
+
+        # The end time is the last sampling time, up to rounding.
+        surrogate = build_surrogate(self.model, {'theta_0': np.linspace(0, 1, 3)}, 0.33,
+                                    stride=3)
+        self.assertEqual(len(surrogate.time), 12)
+        s, _ = surrogate(0.33, theta_0=0.5)
+        s_end, _ = surrogate(surrogate.time[-1], theta_0=0.5)
+        np.testing.assert_array_equal(s, s_end)
+        with self.assertRaises(ValueError):
+            surrogate(0.331, theta_0=0.5)
+
+    def test_invalid(self):
+        """Test the queries outside of the table and unknown axes."""
+        with self.assertRaises(ValueError):
+            self.surrogate(1.0, theta_0=2.0, drag_coeff_theta=0.1)
+        with self.assertRaises(ValueError):
+            self.surrogate(6.0, theta_0=1.0, drag_coeff_theta=0.1)
+        with self.assertRaises(ValueError):
+            self.surrogate(1.0, theta_0=1.0)
+        with self.assertRaises(ValueError):
+            build_surrogate(self.model, {'phi_0': [0.0, 1.0]}, 1.0)
+        with self.assertRaises(ValueError):
+            build_surrogate(self.model, {'theta_0': [1.0]}, 1.0)
+
+if __name__ == '__main__':
+    from utils.test_utils import run_test
+
+    TEST_CLASSES = [TestSurrogate]
+
+    run_test(TEST_CLASSES)
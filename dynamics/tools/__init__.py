@@ -4,5 +4,6 @@ lagrange's equation for the dynamic system."""
 
 from .component import *
 from .energy import *
+from .forcing import *
 from .motion import *
 from .solution import *
\ No newline at end of file
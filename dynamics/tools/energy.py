@@ -86,3 +86,7 @@ def dissipated(coeff, velo=None):
 ###############################
 # Generalised External Energy #
 ###############################
+
+# Generalised forces are not derived from an energy: they are tabulated in
+# time, see `dynamics.tools.forcing.Forcing`, and added to the compiled
+# accelerations of the model.
@@ -0,0 +1,126 @@
+"""The module `dynamics.tools.forcing` provides tabulated generalised forces,
+e.g. recorded excitation signals, and tabulated accelerations of the base of
+a model, e.g. recorded ground motions, to drive a model. The tables are
+sampled in time and linearly interpolated when the accelerations are
+evaluated."""
+
+import numpy as np
+
+class Forcing:
+    """A table of generalised forces against time, linearly interpolated.
+
+    Parameters:
+        time (array): Sorted sampling times with shape `(n_samples,)`.
+        force (array): Generalised forces with shape `(n_samples,)` for one
+                       coordinate or `(n_samples, n_coordinates)`.
+        outside (str): The forces outside of the sampling times, 'hold' keeps
+                       the first and last samples and 'zero' removes them.
+
+    The arrays are not copied, so a long recording may be memory-mapped, e.g.
+    with `np.load(..., mmap_mode='r')`. An evaluation does not depend on the
+    number of samples: for uniform sampling times the interval is computed
+    directly, otherwise the interval of the last evaluation is tried before a
+    binary search, which suits the steps of fixed and adaptive solvers alike.
+    The solver stages sharing a time share the evaluation.
+    """
+
+    outsides = ('hold', 'zero')
+
+    def __init__(self, time, force, outside='hold') -> None:
+        if outside not in self.outsides:
+            raise ValueError("Unknown outside '{}', expected one of {}."
+                             .format(outside, self.outsides))
+        time = np.asarray(time)
+        force = np.asarray(force)
+        if time.ndim != 1 or len(time) < 2:
+            raise ValueError("The forcing needs at least two sampling times.")
+        if len(force) != len(time):
+            raise ValueError("The forces and times have different numbers of samples.")
+
+        self.time = time
+        self.force = force if force.ndim == 2 else force[:, None]
+        self.outside = outside
+
+        step = np.diff(time)
+        if np.any(step <= 0):
+            raise ValueError("The sampling times must be strictly increasing.")
+        self._step = (time[-1] - time[0]) / (len(time) - 1)
+        self._uniform = bool(np.allclose(step, self._step, rtol=1e-9, atol=0))
+        self._index = 0
+        self._last = (None, None)
+
+    @property
+    def n_coordinates(self):
+        """Number of coordinates forced by the table."""
+        return self.force.shape[1]
+
+    def __call__(self, t):
+        """The generalised forces at time *t*, with shape `(n_coordinates,)`."""
+        if t == self._last[0]:
+            return self._last[1]
+
+        time, n_samples = self.time, len(self.time)
+        if t < time[0] or t > time[-1]:
+            if self.outside == 'zero':
+                value = np.zeros(self.n_coordinates)
+            else:
+                value = self.force[0 if t < time[0] else -1].astype(float)
+        else:
+            if self._uniform:
+                i = min(int((t - time[0]) / self._step), n_samples - 2)
+            else:
+                i = self._index
+                if not time[i] <= t < time[i+1]:
+                    i = min(int(np.searchsorted(time, t, side='right')) - 1, n_samples - 2)
+            self._index = i
+            theta = (t - time[i]) / (time[i+1] - time[i])
+            value = self.force[i] + theta * (self.force[i+1] - self.force[i])
+
+        self._last = (t, value)
+        return value
+
+
+class BaseExcitation(Forcing):
+    """A table of accelerations of the base of the model against time, i.e. of
+    the global origin the motions of the assets are relative to, linearly
+    interpolated.
+
+    Parameters:
+        time (array): Sorted sampling times with shape `(n_samples,)`.
+        acceleration (array): Accelerations of the base with shape
+                              `(n_samples, 2)` of the global x and y
+                              components, or `(n_samples,)` along *direction*.
+        direction (tuple): Direction of the accelerations with shape `(2,)`,
+                           e.g. `(1, 0)` for a horizontal shaking table,
+                           normalised to a unit vector.
+        outside (str): The accelerations outside of the sampling times, see
+                       `Forcing`.
+
+    In the frame of the base every asset is driven by the inertial force
+    `-mass * acceleration`. The generalised forces are the products of the
+    interpolated accelerations with coefficients depending on the
+    displacements, which are derived once by the model, see `Model.compile`.
+    """
+
+    def __init__(self, time, acceleration, direction=None, outside='hold') -> None:
+        acceleration = np.asarray(acceleration)
+        if direction is None:
+            if acceleration.ndim != 2 or acceleration.shape[1] != 2:
+                raise ValueError("The accelerations of the base must have shape "
+                                 "(n_samples, 2) without a direction.")
+        elif acceleration.ndim != 1:
+            raise ValueError("The accelerations of the base along a direction "
+                             "must have shape (n_samples,).")
+        if direction is not None:
+            direction = np.asarray(direction, dtype=float)
+            norm = np.linalg.norm(direction)
+            if direction.shape != (2,) or norm == 0:
+                raise ValueError("The direction must be a non-zero vector of shape (2,).")
+            direction = direction / norm
+        super().__init__(time, acceleration, outside)
+        self.direction = direction
+
+    def __call__(self, t):
+        """The x and y components of the acceleration of the base at time *t*."""
+        value = super().__call__(t)
+        return value if self.direction is None else value[0] * self.direction
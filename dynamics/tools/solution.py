@@ -1,14 +1,19 @@
 """The module `dynamics.solution` store information and results of the solution."""
+
+import numpy as np
+
 class Solution:
     """A solution class for the storage the results motion of the simulation.
-    Each solution object should only store results motion of one moving body."""
+    Each solution object should only store results motion of one moving body.
+    The attribute `dtype` is the precision the results are stored in."""
 
     def __init__(self, disp_0: float = 0.0, velo_0: float = 0.0, 
-                 time_0: float = 0.0):
+                 time_0: float = 0.0, dtype=np.float64):
         self._displacement = [disp_0]
         self._velocity = [velo_0]
         self._acceleration = [0.0]
         self._time = [time_0]
+        self.dtype = np.dtype(dtype)
 
     def clear(self):
         self.displacement, self.velocity, self.acceleration, self.time = \
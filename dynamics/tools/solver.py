@@ -8,18 +8,78 @@ Parameters
     v0 : Initial condition for velocities.
     t0 : Initial condition for time.
     dt : Time step.
+
+The multistep solvers `AdamsBashforth` and `AdamsBashforthMoulton` are
+objects carrying the history of the previous steps between the calls, the
+function `reset` clears it before a new integration.
+
+The accelerations of a forced model depend on the time as well, they are
+given as a `TimeDependent` list of functions `f(s, v, t)` which the solvers
+evaluate at the time of every stage.
+
+The multi-rate solver `MultiRate` sub-cycles the fast coordinates of a model
+within every step of the slow ones, so the time step is not dictated by the
+fastest coordinate.
+
+The stochastic solvers `EulerMaruyama` and `StochasticHeun` add white noise
+to the accelerations, e.g. of a random base excitation. They carry their
+random number generator, which `reset` seeds again so the sample paths are
+reproducible.
 """
 
 import numpy as np
 
-def _evaluate(f, s, v):
-    """Helper function to evaluate acceleration matrix."""
-    return np.array([fun(s, v) for fun in f], dtype=np.float64)
+class TimeDependent(list):
+    """A list of acceleration functions `f(s, v, t)` of the time as well as the
+    displacements and velocities, e.g. of a forced model."""
+
+
+def _evaluate(f, s, v, t=None):
+    """Helper function to evaluate acceleration matrix, in the precision of
+    the given displacements. For a batch of states with shape `(n, n_batch)`
+    every acceleration is broadcast to the batch shape. The time *t* is only
+    passed to `TimeDependent` functions."""
+    s = np.asarray(s)
+    if isinstance(f, TimeDependent):
+        values = [fun(s, v, t) for fun in f]
+    else:
+        values = [fun(s, v) for fun in f]
+    return np.array([np.broadcast_to(value, s.shape[1:]) for value in values],
+                    dtype=s.dtype)
+
+
+def hermite(s0, v0, s1, v1, dt, theta):
+    """Cubic Hermite interpolation of the displacements between two steps,
+    from the displacements and velocities at both ends.
+
+    Parameters:
+        s0, v0 : Displacements and velocities at the start of the step.
+        s1, v1 : Displacements and velocities at the end of the step.
+        dt : Time step.
+        theta : Fraction of the time step, between 0 and 1.
+
+    Returns:
+        s, v : Interpolated displacements and velocities.
+    """
+    theta2, theta3 = theta**2, theta**3
+    h00 = 2*theta3 - 3*theta2 + 1
+    h10 = theta3 - 2*theta2 + theta
+    h01 = -2*theta3 + 3*theta2
+    h11 = theta3 - theta2
+    s = h00*s0 + h10*dt*v0 + h01*s1 + h11*dt*v1
+
+    dh00 = (6*theta2 - 6*theta) / dt
+    dh10 = 3*theta2 - 4*theta + 1
+    dh01 = (-6*theta2 + 6*theta) / dt
+    dh11 = 3*theta2 - 2*theta
+    v = dh00*s0 + dh10*v0 + dh01*s1 + dh11*v1
+
+    return s, v
 
 
 def euler(f, s0, v0, t0, dt):
     """Numerical integrator using euler's method."""
-    a = _evaluate(f, s0, v0)
+    a = _evaluate(f, s0, v0, t0)
     
     v = v0 + a * dt
     s = s0 + v0 * dt
@@ -30,13 +90,13 @@ def euler(f, s0, v0, t0, dt):
 
 def improved_euler(f, s0, v0, t0, dt):
     """Numerical integrator using improved euler's method."""
-    a = _evaluate(f, s0, v0)
+    a = _evaluate(f, s0, v0, t0)
 
     k1_v = a * dt
     k1_s = v0 * dt
 
-    k2_v = _evaluate(f, s0 + dt*k1_s, v0 + dt*k1_v) * dt
-    k2_s = (v0 + dt*k1_v) * dt
+    k2_v = _evaluate(f, s0 + k1_s, v0 + k1_v, t0 + dt) * dt
+    k2_s = (v0 + k1_v) * dt
 
     s = s0 + (k1_s + k2_s)/2
     v = v0 + (k1_v + k2_v)/2
@@ -47,16 +107,16 @@ def improved_euler(f, s0, v0, t0, dt):
 
 def RK2(f, s0, v0, t0, dt):
     """Numerical integrator using RK2."""
-    a = _evaluate(f, s0, v0)
+    a = _evaluate(f, s0, v0, t0)
 
     k1_v = a * dt
     k1_s = v0 * dt
 
-    k2_v = _evaluate(f, s0 + k1_s/2, v0 + k1_v/2) *dt
+    k2_v = _evaluate(f, s0 + k1_s/2, v0 + k1_v/2, t0 + dt/2) *dt
     k2_s = (v0 + k1_v/2) * dt
 
-    s = s0 + k2_s + dt**3
-    v = v0 + k2_v + dt**3
+    s = s0 + k2_s
+    v = v0 + k2_v
     t = t0 + dt
 
     return s, v, a, t
@@ -64,22 +124,300 @@ def RK2(f, s0, v0, t0, dt):
 
 def RK4(f, s0, v0, t0, dt):
     """Numerical integrator using RK4."""
-    a = _evaluate(f, s0, v0)
+    a = _evaluate(f, s0, v0, t0)
+    s, v = _rk4(f, s0, v0, a, t0, dt)
+    t = t0 + dt
 
+    return s, v, a, t
+
+
+def _rk4(f, s0, v0, a, t0, dt):
+    """Helper function of a RK4 step from the acceleration *a* at the start
+    of the step."""
     k1_v = a * dt
     k1_s = v0 * dt
 
-    k2_v = _evaluate(f, s0 + k1_s/2, v0 + k1_v/2) * dt
+    k2_v = _evaluate(f, s0 + k1_s/2, v0 + k1_v/2, t0 + dt/2) * dt
     k2_s = (v0 + k1_v/2) * dt
 
-    k3_v = _evaluate(f, s0 + k2_s/2, v0 + k2_v/2) * dt
+    k3_v = _evaluate(f, s0 + k2_s/2, v0 + k2_v/2, t0 + dt/2) * dt
     k3_s = (v0 + k2_v/2) * dt
 
-    k4_v = _evaluate(f, s0 + k3_s, v0 + k3_v) * dt
+    k4_v = _evaluate(f, s0 + k3_s, v0 + k3_v, t0 + dt) * dt
     k4_s = (v0 + k3_v) * dt
 
-    s = s0 + ((k1_s + 2*k2_s + 2*k3_s + k4_s)/6) + dt**5
-    v = v0 + (k1_v + 2*k2_v + 2*k3_v + k4_v)/6 + dt**5
-    t = t0 + dt
+    s = s0 + (k1_s + 2*k2_s + 2*k3_s + k4_s)/6
+    v = v0 + (k1_v + 2*k2_v + 2*k3_v + k4_v)/6
 
-    return s, v, a, t
+    return s, v
+
+
+class AdamsBashforth:
+    """Numerical integrator using the explicit Adams-Bashforth method of the
+    given order (1 to 4).
+
+    The velocities and accelerations of the previous steps are stored, so a
+    step evaluates the accelerations once. The first steps, and the steps
+    after a change of time step, are started with RK4. The history is
+    cleared by `reset` before a new integration.
+    """
+
+    predictor = {1: [1],
+                 2: [3/2, -1/2],
+                 3: [23/12, -16/12, 5/12],
+                 4: [55/24, -59/24, 37/24, -9/24]}
+
+    def __init__(self, order=4):
+        if order not in self.predictor:
+            raise ValueError("Order must be one of {}.".format(list(self.predictor)))
+        self.order = order
+        self.__name__ = 'AB{}'.format(order)
+        self.reset()
+
+    def reset(self):
+        """Clear the history of the previous steps."""
+        self._velocity, self._acceleration = [], []
+        self._dt = None
+
+    def __call__(self, f, s0, v0, t0, dt):
+        a = _evaluate(f, s0, v0, t0)
+        if dt != self._dt:
+            self.reset()
+            self._dt = dt
+        # Latest step first, as the coefficients.
+        self._velocity = [v0] + self._velocity[:self.order - 1]
+        self._acceleration = [a] + self._acceleration[:self.order - 1]
+
+        if len(self._velocity) < self.order:
+            s, v = _rk4(f, s0, v0, a, t0, dt)
+        else:
+            s, v = self._step(f, s0, v0, t0, dt)
+        t = t0 + dt
+
+        return s, v, a, t
+
+    def _step(self, f, s0, v0, t0, dt):
+        """Adams-Bashforth step from the history."""
+        return _combine(s0, v0, dt, self.predictor[self.order],
+                        self._velocity, self._acceleration)
+
+
+class AdamsBashforthMoulton(AdamsBashforth):
+    """Numerical integrator using the Adams-Bashforth-Moulton predictor-
+    corrector method of the given order (1 to 4), in PECE mode.
+
+    The Adams-Bashforth predictor is corrected by the implicit Adams-Moulton
+    method of the same order, a step evaluates the accelerations twice. The
+    first steps are started with RK4, see `AdamsBashforth`.
+    """
+
+    corrector = {1: [1],
+                 2: [1/2, 1/2],
+                 3: [5/12, 8/12, -1/12],
+                 4: [9/24, 19/24, -5/24, 1/24]}
+
+    def __init__(self, order=4):
+        super().__init__(order)
+        self.__name__ = 'ABM{}'.format(order)
+
+    def _step(self, f, s0, v0, t0, dt):
+        """Adams-Bashforth predictor and Adams-Moulton corrector step."""
+        s, v = super()._step(f, s0, v0, t0, dt)
+        a = _evaluate(f, s, v, t0 + dt)
+        return _combine(s0, v0, dt, self.corrector[self.order],
+                        [v] + self._velocity, [a] + self._acceleration)
+
+
+def _combine(s0, v0, dt, coefficients, velocity, acceleration):
+    """Helper function of the linear combination of a multistep method."""
+    s, v = s0, v0
+    for coefficient, v_j, a_j in zip(coefficients, velocity, acceleration):
+        s = s + dt * coefficient * v_j
+        v = v + dt * coefficient * a_j
+    return s, v
+
+
+class MultiRate:
+    """Multi-rate numerical integrator, the coordinates are grouped by their
+    number of sub-steps within a step and only the accelerations of a group
+    are evaluated at its sub-steps.
+
+    Parameters:
+        substeps (list): Number of sub-steps of every coordinate, e.g.
+                         `[1, 10]` for a slow first coordinate and a second
+                         coordinate ten times faster.
+        method (method): Single-step integrator of the groups, e.g. `RK4`.
+        passes (int): Number of passes of the slower groups over the step.
+
+    The groups are integrated from the slowest to the fastest. The
+    coordinates of the groups already integrated over the step are given by
+    the cubic Hermite interpolation of their sub-steps, and the coordinates
+    of the groups not yet integrated by the Taylor expansion from the start
+    of the step. Every further pass integrates the slower groups again with
+    the fastest group interpolated from the previous pass, which corrects the
+    extrapolation of the fast coordinates over the slow steps.
+
+    A step evaluates every acceleration once at the start of the step and the
+    accelerations of every group at the stages of its sub-steps, the fastest
+    group in the first pass only. The first stage of the first sub-step of a
+    group reuses the accelerations at the start of the step.
+    """
+
+    def __init__(self, substeps, method=RK4, passes=2):
+        substeps = [int(m) for m in substeps]
+        if not substeps or min(substeps) < 1:
+            raise ValueError("Number of sub-steps must be at least 1.")
+        if passes < 1:
+            raise ValueError("Number of passes must be at least 1.")
+        if hasattr(method, 'reset'):
+            raise ValueError("Multistep methods are not supported.")
+        self.substeps = substeps
+        self.method = method
+        self.passes = passes
+        # Slowest group first.
+        self.levels = sorted(set(substeps))
+        self.groups = [np.array([i for i, m in enumerate(substeps) if m == level])
+                       for level in self.levels]
+        self.__name__ = 'MR{}x{}-{}'.format(substeps, passes, method.__name__)
+
+    def __call__(self, f, s0, v0, t0, dt):
+        s0, v0 = np.asarray(s0), np.asarray(v0)
+        if len(s0) != len(self.substeps):
+            raise ValueError("Number of sub-steps given for {} coordinates, got {}."
+                             .format(len(self.substeps), len(s0)))
+        a = _evaluate(f, s0, v0, t0)
+        s, v = s0.copy(), v0.copy()
+        # Sub-steps of every group as (index, sub-step, [(s, v), ...]).
+        previous = []
+        for n_pass in range(self.passes):
+            done = []
+            for level, index in zip(self.levels, self.groups):
+                if n_pass and level == self.levels[-1]:
+                    done.append(previous[-1])
+                    continue
+                h = dt / level
+                s_g, v_g = s0[index], v0[index]
+                group = self._group(f, s0, v0, a, t0, index,
+                                    previous[len(done):] + done, (s_g, v_g))
+                nodes = [(s_g, v_g)]
+                for k in range(level):
+                    s_g, v_g, _, _ = self.method(group, s_g, v_g, t0 + k*h, h)
+                    nodes.append((s_g, v_g))
+                s[index], v[index] = s_g, v_g
+                done.append((index, h, nodes))
+            previous = done
+        t = t0 + dt
+
+        return s, v, a, t
+
+    def _group(self, f, s0, v0, a, t0, index, done, start):
+        """The accelerations of the coordinates *index* as functions of their
+        own displacements and velocities, with the other coordinates
+        interpolated from the *done* groups or extrapolated from the start.
+        At the *start* displacements and velocities of the group and the time
+        *t0*, the accelerations *a* at the start of the step are returned."""
+        timed = isinstance(f, TimeDependent)
+        state = {}
+
+        def full(s_g, v_g, t):
+            if state.get('key') != (id(s_g), id(v_g), t):
+                tau = t - t0
+                s, v = s0 + v0*tau + a*tau**2/2, v0 + a*tau
+                for index_d, h, nodes in done:
+                    k = min(int(tau / h), len(nodes) - 2)
+                    (s_k, v_k), (s_l, v_l) = nodes[k], nodes[k + 1]
+                    s[index_d], v[index_d] = hermite(s_k, v_k, s_l, v_l, h, tau/h - k)
+                s[index], v[index] = s_g, v_g
+                # The arrays are kept with the key, so their ids are not reused.
+                state.update(key=(id(s_g), id(v_g), t), arrays=(s_g, v_g), s=s, v=v)
+            return state['s'], state['v']
+
+        def bind(i):
+            fun = f[i]
+            def accel(s_g, v_g, t):
+                if s_g is start[0] and v_g is start[1] and t == t0:
+                    return a[i]
+                s, v = full(s_g, v_g, t)
+                return fun(s, v, t) if timed else fun(s, v)
+            return accel
+        return TimeDependent(bind(i) for i in index)
+
+
+class EulerMaruyama:
+    """Numerical integrator of the accelerations with additive white noise,
+    using the Euler-Maruyama method.
+
+    Parameters:
+        sigma (float or array): Intensity of the noise of the accelerations,
+                                or of every coordinate with shape `(n,)`.
+        seed: Seed of the random number generator, see
+              `np.random.default_rng`.
+
+    The velocities are incremented by `sigma * dW` over a step, with the
+    Wiener increments `dW` drawn independently for every coordinate and
+    every sample path of a batch. The generator is seeded again by `reset`.
+    The solver is named after its options, e.g. `EulerMaruyama[0.1]-1`.
+    """
+
+    def __init__(self, sigma, seed=None):
+        self.sigma = np.asarray(sigma, dtype=np.float64)
+        if self.sigma.ndim > 1:
+            raise ValueError("Noise intensity must be a scalar or have shape (n,).")
+        self.seed = seed
+        self.__name__ = '{}[{}]-{}'.format(type(self).__name__,
+                                           self.sigma.tolist(), seed)
+        self.reset()
+
+    def reset(self):
+        """Seed the random number generator again."""
+        self._rng = np.random.default_rng(self.seed)
+
+    def __call__(self, f, s0, v0, t0, dt):
+        a = _evaluate(f, s0, v0, t0)
+        noise = self._noise(a, dt)
+
+        v = v0 + a * dt + noise
+        s = s0 + v0 * dt
+        t = t0 + dt
+
+        return s, v, a, t
+
+    def _noise(self, a, dt):
+        """Noise `sigma * dW` of the velocities over a step, with the shape
+        and precision of the accelerations."""
+        sigma = self.sigma.reshape(self.sigma.shape + (1,) * (a.ndim - self.sigma.ndim))
+        dW = self._rng.standard_normal(a.shape) * np.sqrt(dt)
+        return (sigma * dW).astype(a.dtype, copy=False)
+
+
+class StochasticHeun(EulerMaruyama):
+    """Numerical integrator of the accelerations with additive white noise,
+    using the stochastic Heun method, see `EulerMaruyama`.
+
+    The Euler-Maruyama predictor is corrected by the trapezoidal rule with
+    the same Wiener increments. With additive noise the method has strong
+    order 1, against 1/2 for Euler-Maruyama, and it reduces to
+    `improved_euler` without noise.
+    """
+
+    def __call__(self, f, s0, v0, t0, dt):
+        a = _evaluate(f, s0, v0, t0)
+        noise = self._noise(a, dt)
+
+        v1 = v0 + a * dt + noise
+        s1 = s0 + v0 * dt
+        a1 = _evaluate(f, s1, v1, t0 + dt)
+
+        s = s0 + (v0 + v1) * dt/2
+        v = v0 + (a + a1) * dt/2 + noise
+        t = t0 + dt
+
+        return s, v, a, t
+
+
+def reset(solver):
+    """Reset the history of a multistep solver or the random number generator
+    of a stochastic solver before a new integration, other solvers are
+    stateless."""
+    if hasattr(solver, 'reset'):
+        solver.reset()
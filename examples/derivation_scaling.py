@@ -0,0 +1,46 @@
+"""Benchmark of the derivation time of a chain of pendulums against the number
+of worker processes, see the argument `n_workers` of `Model`."""
+
+import os
+from statistics import median
+from time import perf_counter
+
+from dynamics import model
+from dynamics.asset import Asset
+from dynamics.tools import Body, rotation, solution
+
+N_REPEATS = 3
+
+def chain(n_links):
+    assets = []
+    for i in range(n_links):
+        body = Body(mass=1, drag_coeff=0.1, length=1)
+        sol = solution.Solution(disp_0=1.0, velo_0=0)
+        assets.append(Asset(**{'name': 'mass{}'.format(i), 'var_name': 'theta{}'.format(i),
+                               'component': body, 'motion_func': rotation, 'solution': sol,
+                               'connection': assets[-1] if assets else None}))
+    return assets
+
+def derivation_time(assets, n_workers):
+    """Time of a derivation from scratch, without the start of the pool."""
+    system = model.Model(assets, simplification='targeted', n_workers=n_workers)
+    # The derivation itself, bypassing the shared derivations and terms.
+    model.clear_derivations()
+    if n_workers > 1:
+        # Start every worker of the pool before the timing.
+        list(model._executor(n_workers).map(abs, range(n_workers)))
+    start = perf_counter()
+    system._acceleration_matrix(system.parameters)
+    return perf_counter() - start
+
+if __name__ == '__main__':
+    assets = chain(3)
+    workers = sorted({1, 2, 4, os.cpu_count() or 1})
+    print('{} CPUs, median of {} runs'.format(os.cpu_count(), N_REPEATS))
+    print('{:>9} {:>10} {:>8}'.format('n_workers', 'time (s)', 'speedup'))
+    serial = None
+    for n_workers in workers:
+        elapsed = median(derivation_time(assets, n_workers) for _ in range(N_REPEATS))
+        serial = serial or elapsed
+        print('{:>9} {:>10.2f} {:>8.2f}'.format(n_workers, elapsed, serial / elapsed))
+    model.shutdown_pool()
@@ -0,0 +1,31 @@
+import matplotlib.pyplot as plt
+
+from dynamics import model
+from dynamics.analysis.precision import plot_work_precision, select_solver, work_precision
+from dynamics.asset import Asset
+from dynamics.tools import Body, rotation, solution
+
+# Single Pen
+body = Body(mass=1, drag_coeff=0.4, length=1)
+sol = solution.Solution(disp_0=3.12, velo_0=0)
+asset = Asset(**{'name': 'mass', 'var_name': 'theta', 'component': body, 'motion_func': rotation, 'solution': sol})
+pendulum = model.Model(asset)
+
+# Double Pen
+body_1 = Body(mass=1, drag_coeff=0.3, length=1)
+sol_1 = solution.Solution(disp_0=3.0, velo_0=0)
+asset_1 = Asset(**{'name': 'mass', 'var_name': 'theta', 'component': body_1, 'motion_func': rotation, 'solution': sol_1})
+sol_2 = solution.Solution(disp_0=0, velo_0=0)
+asset_2 = Asset(**{'name': 'mass1', 'var_name': 'theta1', 'component': body_1, 'motion_func': rotation, 'solution': sol_2, 'connection': asset_1})
+double_pendulum = model.Model([asset_1, asset_2], simplification='cse')
+
+_, axes = plt.subplots(1, 2, figsize=(12, 5))
+for ax, (name, system) in zip(axes, [('pendulum', pendulum), ('double pendulum', double_pendulum)]):
+    table = work_precision(system, time_end=5)
+    print(name)
+    print(table.to_string())
+    print('Cheapest within 1e-6:')
+    print(select_solver(table, 1e-6))
+    plot_work_precision(table, ax=ax)
+    ax.set_title(name)
+plt.show()